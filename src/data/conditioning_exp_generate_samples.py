@@ -3,24 +3,19 @@ from __future__ import annotations
 import time
 
 import numpy as np
-import scipy.sparse as sp
 from config.myconfig import Config
 from config.mytable import TableSaver
 from problems.mis.mis_dataset import MISDataset
 from problems.mis.mis_instance import create_mis_instance
-from problems.mis.solve_optimal_recombination import maximum_weighted_independent_set
+from problems.mis.solve_optimal_recombination import (
+    get_upper_triangular_csr,
+    maximum_weighted_independent_set,
+)
 
 N_SAMPLES = 20
 N_SOLUTIONS = 24
 
 
-def get_lil_csr_matrix(adj_matrix: sp.csr_matrix) -> sp.csr_matrix:
-    """Convert adjacency matrix to lil format and zero out lower triangle."""
-    adj_matrix_lil = sp.lil_matrix(adj_matrix)
-    adj_matrix_lil[np.tril_indices(adj_matrix.shape[0])] = 0
-    return adj_matrix_lil.tocsr()
-
-
 def solve_plain_mis(config: Config) -> None:
     """Solve plain MIS using maximum_weighted_independent_set directly.
 
@@ -56,7 +51,7 @@ def solve_plain_mis(config: Config) -> None:
         )
 
         # Get adjacency matrix in proper format for maximum_weighted_independent_set
-        adj_matrix = get_lil_csr_matrix(instance.adj_matrix_np)
+        adj_matrix = get_upper_triangular_csr(instance.adj_matrix_np)
 
         # Set all weights to 1 for plain MIS
         weights = np.ones(instance.n_nodes)
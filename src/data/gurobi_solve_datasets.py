@@ -9,7 +9,7 @@ from config.mytable import TableSaver
 from problems.mis.mis_dataset import MISDataset
 from problems.mis.mis_instance import create_mis_instance
 from problems.mis.solve_optimal_recombination import (
-    get_lil_csr_matrix,
+    get_upper_triangular_csr,
     maximum_weighted_independent_set,
 )
 
@@ -61,7 +61,7 @@ def solve_datasets(
         )
 
         # Get adjacency matrix in proper format for maximum_weighted_independent_set
-        adj_matrix = get_lil_csr_matrix(instance.adj_matrix_np)
+        adj_matrix = get_upper_triangular_csr(instance.adj_matrix_np)
 
         # Set all weights to 1 for plain MIS
         weights = np.ones(instance.n_nodes)
@@ -44,6 +44,9 @@ def get_arg_parser() -> ArgumentParser:
     parser.add_argument("--sparse_factor", type=int, default=-1)
     parser.add_argument("--aggregation", type=str, default="sum")
     parser.add_argument("--two_opt_iterations", type=int, default=1000)
+    parser.add_argument("--tsp_local_search", type=str, default="two_opt")
+    parser.add_argument("--tsp_n_neighbors", type=int, default=10)
+    parser.add_argument("--two_opt_moves_per_iteration", type=int, default=1)
     parser.add_argument("--save_numpy_heatmap", action="store_true")
 
     parser.add_argument("--project_name", type=str, default="difusco")
@@ -71,6 +74,8 @@ def validate_args(args: Namespace) -> None:
     assert args.task in ["tsp", "mis", "high_degree_selection"]
     assert args.diffusion_type in ["gaussian", "categorical"]
     assert args.diffusion_schedule in ["linear", "cosine"]
+    assert args.tsp_local_search in ["two_opt", "neighbor_lists"]
+    assert args.two_opt_moves_per_iteration > 0
 
     for dir_path in [args.data_path, args.models_path, args.logs_path]:
         if dir_path:
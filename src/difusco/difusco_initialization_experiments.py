@@ -8,7 +8,7 @@ from typing import TYPE_CHECKING, Any
 
 import torch
 from config.myconfig import Config
-from ea.ea_utils import dataset_factory, instance_factory
+from ea.ea_utils import dataset_factory, instance_factory, kernel_factory
 from problems.mis.mis_heatmap_experiment import (
     get_feasible_solutions as get_feasible_solutions_mis,
 )
@@ -72,6 +72,13 @@ def get_arg_parser() -> ArgumentParser:
     tsp_settings = parser.add_argument_group("tsp_settings")
     tsp_settings.add_argument("--sparse_factor", type=int, default=-1)
 
+    mis_settings = parser.add_argument_group("mis_settings")
+    mis_settings.add_argument(
+        "--kernelize",
+        type=lambda x: x.lower() in ["true", "1", "yes", "y"],
+        default=False,
+    )
+
     dev = parser.add_argument_group("dev")
     dev.add_argument("--profiler", type=bool, default=False)
     dev.add_argument("--validate_samples", type=int, default=None)
@@ -103,10 +110,17 @@ class DifuscoInitializationExperiment(Experiment):
         """Run a single Difusco iteration and return the results."""
         # Create problem instance to evaluate solutions
         instance = instance_factory(self.config, sample)
+        # With kernelization, Difusco samples on the kernel graph. An empty kernel
+        # cannot be sampled, so the full graph is sampled instead.
+        kernel = kernel_factory(self.config, instance)
+        if kernel is not None and kernel.instance.n_nodes == 0:
+            kernel = None
 
         # Sample solutions using Difusco
         start_time = timeit.default_timer()
-        heatmaps = self.sampler.sample(sample)
+        heatmaps = self.sampler.sample(
+            sample if kernel is None else kernel.get_sample(sample)
+        )
         end_time = timeit.default_timer()
         sampling_time = end_time - start_time
 
@@ -121,7 +135,9 @@ class DifuscoInitializationExperiment(Experiment):
         if self.config.task == "tsp":
             instance_results = metrics_on_tsp_heatmaps(heatmaps, instance, self.config)
         else:  # MIS
-            instance_results = metrics_on_mis_heatmaps(heatmaps, instance, self.config)
+            instance_results = metrics_on_mis_heatmaps(
+                heatmaps, instance, self.config, kernel=kernel
+            )
         instance_results["sampling_time"] = sampling_time
 
         return instance_results
@@ -11,6 +11,7 @@ import wandb
 
 if TYPE_CHECKING:
     from config.myconfig import Config
+    from ea.problem_instance import ProblemInstance
     from torch_geometric.loader import DataLoader
 from config.mytable import TableSaver
 from pyinstrument import Profiler
@@ -35,6 +36,20 @@ class Experiment(ABC):
     def get_table_name(self) -> str:
         pass
 
+    def create_shared_instance(self, sample: tuple) -> ProblemInstance | None:
+        """
+        Instance built once by the parent process, in shared memory. It is passed to
+        run_single_iteration as the instance keyword argument. None if not supported.
+        """
+        return None
+
+    def get_shared_sample(self, sample: tuple) -> tuple:
+        """
+        Fields of the sample passed to run_single_iteration next to a shared instance,
+        so that the data already in the instance is not pickled again.
+        """
+        return sample
+
 
 class ExperimentRunner:
     """
@@ -42,6 +57,7 @@ class ExperimentRunner:
     - Runs a function for each sample in the given dataloader in a separate process
     - Logs the results to wandb if enabled
     - Saves the results to a table if enabled
+    - Hands the instance to the process in shared memory if share_instances is enabled
     """
 
     def __init__(self, config: Config, experiment: Experiment) -> None:
@@ -52,6 +68,8 @@ class ExperimentRunner:
             self.config.save_results = False
         if "save_recombination_results" not in self.config:
             self.config.save_recombination_results = False
+        if "share_instances" not in self.config:
+            self.config.share_instances = False
 
     def _validate_config(self) -> None:
         """Validate that the config has all required fields.
@@ -74,12 +92,18 @@ class ExperimentRunner:
             if not hasattr(self.config, field):
                 raise AttributeError(f"Config missing required field: {field}")
 
-    def process_iteration(self, sample: tuple[Any, ...], queue: mp.Queue) -> None:
+    def process_iteration(
+        self,
+        sample: tuple[Any, ...],
+        queue: mp.Queue,
+        instance: ProblemInstance | None = None,
+    ) -> None:
         """Run the single iteration and store the result in the queue."""
+        kwargs = {} if instance is None else {"instance": instance}
 
         def run_iteration() -> None:
             try:
-                result = self.experiment.run_single_iteration(sample)
+                result = self.experiment.run_single_iteration(sample, **kwargs)
                 queue.put(result)
             except Exception:  # noqa: BLE001
                 queue.put({"error": traceback.format_exc()})
@@ -141,8 +165,17 @@ class ExperimentRunner:
                 f"process_idx {self.config.process_idx} processing sample {i} of {len(dataloader)}"
             )
 
+            # Tensors in shared memory are attached by the process without copies
+            instance = None
+            if self.config.share_instances:
+                instance = self.experiment.create_shared_instance(sample)
+            if instance is not None:
+                sample = self.experiment.get_shared_sample(sample)
+
             queue = ctx.Queue()
-            process = ctx.Process(target=self.process_iteration, args=(sample, queue))
+            process = ctx.Process(
+                target=self.process_iteration, args=(sample, queue, instance)
+            )
 
             process.start()
             process.join(timeout=120 * 60)  # 2h timeout
@@ -9,7 +9,7 @@ from typing import TYPE_CHECKING
 import numpy as np
 import torch
 import torch.utils.data
-from problems.mis.mis_evaluation import mis_decode_np
+from problems.mis.mis_evaluation import mis_decode_np_batched
 from scipy.sparse import coo_matrix
 from torch import nn
 from torch.nn.functional import mse_loss, one_hot
@@ -32,12 +32,13 @@ class MISModelBase(COMetaModel):
         self.validation_dataset = None
 
     @staticmethod
-    def process_batch(batch: tuple) -> tuple:
+    def process_batch(batch: tuple, build_adj_mat: bool = True) -> tuple:
         """
         Process the input batch and return node labels, edge index, adjacency matrix, and optional features.
 
         Args:
             batch: Input batch containing graph data
+            build_adj_mat: Whether to build the adjacency matrix, else adj_mat is None.
 
         Returns:
             tuple containing:
@@ -56,6 +57,9 @@ class MISModelBase(COMetaModel):
         edge_index = graph_data.edge_index
 
         edge_index = edge_index.to(node_labels.device).reshape(2, -1)
+        if not build_adj_mat:
+            return node_labels, edge_index, None, features
+
         edge_index_np = edge_index.cpu().numpy()
         adj_mat = coo_matrix(
             (np.ones_like(edge_index_np[0]), (edge_index_np[0], edge_index_np[1])),
@@ -311,11 +315,9 @@ class MISModelBase(COMetaModel):
         predict_labels = np.concatenate(stacked_predict_labels, axis=0)
         all_sampling = self.args.parallel_sampling * n_times
 
-        splitted_predict_labels = np.split(predict_labels, all_sampling)
-        solved_solutions = [
-            mis_decode_np(predict_labels, adj_mat)
-            for predict_labels in splitted_predict_labels
-        ]
+        solved_solutions = mis_decode_np_batched(
+            predict_labels.reshape(all_sampling, -1), adj_mat
+        )
         solved_costs = [solved_solution.sum() for solved_solution in solved_solutions]
 
         for i in range(n_times):
@@ -12,7 +12,11 @@ import torch
 import torch.utils.data
 from problems.tsp.tsp_evaluation import TSPEvaluator, merge_tours
 from problems.tsp.tsp_graph_dataset import TSPGraphDataset
-from problems.tsp.tsp_operators import batched_two_opt_torch
+from problems.tsp.tsp_operators import (
+    batched_neighbor_local_search,
+    batched_two_opt_torch,
+    get_knn_neighbors,
+)
 from pytorch_lightning.utilities import rank_zero_info
 from torch import nn
 from torch.nn.functional import mse_loss, one_hot
@@ -336,6 +340,11 @@ class TSPModel(COMetaModel):
                     edge_index, np_points.shape[0], device
                 )
 
+        # the candidate lists of the local search only depend on the points
+        neighbors = None
+        if self.args.tsp_local_search == "neighbor_lists":
+            neighbors = get_knn_neighbors(np_points, self.args.tsp_n_neighbors)
+
         stacked_tours = []
         for _ in range(self.args.sequential_sampling):
             adj_mat = self.diffusion_sample(points, edge_index, device)
@@ -352,12 +361,21 @@ class TSPModel(COMetaModel):
             )
 
             # Refine using 2-opt
-            solved_tours, ns = batched_two_opt_torch(
-                np_points.astype("float64"),
-                np.array(tours).astype("int64"),
-                max_iterations=self.args.two_opt_iterations,
-                device=device,
-            )
+            if neighbors is not None:
+                solved_tours, ns = batched_neighbor_local_search(
+                    np_points.astype("float64"),
+                    tours,
+                    neighbors,
+                    max_iterations=self.args.two_opt_iterations,
+                )
+            else:
+                solved_tours, ns = batched_two_opt_torch(
+                    np_points.astype("float64"),
+                    tours,
+                    max_iterations=self.args.two_opt_iterations,
+                    device=device,
+                    moves_per_iteration=self.args.two_opt_moves_per_iteration,
+                )
 
             stacked_tours.append(solved_tours)
 
@@ -65,7 +65,7 @@ def run_tsp_heuristics_main(args: Namespace) -> None:
             # 2. 2-opt heuristic
             tours, _ = batched_two_opt_torch(
                 points.astype("float64"),
-                np.array(tours).astype("int64"),
+                tours,
                 max_iterations=args.two_opt_iterations,
                 device="cpu",
             )
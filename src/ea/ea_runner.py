@@ -11,17 +11,25 @@ from typing import TYPE_CHECKING
 import numpy as np
 import torch
 from evotorch.logging import StdOutLogger
-from problems.mis.mis_ga import create_mis_ga
+from problems.mis.mis_ga import MISGA, create_mis_ga
+from problems.mis.mis_instance import MISInstance
 from problems.tsp.tsp_ga import create_tsp_ga
 from torch_geometric.loader import DataLoader
 
 from difusco.experiment_runner import Experiment, ExperimentRunner
-from ea.ea_utils import LogFigures, dataset_factory, get_results_dict, instance_factory
+from ea.ea_utils import (
+    LogFigures,
+    dataset_factory,
+    get_results_dict,
+    instance_factory,
+    kernel_factory,
+)
 
 if TYPE_CHECKING:
     import pandas as pd
     from config.myconfig import Config
     from evotorch.algorithms import GeneticAlgorithm
+    from problems.mis.mis_kernelization import MISKernel
 
     from ea.problem_instance import ProblemInstance
 
@@ -80,12 +88,37 @@ def get_arg_parser() -> ArgumentParser:
 
     tsp_settings = parser.add_argument_group("tsp_settings")
     tsp_settings.add_argument("--sparse_factor", type=int, default=-1)
+    tsp_settings.add_argument("--tsp_local_search", type=str, default="two_opt")
+    tsp_settings.add_argument("--tsp_n_neighbors", type=int, default=10)
+    tsp_settings.add_argument("--tsp_or_opt_segments", type=int, default=64)
+    tsp_settings.add_argument("--two_opt_moves_per_iteration", type=int, default=1)
+    tsp_settings.add_argument("--tsp_construction", type=str, default="random_heatmap")
+    tsp_settings.add_argument("--tsp_crossover", type=str, default="edge_recombination")
 
     mis_settings = parser.add_argument_group("mis_settings")
     mis_settings.add_argument("--tournament_size", type=int, default=2)
     mis_settings.add_argument("--deselect_prob", type=float, default=0.05)
     mis_settings.add_argument("--mutation_prob", type=float, default=0.25)
     mis_settings.add_argument("--opt_recomb_time_limit", type=int, default=15)
+    mis_settings.add_argument("--opt_recomb_workers", type=int, default=1)
+    mis_settings.add_argument("--opt_recomb_threads", type=int, default=0)
+    mis_settings.add_argument("--max_local_search_it", type=int, default=0)
+    mis_settings.add_argument("--instance_cache_dir", type=str, default=None)
+    mis_settings.add_argument("--instance_cache_max_mb", type=float, default=1024)
+    mis_settings.add_argument("--recombination_cache_path", type=str, default=None)
+    mis_settings.add_argument(
+        "--recombination_cache_max_entries", type=int, default=100_000
+    )
+    mis_settings.add_argument(
+        "--kernelize",
+        type=lambda x: x.lower() in ["true", "1", "yes", "y"],
+        default=False,
+    )
+    mis_settings.add_argument(
+        "--packed_population",
+        type=lambda x: x.lower() in ["true", "1", "yes", "y"],
+        default=False,
+    )
     mis_settings.add_argument(
         "--preserve_optimal_recombination",
         type=lambda x: x.lower() in ["true", "1", "yes", "y"],
@@ -95,6 +128,7 @@ def get_arg_parser() -> ArgumentParser:
     dev = parser.add_argument_group("dev")
     dev.add_argument("--profiler", action="store_true")
     dev.add_argument("--validate_samples", type=int, default=None)
+    dev.add_argument("--share_instances", action="store_true")
 
     return parser
 
@@ -104,13 +138,19 @@ def validate_args(args: Namespace) -> None:
 
     assert args.pop_size > 2, "Population size must be greater than 2."
     assert args.initialization in ["random_feasible", "difusco_sampling"]
-    assert args.recombination in ["classic", "difuscombination", "optimal"]
+    assert args.recombination in [
+        "classic",
+        "difuscombination",
+        "optimal",
+        "branch_and_reduce",
+    ]
 
     if args.task == "mis":
         assert args.recombination in [
             "classic",
             "optimal",
             "difuscombination",
+            "branch_and_reduce",
         ], "Choose a valid recombination method for mis."
         assert args.initialization in [
             "random_feasible",
@@ -122,9 +162,32 @@ def validate_args(args: Namespace) -> None:
         assert args.deselect_prob > 0, (
             "Deselect probability must be greater than 0 for mis."
         )
+        # the saved recombinations would refer to the nodes of the kernels
+        assert not (args.kernelize and args.save_recombination_results), (
+            "Recombination results cannot be saved with kernelization."
+        )
 
     if args.task == "tsp":
         assert args.max_two_opt_it > 0, "max_two_opt_it must be greater than 0 for tsp."
+        assert args.tsp_local_search in ["two_opt", "neighbor_lists", "or_opt"], (
+            "Choose a valid local search for tsp."
+        )
+        assert args.tsp_n_neighbors > 0, "tsp_n_neighbors must be greater than 0."
+        assert args.tsp_or_opt_segments > 0, (
+            "tsp_or_opt_segments must be greater than 0."
+        )
+        assert args.two_opt_moves_per_iteration > 0, (
+            "two_opt_moves_per_iteration must be greater than 0."
+        )
+        assert args.tsp_construction in [
+            "random_heatmap",
+            "nearest_neighbor",
+            "greedy_edge",
+            "space_filling_curve",
+        ], "Choose a valid tour construction for tsp."
+        assert args.tsp_crossover in ["edge_recombination", "order", "eax"], (
+            "Choose a valid crossover for tsp."
+        )
 
     for dir_path in [args.data_path, args.logs_path]:
         if dir_path:
@@ -218,23 +281,52 @@ class EvolutionaryAlgorithm(Experiment):
 
         return df
 
-    def run_single_iteration(self, sample: tuple) -> dict:
-        instance = instance_factory(self.config, sample)
+    def create_shared_instance(self, sample: tuple) -> ProblemInstance:
+        return instance_factory(self.config, sample).share_memory_()
+
+    def get_shared_sample(self, sample: tuple) -> tuple:
+        # only the instance ids, the graph and the labels are in the shared instance
+        return (sample[0],)
+
+    def run_single_iteration(
+        self, sample: tuple, instance: ProblemInstance | None = None
+    ) -> dict:
+        if instance is None:
+            instance = instance_factory(self.config, sample)
+        elif isinstance(instance, MISInstance):
+            # the MIS GA samples heatmaps on the graph of the sample
+            sample = instance.get_sample(sample)
+
+        # the EA runs on the kernel, whose solutions have offset nodes less
+        kernel = kernel_factory(self.config, instance)
+        if kernel is None:
+            ea_instance, ea_sample, offset = instance, sample, 0
+        elif kernel.instance.n_nodes == 0:
+            return self._kernel_solution_results(instance, kernel)
+        else:
+            ea_instance, ea_sample = kernel.instance, kernel.get_sample(sample)
+            offset = kernel.offset
+
         tmp_dir = Path(mkdtemp())
-        ea = ea_factory(self.config, instance, sample=sample, tmp_dir=tmp_dir)
+        ea = ea_factory(self.config, ea_instance, sample=ea_sample, tmp_dir=tmp_dir)
 
         table_name = self._get_logger_table_name(instance_id=sample[0].item())
         custom_logger = LogFigures(
             table_name=table_name,
             instance_id=sample[0].item(),
-            gt_cost=instance.get_gt_cost(),
+            gt_cost=instance.get_gt_cost() - offset,
             tmp_population_file=tmp_dir / "population.txt",
             searcher=ea,
         )
         _ = StdOutLogger(searcher=ea, interval=10, after_first_step=True)
 
         start_time = timeit.default_timer()
-        ea.run(self.config.n_generations)
+        try:
+            ea.run(self.config.n_generations)
+        finally:
+            if isinstance(ea, MISGA):
+                # stops the worker processes of the concurrent optimal recombination
+                ea.close()
         end_time = timeit.default_timer()
 
         if self.config.validate_samples:
@@ -244,6 +336,11 @@ class EvolutionaryAlgorithm(Experiment):
                 print(f"Error saving evolution figure: {e}")
 
         cost = ea.status["pop_best_eval"]
+        if kernel is not None:
+            # the best solution of the kernel, lifted to the original instance
+            best = kernel.lift(ea.problem.unpack(ea.status["pop_best"].values))
+            assert instance.is_independent_set(best), "Lifted solution is infeasible"
+            cost = best.sum().item()
         gt_cost = instance.get_gt_cost()
 
         diff = cost - gt_cost if ea.problem.objective_sense == "min" else gt_cost - cost
@@ -284,6 +381,20 @@ class EvolutionaryAlgorithm(Experiment):
             for k, v in results.items()
         }
 
+    @staticmethod
+    def _kernel_solution_results(instance: MISInstance, kernel: MISKernel) -> dict:
+        """Results of an instance solved exactly by the reductions (empty kernel)."""
+        solution = kernel.lift(torch.zeros(0, dtype=torch.bool))
+        assert instance.is_independent_set(solution), "Lifted solution is infeasible"
+        cost = solution.sum().item()
+        gt_cost = instance.get_gt_cost()
+        return {
+            "cost": cost,
+            "gt_cost": gt_cost,
+            "gap": (gt_cost - cost) / gt_cost,
+            "runtime": 0.0,
+        }
+
     def _get_results_table_name(self) -> str:
         directory = os.path.join(self.config.results_path, "ea_results")
         os.makedirs(directory, exist_ok=True)
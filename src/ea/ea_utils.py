@@ -13,6 +13,8 @@ from evotorch.logging import Logger
 from problems.mis.mis_dataset import MISDataset
 from problems.mis.mis_ga import MISGaProblem
 from problems.mis.mis_instance import create_mis_instance
+from problems.mis.mis_instance_cache import MISInstanceCache
+from problems.mis.mis_kernelization import kernelize
 from problems.tsp.tsp_ga import TSPGAProblem
 from problems.tsp.tsp_graph_dataset import TSPGraphDataset
 from problems.tsp.tsp_instance import create_tsp_instance
@@ -22,6 +24,7 @@ if TYPE_CHECKING:
 
     from config.myconfig import Config
     from evotorch import Problem
+    from problems.mis.mis_kernelization import MISKernel
     from torch.utils.data import Dataset
 
     from ea.problem_instance import ProblemInstance
@@ -71,7 +74,12 @@ def dataset_factory(config: Config, split: str = "test") -> Dataset:
 
 def instance_factory(config: Config, sample: tuple) -> ProblemInstance:
     if config.task == "mis":
-        return create_mis_instance(sample, device=config.device)
+        cache = None
+        if "instance_cache_dir" in config and config.instance_cache_dir is not None:
+            cache = MISInstanceCache(
+                config.instance_cache_dir, max_size_mb=config.instance_cache_max_mb
+            )
+        return create_mis_instance(sample, device=config.device, cache=cache)
     if config.task == "tsp":
         return create_tsp_instance(
             sample, device=config.device, sparse_factor=config.sparse_factor
@@ -80,6 +88,18 @@ def instance_factory(config: Config, sample: tuple) -> ProblemInstance:
     raise ValueError(error_msg)
 
 
+def kernel_factory(config: Config, instance: ProblemInstance) -> MISKernel | None:
+    """
+    Kernel of an MIS instance if config.kernelize is set, see
+    problems.mis.mis_kernelization. None if kernelization is disabled. If the kernel has
+    0 nodes, the reductions have solved the instance: its solution is kernel.lift of an
+    empty solution.
+    """
+    if config.task != "mis" or "kernelize" not in config or not config.kernelize:
+        return None
+    return kernelize(instance)
+
+
 def problem_factory(task: str) -> Problem:
     if task == "mis":
         return MISGaProblem()
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 
 import torch
@@ -19,3 +21,14 @@ class ProblemInstance(ABC):
     @abstractmethod
     def get_feasible_from_individual(self, individual: torch.Tensor) -> torch.Tensor:
         pass
+
+    def share_memory_(self) -> ProblemInstance:
+        """
+        Moves the CPU tensors of the instance to shared memory, so that worker processes
+        can attach to them without copies. Subclasses that keep numpy views of these
+        tensors must rebuild them.
+        """
+        for value in vars(self).values():
+            if isinstance(value, torch.Tensor) and not value.is_cuda:
+                value.share_memory_()
+        return self
@@ -0,0 +1,5 @@
+#!/bin/bash
+
+cd src/problems/mis/cython_mis_decode
+python setup.py build_ext --inplace
+cd ../../../..
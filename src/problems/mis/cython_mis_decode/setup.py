@@ -0,0 +1,15 @@
+from distutils.core import setup
+from distutils.extension import Extension
+
+import numpy as np
+from Cython.Distutils import build_ext
+
+ext = Extension(
+    "cython_mis_decode",
+    ["cython_mis_decode.pyx"],
+    include_dirs=[np.get_include()],
+    extra_compile_args=["-fopenmp"],
+    extra_link_args=["-fopenmp"],
+)
+
+setup(ext_modules=[ext], cmdclass={"build_ext": build_ext})
@@ -0,0 +1,185 @@
+"""
+License-free exact recombination of two MIS solutions.
+
+The common nodes of the parents are kept, so their neighbors are excluded. Since both
+parents are independent sets, no node of the union of the parents is adjacent to a
+common node, and the free subgraph is induced by the symmetric difference of the
+parents. Its maximum independent set is found with a branch-and-reduce solver on bitsets
+(python ints, bit i is the free node i).
+"""
+
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+from problems.mis.solve_optimal_recombination import OptimalRecombResults
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from problems.mis.mis_instance import MISInstance
+
+
+class BranchAndReduceTimeoutError(Exception):
+    pass
+
+
+def _iter_bits(bits: int) -> Iterator[int]:
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _popcount(bits: int) -> int:
+    # int.bit_count needs python 3.10
+    return bin(bits).count("1")
+
+
+def _component(neighbors: list[int], nodes: int) -> int:
+    """Connected component of the lowest node of nodes, as a bitset."""
+    component = nodes & -nodes
+    frontier = component
+    while frontier:
+        reached = 0
+        for v in _iter_bits(frontier):
+            reached |= neighbors[v]
+        frontier = reached & nodes & ~component
+        component |= frontier
+    return component
+
+
+class BranchAndReduceSolver:
+    """
+    Exact maximum independent set of a graph of bitsets, with reductions:
+    - isolated nodes are in some maximum independent set,
+    - so are pendant nodes (degree 1), which excludes their neighbor,
+    - connected components are solved independently,
+    then branching on a node of maximum degree (in, excluding its neighbors, or out).
+
+    Args:
+        neighbors: neighbors[i] is the bitset of the neighbors of node i.
+        time_limit: Seconds after which solve raises BranchAndReduceTimeoutError.
+    """
+
+    def __init__(self, neighbors: list[int], time_limit: float | None = None) -> None:
+        self.neighbors = neighbors
+        self._deadline = None if time_limit is None else time.time() + time_limit
+
+    def solve(self, nodes: int | None = None) -> int:
+        """Maximum independent set of the subgraph induced by nodes (default: all)."""
+        if nodes is None:
+            nodes = (1 << len(self.neighbors)) - 1
+        return self._solve(nodes)
+
+    def _reduce(self, nodes: int) -> tuple[int, int]:
+        """
+        Applies the degree 0 and 1 reductions until none applies.
+        Returns (nodes, chosen).
+        """
+        chosen = 0
+        reduced = True
+        while reduced:
+            reduced = False
+            for v in _iter_bits(nodes):
+                bit = 1 << v
+                if not nodes & bit:
+                    # removed as the neighbor of a pendant node in this pass
+                    continue
+                neighborhood = self.neighbors[v] & nodes
+                if neighborhood & (neighborhood - 1) == 0:
+                    # degree 0 or 1
+                    chosen |= bit
+                    nodes &= ~(bit | neighborhood)
+                    reduced = True
+        return nodes, chosen
+
+    def _solve(self, nodes: int) -> int:
+        nodes, chosen = self._reduce(nodes)
+        if not nodes:
+            return chosen
+
+        component = _component(self.neighbors, nodes)
+        if component != nodes:
+            return chosen | self._solve(component) | self._solve(nodes & ~component)
+
+        if self._deadline is not None and time.time() > self._deadline:
+            raise BranchAndReduceTimeoutError
+
+        v = max(_iter_bits(nodes), key=lambda u: _popcount(self.neighbors[u] & nodes))
+        bit = 1 << v
+        with_v = bit | self._solve(nodes & ~(bit | self.neighbors[v]))
+        # without v, at most all the other nodes are selected
+        if _popcount(with_v) >= _popcount(nodes) - 1:
+            return chosen | with_v
+        without_v = self._solve(nodes & ~bit)
+        if _popcount(without_v) > _popcount(with_v):
+            return chosen | without_v
+        return chosen | with_v
+
+
+def get_free_subgraph(instance: MISInstance, free_nodes: np.ndarray) -> list[int]:
+    """Bitset neighbors of the subgraph of free_nodes, local node i is free_nodes[i]."""
+    crow = instance.crow.cpu().numpy()
+    col = instance.col.cpu().numpy()
+    local_index = np.full(instance.n_nodes, -1, dtype=np.int64)
+    local_index[free_nodes] = np.arange(len(free_nodes))
+
+    neighbors = []
+    for node in free_nodes:
+        local_neighbors = local_index[col[crow[node] : crow[node + 1]]]
+        bits = 0
+        for u in local_neighbors[local_neighbors >= 0].tolist():
+            bits |= 1 << u
+        neighbors.append(bits)
+    return neighbors
+
+
+def solve_branch_and_reduce_mis(
+    instance: MISInstance,
+    solution_1: np.array,
+    solution_2: np.array,
+    time_limit: int = 60,
+    **kwargs,
+) -> OptimalRecombResults:
+    """
+    Solve the following problem:
+    max MIS
+    st. is an IS
+    st. the nodes of both solutions are selected
+    st. only nodes of solution_1 or solution_2 are selected
+
+    If the time limit is reached, the best parent is returned as child.
+    """
+    assert np.all(solution_1 < instance.n_nodes), "solution_1 contains invalid indices"
+    assert np.all(solution_2 < instance.n_nodes), "solution_2 contains invalid indices"
+
+    start_time = time.time()
+    common = np.intersect1d(solution_1, solution_2)
+    free_nodes = np.setxor1d(solution_1, solution_2)
+
+    solver = BranchAndReduceSolver(
+        get_free_subgraph(instance, free_nodes), time_limit=time_limit
+    )
+    try:
+        free_mis = solver.solve()
+        children = np.concatenate(
+            [common, free_nodes[list(_iter_bits(free_mis))]]
+        ).astype(np.int64)
+    except (BranchAndReduceTimeoutError, RecursionError):
+        best = solution_1 if len(solution_1) >= len(solution_2) else solution_2
+        children = np.asarray(best, dtype=np.int64)
+
+    children = np.sort(children)
+    children_np_labels = np.zeros(instance.n_nodes)
+    children_np_labels[children] = 1
+    return OptimalRecombResults(
+        children_np_labels=children_np_labels,
+        children=children,
+        runtime=round(time.time() - start_time, 4),
+        parent_1_obj=len(solution_1),
+        parent_2_obj=len(solution_2),
+        children_obj=len(children),
+    )
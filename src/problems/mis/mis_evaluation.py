@@ -1,7 +1,14 @@
+from __future__ import annotations
+
 import numpy as np
 import torch
 from scipy import sparse as sp
 
+try:
+    from problems.mis.cython_mis_decode.cython_mis_decode import mis_decode_batch
+except ImportError:  # extension not compiled, see problems/mis/cython_mis_decode
+    mis_decode_batch = None
+
 
 def mis_decode_np(predictions: np.ndarray, adj_matrix: sp.csr_matrix) -> np.ndarray:
     """Decode the labels to the MIS."""
@@ -19,6 +26,104 @@ def mis_decode_np(predictions: np.ndarray, adj_matrix: sp.csr_matrix) -> np.ndar
     return (solution == 1).astype(int)
 
 
+def is_cython_decode_available() -> bool:
+    """Whether the compiled cython_mis_decode extension can be used."""
+    return mis_decode_batch is not None
+
+
+def mis_decode_np_batched(
+    predictions: np.ndarray, adj_matrix: sp.csr_matrix
+) -> np.ndarray:
+    """
+    Decode a batch of labels of shape (B, n) to the MIS. Same result as calling
+    `mis_decode_np` on every row, but uses the compiled multithreaded kernel when it is
+    available.
+    """
+    if not is_cython_decode_available():
+        return np.stack([mis_decode_np(row, adj_matrix) for row in predictions])
+
+    n = predictions.shape[1]
+    adj_matrix = adj_matrix.tocsr(copy=True)
+    adj_matrix.eliminate_zeros()
+    # the matrix may have less rows than nodes if the last nodes are isolated
+    crow = np.pad(adj_matrix.indptr, (0, n + 1 - adj_matrix.indptr.shape[0]), "edge")
+
+    orders = np.argsort(-predictions, axis=1)
+    solution = mis_decode_batch(
+        np.ascontiguousarray(orders, dtype=np.int64),
+        np.ascontiguousarray(crow, dtype=np.int64),
+        np.ascontiguousarray(adj_matrix.indices, dtype=np.int64),
+    )
+    return solution.astype(int)
+
+
+def mis_decode_cython_batched(
+    predictions: torch.Tensor,
+    crow: torch.Tensor,
+    col: torch.Tensor,
+    num_threads: int = -1,
+    forced_in: torch.Tensor | None = None,
+    forced_out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    """
+    Decode the labels to the MIS with the compiled kernel (batched version). Gives the
+    same result as `mis_decode_torch_rounds`. Rows are decoded on CPU threads, without
+    the GIL.
+
+    Args:
+        predictions: The predicted labels as a torch.Tensor of shape (B, n).
+        crow: The CSR row pointers of the adjacency matrix, torch.Tensor of shape
+            (n + 1,).
+        col: The CSR column indices of the adjacency matrix, torch.Tensor of shape
+            (n_edges,).
+        num_threads: Number of threads. If not positive, OpenMP decides.
+        forced_in: Optional boolean tensor of shape (B, n), see `mis_partial_state`.
+        forced_out: Optional boolean tensor of shape (B, n), see `mis_partial_state`.
+
+    Returns:
+        torch.Tensor: A binary tensor of shape (B, n) indicating the nodes included in
+            the MIS.
+    """
+    if not is_cython_decode_available():
+        error_msg = (
+            "cython_mis_decode is not compiled. "
+            "Run ./src/problems/mis/cython_mis_decode/compile.sh"
+        )
+        raise RuntimeError(error_msg)
+
+    # handle single batch case
+    if predictions.ndim == 1:
+        return mis_decode_cython_batched(
+            predictions.unsqueeze(0),
+            crow,
+            col,
+            num_threads,
+            forced_in=_unsqueeze_or_none(forced_in),
+            forced_out=_unsqueeze_or_none(forced_out),
+        ).squeeze(0)
+
+    initial = None
+    if forced_in is not None or forced_out is not None:
+        selected, undecided = mis_partial_state(
+            predictions.shape, crow, col, forced_in, forced_out
+        )
+        # 1: in the solution, -1: out of the solution, 0: free
+        initial = torch.zeros(predictions.shape, dtype=torch.int8)
+        initial[~undecided.cpu()] = -1
+        initial[selected.cpu()] = 1
+        initial = initial.numpy()
+
+    sorted_predict_labels = torch.argsort(-predictions, dim=1)
+    solution = mis_decode_batch(
+        np.ascontiguousarray(sorted_predict_labels.cpu().numpy(), dtype=np.int64),
+        np.ascontiguousarray(crow.cpu().numpy(), dtype=np.int64),
+        np.ascontiguousarray(col.cpu().numpy(), dtype=np.int64),
+        num_threads,
+        initial,
+    )
+    return torch.from_numpy(solution).to(predictions.device)
+
+
 def mis_decode_torch(
     predictions: torch.Tensor, adj_matrix: torch.Tensor
 ) -> torch.Tensor:
@@ -62,22 +167,53 @@ def mis_decode_torch(
     return (solution == 1).bool()
 
 
-def precompute_neighbors_padded(adj_csr: torch.Tensor) -> torch.Tensor:
-    crow = adj_csr.crow_indices()
-    col = adj_csr.col_indices()
+def precompute_neighbors_csr(
+    edge_index: torch.Tensor, n_nodes: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Build the CSR neighbor arrays of a graph from its edge index, without a per-node
+    loop. Duplicated edges are removed, and neighbors of each node are sorted.
+
+    Args:
+        edge_index: The edges of the graph as a torch.Tensor of shape (2, n_edges).
+        n_nodes: The number of nodes of the graph.
+
+    Returns:
+        tuple of (crow, col): crow has shape (n_nodes + 1,) and the neighbors of node
+            i are col[crow[i] : crow[i + 1]].
+    """
+    src, dst = edge_index[0].long(), edge_index[1].long()
+    keys = torch.unique(src * n_nodes + dst)  # sorted by (src, dst), no duplicates
+    row = torch.div(keys, n_nodes, rounding_mode="floor")
+    col = keys - row * n_nodes
+
+    crow = torch.zeros(n_nodes + 1, dtype=torch.long, device=edge_index.device)
+    crow[1:] = torch.cumsum(torch.bincount(row, minlength=n_nodes), dim=0)
+    return crow, col
+
+
+def csr_to_neighbors_padded(crow: torch.Tensor, col: torch.Tensor) -> torch.Tensor:
+    """Scatter the CSR neighbor arrays into a (n_nodes, max_degree) table, -1 padded."""
     degrees = crow[1:] - crow[:-1]
-    max_degree = degrees.max().item()
-    num_nodes = adj_csr.shape[0]
+    num_nodes = degrees.shape[0]
+    max_degree = degrees.max().item() if num_nodes > 0 else 0
+
+    rows = torch.repeat_interleave(torch.arange(num_nodes, device=crow.device), degrees)
+    positions = torch.arange(col.shape[0], device=crow.device) - crow[rows]
 
     # Initialize padded tensor with -1
-    neighbors_padded = torch.full((num_nodes, max_degree), -1, dtype=torch.long)
+    neighbors_padded = torch.full(
+        (num_nodes, max_degree), -1, dtype=torch.long, device=crow.device
+    )
+    neighbors_padded[rows, positions] = col.long()
+    return neighbors_padded
 
-    for node in range(num_nodes):
-        start, end = crow[node], crow[node + 1]
-        neighbors = col[start:end]
-        neighbors_padded[node, : len(neighbors)] = neighbors
 
-    return neighbors_padded, degrees
+def precompute_neighbors_padded(adj_csr: torch.Tensor) -> torch.Tensor:
+    crow = adj_csr.crow_indices()
+    col = adj_csr.col_indices()
+    degrees = crow[1:] - crow[:-1]
+    return csr_to_neighbors_padded(crow, col), degrees
 
 
 # @torch.jit.script
@@ -158,3 +294,151 @@ def mis_decode_torch_batched(
     if return_single_batch:
         return bool_solution.squeeze(0)
     return bool_solution
+
+
+def _unsqueeze_or_none(t: torch.Tensor | None) -> torch.Tensor | None:
+    return None if t is None else t.unsqueeze(0)
+
+
+def csr_rows(crow: torch.Tensor) -> torch.Tensor:
+    """Source node of every entry of the CSR column array. Shape: (n_edges,)"""
+    n = crow.shape[0] - 1
+    return torch.repeat_interleave(
+        torch.arange(n, device=crow.device), crow[1:] - crow[:-1]
+    )
+
+
+def mis_partial_state(
+    shape: tuple[int, int],
+    crow: torch.Tensor,
+    col: torch.Tensor,
+    forced_in: torch.Tensor | None = None,
+    forced_out: torch.Tensor | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Initial decoding state of a batch of partial solutions, computed in one vectorised
+    pass. Forced-in nodes are selected, and they and their neighbors are decided.
+    Forced-out nodes are decided, but their neighbors stay free.
+
+    Args:
+        shape: The shape (B, n) of the batch.
+        crow: The CSR row pointers of the adjacency matrix, torch.Tensor of shape
+            (n + 1,).
+        col: The CSR column indices of the adjacency matrix, torch.Tensor of shape
+            (n_edges,).
+        forced_in: Boolean tensor of shape (B, n) with the nodes that must be in the
+            solution. They must form an independent set.
+        forced_out: Boolean tensor of shape (B, n) with the nodes that must not be in
+            the solution.
+
+    Returns:
+        tuple of (selected, undecided), two boolean tensors of shape (B, n).
+    """
+    device = crow.device
+    col = col.long()
+    selected = torch.zeros(shape, dtype=torch.bool, device=device)
+    undecided = torch.ones(shape, dtype=torch.bool, device=device)
+
+    if forced_in is not None:
+        selected = forced_in.to(device).bool().clone()
+        blocked = torch.zeros(shape, dtype=torch.int32, device=device).index_add_(
+            1, col, selected[:, csr_rows(crow)].int()
+        )
+        undecided &= ~selected & (blocked == 0)
+    if forced_out is not None:
+        undecided &= ~forced_out.to(device).bool()
+
+    return selected, undecided
+
+
+def mis_decode_torch_rounds(
+    predictions: torch.Tensor,
+    crow: torch.Tensor,
+    col: torch.Tensor,
+    forced_in: torch.Tensor | None = None,
+    forced_out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    """
+    Decode the labels to the MIS using PyTorch tensors (batched, in parallel rounds).
+
+    Gives the same result as `mis_decode_torch_batched`, but instead of visiting one
+    node per iteration, it works in rounds: every undecided node with the highest
+    priority among its undecided neighbors joins the set, and its neighbors are
+    excluded. For random priorities, this needs O(log n) rounds instead of n iterations.
+
+    If forced_in or forced_out are given, decoding starts from the partial solution of
+    `mis_partial_state`, and only the remaining free nodes are filled greedily. Each
+    round only touches the edges between free nodes.
+
+    Args:
+        predictions: The predicted labels as a torch.Tensor of shape (B, n).
+        crow: The CSR row pointers of the adjacency matrix, torch.Tensor of shape
+            (n + 1,).
+        col: The CSR column indices of the adjacency matrix, torch.Tensor of shape
+            (n_edges,).
+        forced_in: Optional boolean tensor of shape (B, n), see `mis_partial_state`.
+        forced_out: Optional boolean tensor of shape (B, n), see `mis_partial_state`.
+
+    Returns:
+        torch.Tensor: A binary tensor of shape (B, n) indicating the nodes included in
+            the MIS.
+    """
+
+    # handle single batch case
+    if predictions.ndim == 1:
+        return mis_decode_torch_rounds(
+            predictions.unsqueeze(0),
+            crow,
+            col,
+            forced_in=_unsqueeze_or_none(forced_in),
+            forced_out=_unsqueeze_or_none(forced_out),
+        ).squeeze(0)
+
+    B, n = predictions.shape
+    device = predictions.device
+    crow, col = crow.to(device), col.to(device).long()
+    row = csr_rows(crow)
+
+    selected, undecided = mis_partial_state((B, n), crow, col, forced_in, forced_out)
+
+    # Rank of each node in the greedy order, i.e. rank 0 is the node processed first by
+    # the sequential decoder. Ranks are unique, so ties are broken exactly as in the
+    # sequential one.
+    sorted_predict_labels = torch.argsort(-predictions, dim=1)
+    ranks = torch.empty_like(sorted_predict_labels)
+    ranks.scatter_(
+        1, sorted_predict_labels, torch.arange(n, device=device).expand(B, n)
+    )
+
+    # Work on flat (B * n,) tensors, and keep only edges between undecided nodes
+    ranks = ranks.reshape(-1)
+    selected = selected.reshape(-1)
+    undecided = undecided.reshape(-1)
+    active = undecided.view(B, n)[:, row] & undecided.view(B, n)[:, col] & (row != col)
+    batch_idx, edge_idx = active.nonzero(as_tuple=True)
+    src = batch_idx * n + row[edge_idx]
+    dst = batch_idx * n + col[edge_idx]
+
+    while undecided.any():
+        # Smallest rank among the undecided neighbors of each node. Shape: (B * n,)
+        min_neighbor_ranks = torch.full_like(ranks, n).scatter_reduce(
+            0, src, ranks[dst], reduce="amin"
+        )
+
+        # Local minima join the set. Two of them are never adjacent.
+        joins = undecided & (ranks < min_neighbor_ranks)
+        selected |= joins
+
+        # Neighbors of the new nodes are excluded
+        excluded = (
+            torch.zeros_like(ranks, dtype=torch.int32).index_add_(
+                0, dst, joins[src].int()
+            )
+            > 0
+        )
+        undecided &= ~(joins | excluded)
+
+        still_active = undecided[src] & undecided[dst]
+        src, dst = src[still_active], dst[still_active]
+
+    return selected.view(B, n)
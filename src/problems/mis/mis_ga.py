@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import math
+import multiprocessing as mp
 import os
 import warnings
+from collections import OrderedDict
 from copy import deepcopy
+from dataclasses import replace
 from pathlib import Path
 from tempfile import mkdtemp
 from typing import TYPE_CHECKING, ClassVar, Literal
@@ -15,6 +18,15 @@ from evotorch import Problem, SolutionBatch
 from evotorch.algorithms import GeneticAlgorithm
 from evotorch.decorators import vectorized
 from evotorch.operators import CopyingOperator, CrossOver
+from problems.mis.mis_branch_and_reduce import solve_branch_and_reduce_mis
+from problems.mis.mis_packed import (
+    hash_packed_rows,
+    n_words,
+    pack_solutions,
+    packed_fitness,
+    unpack_solutions,
+)
+from problems.mis.mis_recombination_cache import RecombinationCache
 from problems.mis.solve_optimal_recombination import (
     OptimalRecombResults,
     solve_local_branching_mis,
@@ -25,9 +37,12 @@ from torch_geometric.data import Batch
 from difusco.sampler import DifuscoSampler
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     import pandas as pd
     from config.myconfig import Config
     from problems.mis.mis_instance import MISInstance
+    from typing_extensions import Self
 
 
 @vectorized
@@ -35,12 +50,19 @@ def evaluate_population(population: torch.Tensor) -> torch.Tensor:
     return population.sum(dim=-1)
 
 
+@vectorized
+def evaluate_packed_population(population: torch.Tensor) -> torch.Tensor:
+    return packed_fitness(population)
+
+
 class MISGaProblem(Problem):
     def __init__(self, instance: MISInstance, config: Config, sample: tuple) -> None:
         self.instance = instance
         self.config = config
         self.config.task = "mis"
         self.sample = sample
+        # packed population: 64 nodes per int64 word, see problems.mis.mis_packed
+        self.packed = "packed_population" in config and config.packed_population
 
         if config.recombination == "difuscombination":
             self.sampler = self._get_difuscombination_sampler()
@@ -49,14 +71,31 @@ class MISGaProblem(Problem):
             self.sampler = None
             self.batch = None
 
+        solution_length = n_words(instance.n_nodes) if self.packed else instance.n_nodes
         super().__init__(
-            objective_func=evaluate_population,
+            objective_func=(
+                evaluate_packed_population if self.packed else evaluate_population
+            ),
             objective_sense="max",
-            solution_length=instance.n_nodes,
+            solution_length=solution_length,
             device=config.device,
-            dtype=torch.bool,
+            dtype=torch.int64 if self.packed else torch.bool,
         )
 
+    def pack(self, solutions: torch.Tensor) -> torch.Tensor:
+        """Boolean solutions of shape (B, n_nodes) to population values."""
+        return pack_solutions(solutions) if self.packed else solutions
+
+    def unpack(self, values: torch.Tensor) -> torch.Tensor:
+        """Population values to boolean solutions of shape (B, n_nodes)."""
+        if self.packed:
+            return unpack_solutions(values, self.instance.n_nodes)
+        return values.bool()
+
+    def get_solution_sizes(self, values: torch.Tensor) -> torch.Tensor:
+        """Number of selected nodes of every solution, without unpacking."""
+        return packed_fitness(values) if self.packed else values.sum(dim=-1)
+
     @staticmethod
     def _fake_paths_for_difuscombination_models(config: Config) -> Config:
         # fake paths for difuscombination
@@ -140,17 +179,21 @@ class MISGaProblem(Problem):
         Values is a tensor of shape (B, solution_length).
         Initialization heuristic: (randomized) construction heuristic based on node degree.
         """
+        pop_size = values.shape[0]
         degrees = self.instance.get_degrees()
         inversed_normalized_degrees = 1 - degrees / degrees.max()
 
         # Create scaling factors for noise (0 to 0.2)
-        scales = torch.linspace(0, 0.2, values.shape[0], device=self.device)
-        # Generate noise for all solutions at once (pop_size, solution_length)
-        noise = torch.randn(values.shape, device=self.device) * scales.unsqueeze(1)
+        scales = torch.linspace(0, 0.2, pop_size, device=self.device)
+        # Generate noise for all solutions at once (pop_size, n_nodes)
+        noise = torch.randn(
+            (pop_size, self.instance.n_nodes), device=self.device
+        ) * scales.unsqueeze(1)
         # Broadcast inversed_normalized_degrees to match the shape
         priorities = inversed_normalized_degrees.unsqueeze(0) + noise
 
-        values[:] = self.instance.get_feasible_from_individual_batch(priorities)
+        solutions = self.instance.get_feasible_from_individual_batch(priorities)
+        values[:] = self.pack(solutions)
 
     def _fill_difusco_sampling(self, values: torch.Tensor) -> None:
         """
@@ -170,7 +213,8 @@ class MISGaProblem(Problem):
         node_scores = sampler.sample(self.sample)
 
         # Convert scores to feasible solutions
-        values[:] = self.instance.get_feasible_from_individual_batch(node_scores)
+        solutions = self.instance.get_feasible_from_individual_batch(node_scores)
+        values[:] = self.pack(solutions)
 
 
 class MISGAMutation(CopyingOperator):
@@ -184,7 +228,8 @@ class MISGAMutation(CopyingOperator):
     ) -> None:
         """
         Mutation operator for the Maximum Independent Set problem. With probability deselect_prob, a selected node is
-        unselected and gets a probability of zero. Solution is then made feasible.
+        unselected and gets a probability of zero. The other selected nodes are kept,
+        and the solution is made feasible by greedily filling the free nodes.
         Only applies mutation with probability mutation_prob. When preserve_preserve_optimal_recombination is True,
         mutation is not applied to the first half of the population.
 
@@ -208,7 +253,7 @@ class MISGAMutation(CopyingOperator):
         result = deepcopy(batch)
         data = result.access_values()
 
-        pop_size, n_nodes = data.shape
+        pop_size = data.shape[0]
 
         # Decide which individuals to mutate
         mutation_mask = (
@@ -227,7 +272,7 @@ class MISGAMutation(CopyingOperator):
         mutate_indices = mutation_mask.nonzero(as_tuple=True)[0]
 
         # Generate deselect mask and priorities only for the solutions that are going to be mutated.
-        sub_data = data[mutate_indices]
+        sub_data = self._problem.unpack(data[mutate_indices])
         deselect_mask = (
             torch.rand(sub_data.shape, device=data.device, dtype=torch.float32)
             <= self._deselect_prob
@@ -237,47 +282,92 @@ class MISGAMutation(CopyingOperator):
         # For nodes that are both deselected and originally selected, set priority to zero.
         priorities[deselect_mask & sub_data.bool()] = 0
 
+        # The selected nodes that are not deselected are kept, only the rest is decoded.
+        kept = sub_data.bool() & ~deselect_mask
+
         # Only update those solutions that have at least one deselected node.
         update_mask = deselect_mask.sum(dim=-1) > 0
         if update_mask.any():
             indices_to_update = mutate_indices[update_mask]
-            feasible = self._instance.get_feasible_from_individual_batch(
-                priorities[update_mask]
+            feasible = self._instance.get_feasible_from_partial_batch(
+                priorities[update_mask], forced_in=kept[update_mask]
             )
-            data[indices_to_update] = feasible
+            data[indices_to_update] = self._problem.pack(feasible)
+
+        return result
 
+
+class MISGALocalSearch(CopyingOperator):
+    def __init__(
+        self, problem: Problem, instance: MISInstance, max_iterations: int = 10
+    ) -> None:
+        """
+        Local search operator for the Maximum Independent Set problem. Applies
+        (1,2)-swaps (remove one node, insert two) to the whole population at once, for
+        at most max_iterations iterations per call. Solutions never get worse.
+
+        Args:
+            problem: The problem object to work with.
+            instance: The instance object to work with.
+            max_iterations: The iteration budget of every call.
+        """
+        super().__init__(problem)
+        self._instance = instance
+        self._max_iterations = max_iterations
+
+    @torch.no_grad()
+    def _do(self, batch: SolutionBatch) -> SolutionBatch:
+        result = deepcopy(batch)
+        data = result.access_values()
+        solutions = self._instance.local_search(
+            self._problem.unpack(data), max_iterations=self._max_iterations
+        )
+        data[:] = self._problem.pack(solutions)
         return result
 
 
 class LocalBranchingSolver:
-    """Solver for the recombination. Cache results for the same instance."""
+    """
+    Solver for the recombination. Cache results for the same instance and unordered pair
+    of parents, in a bounded in-memory LRU cache, and in a persistent RecombinationCache
+    if given.
+    """
 
-    # Class-level cache dictionary with ClassVar annotation
-    _cache: ClassVar[dict[tuple, OptimalRecombResults]] = {}
+    # Class-level LRU cache with ClassVar annotation
+    _cache: ClassVar[OrderedDict[tuple, OptimalRecombResults]] = OrderedDict()
+    _max_cache_size: ClassVar[int] = 10_000
 
-    def __init__(self, instance: MISInstance) -> None:
+    def __init__(
+        self,
+        instance: MISInstance,
+        persistent_cache: RecombinationCache | None = None,
+        recombination_fn: Callable[
+            ..., OptimalRecombResults
+        ] = solve_local_branching_mis,
+    ) -> None:
         self.instance = instance
-        # Instance-specific cache key prefix (based on instance identity)
-        self._instance_id = id(instance)
+        self._recombination_fn = recombination_fn
+        # Instance-specific cache key prefix, based on the graph and not on the object
+        # identity
+        self._instance_hash = instance.content_hash
+        self._persistent_cache = persistent_cache
 
     def solve(
         self, solution_1: tuple, solution_2: tuple, time_limit: int = 60, **kwargs
     ) -> OptimalRecombResults:
-        # Create a cache key that includes the instance ID and all parameters
         k_factor = kwargs.get("k_factor", None)
-        cache_key = (self._instance_id, solution_1, solution_2, time_limit, k_factor)
 
         # Check if result is in cache
-        if cache_key in self._cache:
-            print("using cached result")
-            return self._cache[cache_key]
+        result = self.lookup(solution_1, solution_2, time_limit, k_factor)
+        if result is not None:
+            return result
 
         # Convert tuples back to np.array
         solution_1_array = np.array(solution_1)
         solution_2_array = np.array(solution_2)
 
         # Call the original function
-        result = solve_local_branching_mis(
+        result = self._recombination_fn(
             self.instance,
             solution_1_array,
             solution_2_array,
@@ -285,16 +375,117 @@ class LocalBranchingSolver:
             **kwargs,
         )
 
-        # Store in cache
-        self._cache[cache_key] = result
+        self.store(solution_1, solution_2, time_limit, k_factor, result)
         return result
 
+    def _get_cache_key(
+        self,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None,
+    ) -> tuple:
+        # Cache key that includes the instance hash and all parameters
+        pair = tuple(sorted([solution_1, solution_2]))
+        return (self._instance_hash, pair, time_limit, k_factor)
+
+    def lookup(
+        self,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None = None,
+    ) -> OptimalRecombResults | None:
+        """Returns the cached result of the recombination, or None if not cached."""
+        cache_key = self._get_cache_key(solution_1, solution_2, time_limit, k_factor)
+        if cache_key in self._cache:
+            print("using cached result")
+            self._cache.move_to_end(cache_key)
+            result = self._cache[cache_key]
+            return self._with_parent_order(result, solution_1, solution_2)
+
+        if self._persistent_cache is not None:
+            result = self._persistent_cache.get(
+                self._instance_hash,
+                self.instance.n_nodes,
+                solution_1,
+                solution_2,
+                time_limit,
+                k_factor,
+            )
+            if result is not None:
+                print("using persistent cached result")
+                self._put_in_cache(cache_key, result)
+                return result
+
+        return None
+
+    def store(
+        self,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None,
+        result: OptimalRecombResults,
+    ) -> None:
+        cache_key = self._get_cache_key(solution_1, solution_2, time_limit, k_factor)
+        self._put_in_cache(cache_key, result)
+        if self._persistent_cache is not None:
+            self._persistent_cache.put(
+                self._instance_hash,
+                solution_1,
+                solution_2,
+                time_limit,
+                k_factor,
+                result,
+            )
+
+    def _put_in_cache(self, cache_key: tuple, result: OptimalRecombResults) -> None:
+        self._cache[cache_key] = result
+        self._cache.move_to_end(cache_key)
+        if len(self._cache) > self._max_cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _with_parent_order(
+        result: OptimalRecombResults, solution_1: tuple, solution_2: tuple
+    ) -> OptimalRecombResults:
+        """The cached result may have been computed with the parents swapped."""
+        return replace(
+            result, parent_1_obj=len(solution_1), parent_2_obj=len(solution_2)
+        )
+
     @classmethod
     def clear_cache(cls: type[LocalBranchingSolver]) -> None:
         """Clear the class-level cache."""
         cls._cache.clear()
 
 
+# Instance of the recombination worker processes, set by the pool initializer
+_worker_instance: MISInstance | None = None
+
+
+def _init_recombination_worker(instance: MISInstance) -> None:
+    global _worker_instance
+    _worker_instance = instance
+
+
+def _solve_recombination_in_worker(
+    recombination_fn: Callable[..., OptimalRecombResults],
+    solution_1: tuple,
+    solution_2: tuple,
+    time_limit: int,
+    **kwargs,
+) -> OptimalRecombResults:
+    return recombination_fn(
+        _worker_instance,
+        np.array(solution_1),
+        np.array(solution_2),
+        time_limit=time_limit,
+        **kwargs,
+    )
+
+
 class MISGACrossverOptimal(CrossOver):
     def __init__(
         self,
@@ -303,7 +494,32 @@ class MISGACrossverOptimal(CrossOver):
         tmp_dir: Path,
         tournament_size: int = 2,
         opt_recomb_time_limit: int = 15,
+        persistent_cache: RecombinationCache | None = None,
+        n_workers: int = 1,
+        n_threads: int = 0,
+        pairing_timeout: float | None = None,
+        solver: Literal["local_branching", "branch_and_reduce"] = "local_branching",
     ) -> None:
+        """
+        Optimal recombination, with Gurobi local branching or with the license-free
+        branch-and-reduce solver on the free subgraph of the parents. With
+        n_workers > 1, the pairings are solved concurrently by a pool of worker
+        processes.
+
+        Args:
+            problem: The problem object to work with.
+            instance: The instance object to work with.
+            tmp_dir: Directory of the optimal recombination results table.
+            tournament_size: The tournament size of the parent selection.
+            opt_recomb_time_limit: The Gurobi time limit of every pairing.
+            persistent_cache: Optional cache of results shared between runs.
+            n_workers: Number of concurrent Gurobi environments.
+            n_threads: Global thread budget, split across the workers. 0 means no limit.
+            pairing_timeout: Seconds to wait for a pairing solved by a worker. After
+                that, the best parent is kept as child. Defaults to
+                opt_recomb_time_limit + 60.
+            solver: The recombination solver, "local_branching" or "branch_and_reduce".
+        """
         super().__init__(
             problem,
             tournament_size=tournament_size,
@@ -311,7 +527,30 @@ class MISGACrossverOptimal(CrossOver):
         self._instance = instance
         self._tmp_dir = tmp_dir
         self._opt_recomb_time_limit = opt_recomb_time_limit
-        self.solver = LocalBranchingSolver(instance)  # Initialize the solver
+        # Initialize the solver
+        if solver == "local_branching":
+            self._recombination_fn = solve_local_branching_mis
+            self._solver_kwargs = {"k_factor": 1.75}
+        elif solver == "branch_and_reduce":
+            # no k_factor, so that the cached results of the two solvers differ in key
+            self._recombination_fn = solve_branch_and_reduce_mis
+            self._solver_kwargs = {}
+        else:
+            error_msg = f"Invalid recombination solver: {solver}"
+            raise ValueError(error_msg)
+        self.solver = LocalBranchingSolver(
+            instance,
+            persistent_cache=persistent_cache,
+            recombination_fn=self._recombination_fn,
+        )
+
+        self._n_workers = n_workers
+        if n_threads > 0:
+            self._solver_kwargs["threads"] = max(1, n_threads // n_workers)
+        self._pairing_timeout = (
+            opt_recomb_time_limit + 60 if pairing_timeout is None else pairing_timeout
+        )
+        self._pool = None
 
         # create a TableSaver object to save the results of the optimal recombination
         self.table_saver = TableSaver(self._tmp_dir / "optimal_recombination.csv")
@@ -322,6 +561,85 @@ class MISGACrossverOptimal(CrossOver):
     ) -> SolutionBatch:
         return self._do_cross_over_optimal(parents1, parents2)
 
+    def _get_pool(self) -> mp.pool.Pool:
+        if self._pool is None:
+            ctx = mp.get_context("spawn")
+            self._pool = ctx.Pool(
+                processes=self._n_workers,
+                initializer=_init_recombination_worker,
+                initargs=(self._instance,),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """Terminates the worker processes, if any."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _solve_pairings(
+        self, pairings: list[tuple[tuple, tuple]]
+    ) -> list[OptimalRecombResults | None]:
+        """
+        Solves the pairings, in order. Cached pairings are not solved again. In parallel
+        mode, the result of a pairing is None if it timed out.
+        """
+        time_limit = self._opt_recomb_time_limit
+        k_factor = self._solver_kwargs.get("k_factor")
+
+        if self._n_workers <= 1:
+            return [
+                self.solver.solve(
+                    solution_1, solution_2, time_limit=time_limit, **self._solver_kwargs
+                )
+                for solution_1, solution_2 in pairings
+            ]
+
+        # submit the pairings that are not cached, in order
+        results = [
+            self.solver.lookup(solution_1, solution_2, time_limit, k_factor)
+            for solution_1, solution_2 in pairings
+        ]
+        pool = self._get_pool()
+        pending = {
+            i: pool.apply_async(
+                _solve_recombination_in_worker,
+                (self._recombination_fn, *pairings[i], time_limit),
+                self._solver_kwargs,
+            )
+            for i, result in enumerate(results)
+            if result is None
+        }
+
+        # collect in order: when pairing i is awaited, all earlier pairings are done, so
+        # pairing i is already running and the timeout is a per-pairing timeout
+        timed_out = False
+        for i, async_result in pending.items():
+            try:
+                results[i] = async_result.get(timeout=self._pairing_timeout)
+            except mp.TimeoutError:
+                warnings.warn(
+                    f"Optimal recombination of pairing {i} timed out, "
+                    "keeping best parent",
+                    RuntimeWarning,
+                    stacklevel=2,
+                )
+                timed_out = True
+                continue
+            self.solver.store(*pairings[i], time_limit, k_factor, results[i])
+
+        if timed_out:
+            # the stuck workers can only be stopped by restarting the pool
+            self.close()
+        return results
+
     @no_grad()
     def _do_cross_over_optimal(
         self, parents1: torch.Tensor, parents2: torch.Tensor
@@ -331,37 +649,43 @@ class MISGACrossverOptimal(CrossOver):
         """
         num_pairings = parents1.shape[0]
         device = parents1.device
+        parents1 = self._problem.unpack(parents1)
+        parents2 = self._problem.unpack(parents2)
 
         children_1 = parents1.clone()
         children_2 = parents2.clone()
 
-        for i in range(num_pairings):
-            solution_1 = tuple(parents1[i].cpu().numpy().nonzero()[0])
-            solution_2 = tuple(parents2[i].cpu().numpy().nonzero()[0])
-
-            result = self.solver.solve(
-                solution_1,
-                solution_2,
-                time_limit=self._opt_recomb_time_limit,
-                k_factor=1.75,
+        pairings = [
+            (
+                tuple(parents1[i].cpu().numpy().nonzero()[0]),
+                tuple(parents2[i].cpu().numpy().nonzero()[0]),
             )
-
-            save_in_dict = {
-                "parent_1": ",".join(map(str, solution_1)),
-                "parent_2": ",".join(map(str, solution_2)),
-                "children": ",".join(map(str, result.children)),
-                "instance_id": self._problem.sample[0].item(),
-                "runtime": result.runtime,
-            }
-            self.table_saver.put(save_in_dict)
-
-            children_1[i] = torch.tensor(result.children_np_labels, device=device)
+            for i in range(num_pairings)
+        ]
+        results = self._solve_pairings(pairings)
+
+        for i, ((solution_1, solution_2), result) in enumerate(zip(pairings, results)):
+            if result is None:
+                # timed out, keep the best parent
+                best_is_1 = len(solution_1) >= len(solution_2)
+                children_1[i] = parents1[i] if best_is_1 else parents2[i]
+            else:
+                save_in_dict = {
+                    "parent_1": ",".join(map(str, solution_1)),
+                    "parent_2": ",".join(map(str, solution_2)),
+                    "children": ",".join(map(str, result.children)),
+                    "instance_id": self._problem.sample[0].item(),
+                    "runtime": result.runtime,
+                }
+                self.table_saver.put(save_in_dict)
+
+                children_1[i] = torch.tensor(result.children_np_labels, device=device)
             children_2[i] = (
                 parents1[i].clone() if torch.rand(1) < 0.5 else parents2[i].clone()
             )
 
         children = torch.cat([children_1, children_2], dim=0)
-        return self._make_children_batch(children)
+        return self._make_children_batch(self._problem.pack(children))
 
 
 class MISGACrossover(CrossOver):
@@ -399,34 +723,30 @@ class MISGACrossover(CrossOver):
         - batch_size: num_pairings
         """
         num_pairings = parents1.shape[0]
+        n_nodes = self._instance.n_nodes
 
-        features = torch.stack([parents1, parents2], dim=2)
-        assert features.shape == (num_pairings, self.problem.solution_length, 2), (
-            "Incorrect features shape"
+        features = torch.stack(
+            [self._problem.unpack(parents1), self._problem.unpack(parents2)], dim=2
         )
+        assert features.shape == (num_pairings, n_nodes, 2), "Incorrect features shape"
         # we need to reshape the features to (num_pairings * n_nodes, 2)
-        features = features.reshape(num_pairings * self.problem.solution_length, 2)
-        assert features.shape == (num_pairings * self.problem.solution_length, 2), (
-            "Incorrect features shape"
-        )
+        features = features.reshape(num_pairings * n_nodes, 2)
+        assert features.shape == (num_pairings * n_nodes, 2), "Incorrect features shape"
         heatmaps = self._problem.sampler.sample(
             self._problem.batch, features=features
         ).to(self.problem.device)
-        assert heatmaps.shape == (
-            num_pairings,
-            2,
-            self.problem.solution_length,
-        ), (
-            f"Incorrect heatmaps shape: {heatmaps.shape}, expected (num_pairings, 2, solution_length)"
+        assert heatmaps.shape == (num_pairings, 2, n_nodes), (
+            f"Incorrect heatmaps shape: {heatmaps.shape}, "
+            "expected (num_pairings, 2, n_nodes)"
         )
 
-        # split into two children by dropping dimension 1 -> (num_pairings, solution_length)
+        # split into two children by dropping dimension 1 -> (num_pairings, n_nodes)
         heatmaps_child1 = heatmaps.select(1, 0)
         heatmaps_child2 = heatmaps.select(1, 1)
 
         heatmaps_child = torch.cat([heatmaps_child1, heatmaps_child2], dim=0)
         children = self._instance.get_feasible_from_individual_batch(heatmaps_child)
-        return self._make_children_batch(children)
+        return self._make_children_batch(self._problem.pack(children))
 
     @no_grad()
     def _do_cross_over_classic(
@@ -438,25 +758,24 @@ class MISGACrossover(CrossOver):
         num_pairings = parents1.shape[0]
         device = parents1.device
 
-        # Find common nodes between parents
-        common_nodes = (parents1 & parents2).bool()  # Element-wise AND
+        # Find common nodes between parents, with an element-wise (or packed) AND
+        common_nodes = self._problem.unpack(parents1 & parents2)
 
-        # Random values between 0 and 0.5, 1 if node forced to selection
+        # Random values between 0 and 0.5, common nodes are forced to selection
         priority1 = (
             torch.rand(
                 num_pairings,
-                self.problem.solution_length,
+                self._instance.n_nodes,
                 device=device,
                 dtype=torch.float32,
             )
             * 0.5
         )
-        priority1[common_nodes] = 1
         # Random values between 0.5 and 1, 0 if node penalized for selection
         priority2 = (
             torch.rand(
                 num_pairings,
-                self.problem.solution_length,
+                self._instance.n_nodes,
                 device=device,
                 dtype=torch.float32,
             )
@@ -466,8 +785,11 @@ class MISGACrossover(CrossOver):
         priority2[common_nodes] = 0
 
         priorities = torch.cat([priority1, priority2], dim=0)
-        children = self._instance.get_feasible_from_individual_batch(priorities)
-        return self._make_children_batch(children)
+        forced_in = torch.cat([common_nodes, torch.zeros_like(common_nodes)], dim=0)
+        children = self._instance.get_feasible_from_partial_batch(
+            priorities, forced_in=forced_in
+        )
+        return self._make_children_batch(self._problem.pack(children))
 
 
 class TempSaver(CopyingOperator):
@@ -479,7 +801,7 @@ class TempSaver(CopyingOperator):
         os.makedirs(os.path.dirname(tmp_file), exist_ok=True)
 
     def _get_population_string(self, batch: SolutionBatch) -> str:
-        data = batch.values
+        data = self._problem.unpack(batch.values)
         # for each solution in the batch, take the non-zero indices
         solutions_str = []
         for i in range(data.shape[0]):
@@ -521,6 +843,12 @@ class MISGA(GeneticAlgorithm):
         except AttributeError:
             return None
 
+    def close(self) -> None:
+        """Terminates the worker processes of the operators, if any."""
+        for operator in self._operators:
+            if isinstance(operator, MISGACrossverOptimal):
+                operator.close()
+
     @torch.no_grad()
     def _take_tournament(self, batch: SolutionBatch, popsize: int) -> SolutionBatch:
         """
@@ -660,7 +988,9 @@ class MISGA(GeneticAlgorithm):
             self._population = self._take_tournament(extended_population, popsize)
         else:
             raise ValueError(f"Invalid selection method: {self._selection_method}")
-        print(f"population: {self._population.values.sum(dim=-1)}")
+        print(
+            f"population: {self._problem.get_solution_sizes(self._population.values)}"
+        )
 
         # Save population stats to file
         self._temp_saver.save(self._population)
@@ -668,19 +998,20 @@ class MISGA(GeneticAlgorithm):
     def _take_best_unique(
         self, extended_population: SolutionBatch, popsize: int
     ) -> SolutionBatch:
-        sorted_indices = extended_population.argsort().tolist()
+        sorted_indices = extended_population.argsort()
 
         # get unique indices
         unique_indices = get_unique_indices(extended_population.values)
         num_unique = unique_indices.shape[0]
 
-        # sort unique indices by objective value, i.e., by the sorted_indices.index(idx)
-        unique_indices_sorted = sorted(
-            unique_indices, key=lambda idx: sorted_indices.index(idx)
-        )
-        unique_indices_sorted_torch = torch.tensor(
-            unique_indices_sorted, device=extended_population.device
+        # sort unique indices by objective value, i.e. by position in sorted_indices
+        ranks = torch.empty_like(sorted_indices)
+        ranks[sorted_indices] = torch.arange(
+            sorted_indices.shape[0], device=sorted_indices.device
         )
+        unique_indices_sorted_torch = unique_indices[
+            torch.argsort(ranks[unique_indices])
+        ]
 
         # Repeat indices to match population size
         k = popsize // num_unique
@@ -696,7 +1027,29 @@ class MISGA(GeneticAlgorithm):
 
 
 def get_unique_indices(t: torch.Tensor) -> torch.Tensor:
-    """Returns the indices of the first occurrences of unique rows in a 2D tensor, preserving order."""
+    """
+    Returns the indices of the first occurrences of unique rows in a 2D tensor,
+    preserving order. Rows are grouped by hash in O(n) and compared with the first row
+    of their group. If a hash collision is detected, falls back to the pairwise
+    comparison.
+    """
+    n = t.size(0)
+    packed = pack_solutions(t) if t.dtype == torch.bool else t.long()
+    _, groups = torch.unique(hash_packed_rows(packed), return_inverse=True)
+
+    # index of the first row of every group
+    indices = torch.arange(n, device=t.device)
+    first = torch.full((n,), n, dtype=torch.long, device=t.device).scatter_reduce_(
+        0, groups, indices, reduce="amin"
+    )[groups]
+
+    if not (t == t[first]).all():
+        return get_unique_indices_pairwise(t)
+    return torch.nonzero(indices == first).squeeze(dim=1)
+
+
+def get_unique_indices_pairwise(t: torch.Tensor) -> torch.Tensor:
+    """Like get_unique_indices, comparing every row with all later rows in O(n^2)."""
     n = t.size(0)
     unique_mask = torch.ones(n, dtype=torch.bool, device=t.device)
     for i in range(n - 1):
@@ -716,13 +1069,29 @@ def create_mis_ga(
 
     problem = MISGaProblem(instance, config, sample)
 
-    if config.recombination == "optimal":
+    if config.recombination in ["optimal", "branch_and_reduce"]:
+        n_workers = config.opt_recomb_workers if "opt_recomb_workers" in config else 1
+        n_threads = config.opt_recomb_threads if "opt_recomb_threads" in config else 0
+        persistent_cache = None
+        if "recombination_cache_path" in config and config.recombination_cache_path:
+            persistent_cache = RecombinationCache(
+                config.recombination_cache_path,
+                max_entries=config.recombination_cache_max_entries,
+            )
         crossover = MISGACrossverOptimal(
             problem,
             instance,
             tournament_size=config.tournament_size,
             opt_recomb_time_limit=config.opt_recomb_time_limit,
             tmp_dir=tmp_dir,
+            persistent_cache=persistent_cache,
+            n_workers=n_workers,
+            n_threads=n_threads,
+            solver=(
+                "local_branching"
+                if config.recombination == "optimal"
+                else "branch_and_reduce"
+            ),
         )
     else:
         crossover = MISGACrossover(
@@ -749,6 +1118,13 @@ def create_mis_ga(
         "tmp_dir": tmp_dir,
     }
 
+    if "max_local_search_it" in config and config.max_local_search_it > 0:
+        new_kwargs["operators"].append(
+            MISGALocalSearch(
+                problem, instance, max_iterations=config.max_local_search_it
+            )
+        )
+
     if "selection_method" in config:
         new_kwargs["selection_method"] = config.selection_method
 
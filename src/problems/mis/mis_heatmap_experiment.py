@@ -1,8 +1,14 @@
+from __future__ import annotations
+
 import timeit
+from typing import TYPE_CHECKING
 
 import torch
-from config.myconfig import Config
-from problems.mis.mis_instance import MISInstance
+
+if TYPE_CHECKING:
+    from config.myconfig import Config
+    from problems.mis.mis_instance import MISInstance
+    from problems.mis.mis_kernelization import MISKernel
 
 
 def get_feasible_solutions(
@@ -12,7 +18,10 @@ def get_feasible_solutions(
 
 
 def metrics_on_mis_heatmaps(
-    heatmaps: torch.Tensor, instance: MISInstance, config: Config
+    heatmaps: torch.Tensor,
+    instance: MISInstance,
+    config: Config,
+    kernel: MISKernel | None = None,
 ) -> dict:
     """Calculate metrics on MIS heatmaps including selection frequencies.
 
@@ -20,27 +29,36 @@ def metrics_on_mis_heatmaps(
         heatmaps: Tensor of shape (n_solutions, n_vertices) containing sampled solutions
         instance: MIS problem instance
         config: Configuration object
+        kernel: Kernel of the instance. If given, the heatmaps are on the kernel nodes,
+            and the costs are those of the solutions lifted to the original instance.
 
     Returns:
         Dictionary containing metrics including costs, gaps and selection frequencies
     """
+    decode_instance = instance if kernel is None else kernel.instance
+
     assert heatmaps.shape[0] == config.pop_size, (
         f"heatmaps.shape[0] {heatmaps.shape[0]} != config.pop_size {config.pop_size}"
     )
-    assert heatmaps.shape[1] == instance.n_nodes, (
-        f"heatmaps.shape[1] {heatmaps.shape[1]} != instance.n_nodes {instance.n_nodes}"
+    assert heatmaps.shape[1] == decode_instance.n_nodes, (
+        f"heatmaps.shape[1] {heatmaps.shape[1]} != n_nodes {decode_instance.n_nodes}"
     )
 
     start_time = timeit.default_timer()
-    solutions = get_feasible_solutions(heatmaps, instance)
+    solutions = get_feasible_solutions(heatmaps, decode_instance)
     end_time = timeit.default_timer()
     feasibility_heuristics_time = end_time - start_time
 
     assert solutions.shape[0] == config.pop_size
-    assert solutions.shape[1] == instance.n_nodes
-
-    # Calculate costs and gaps
-    costs = solutions.float().sum(dim=1)
+    assert solutions.shape[1] == decode_instance.n_nodes
+
+    # Calculate costs and gaps, on the original instance
+    if kernel is not None:
+        lifted = kernel.lift(solutions)
+        assert instance.is_independent_set(lifted), "Lifted solutions are infeasible"
+        costs = lifted.float().sum(dim=1)
+    else:
+        costs = solutions.float().sum(dim=1)
 
     instance_results = {
         "best_cost": costs.max(),
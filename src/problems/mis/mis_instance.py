@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 from abc import abstractmethod
+from functools import cached_property
 from typing import Literal
 
 import numpy as np
 import torch
 from ea.problem_instance import ProblemInstance
 from problems.mis.mis_evaluation import (
+    csr_to_neighbors_padded,
+    is_cython_decode_available,
+    mis_decode_cython_batched,
     mis_decode_torch_batched,
-    precompute_neighbors_padded,
+    mis_decode_torch_rounds,
+    precompute_neighbors_csr,
 )
+from problems.mis.mis_instance_cache import MISInstanceCache
+from problems.mis.mis_operators import batched_local_search_torch
 from scipy.sparse import coo_matrix, csr_matrix
+from torch_geometric.data import Batch
+from torch_geometric.data import Data as GraphData
 
 from difusco.mis.pl_mis_model import MISModel
 
@@ -34,12 +43,24 @@ class MISInstanceBase(ProblemInstance):
 
     @abstractmethod
     def get_feasible_from_individual_batch(
-        self, individual: torch.Tensor
+        self,
+        individual: torch.Tensor,
+        decoder: Literal["auto", "sequential", "rounds", "cython"] = "auto",
     ) -> torch.Tensor:
         """Returns a tensor of shape (batch_size, n_nodes) with the nodes in the MIS."""
 
 
 class MISInstance(MISInstanceBase):
+    # names of the arrays of get_cache_arrays
+    CACHE_ARRAY_NAMES = (
+        "adj_data",
+        "adj_indices",
+        "adj_indptr",
+        "adj_shape",
+        "crow",
+        "col",
+    )
+
     def __init__(
         self,
         n_nodes: int,
@@ -47,6 +68,7 @@ class MISInstance(MISInstanceBase):
         gt_labels: np.array | None = None,
         adj_matrix_np: csr_matrix | None = None,
         device: Literal["cpu", "cuda"] = "cpu",
+        neighbors_csr: tuple[torch.Tensor, torch.Tensor] | None = None,
     ) -> None:
         super().__init__(device)
         self.n_nodes = n_nodes
@@ -64,20 +86,25 @@ class MISInstance(MISInstanceBase):
         else:
             self.adj_matrix_np = adj_matrix_np
 
-        # Create sparse pytorch adjacency matrix
-        # TODO: check if we can simplify this
-        values = torch.ones(edge_index.shape[1], dtype=torch.float32, device=device)
-        adj_matrix_sparse = (
-            torch.sparse_coo_tensor(
-                edge_index, values, (n_nodes, n_nodes), device=device
-            )
-            .coalesce()
-            .to_sparse_csr()
-        )
+        # CSR neighbor arrays: the neighbors of node i are col[crow[i] : crow[i + 1]]
+        if neighbors_csr is None:
+            self.crow, self.col = precompute_neighbors_csr(self.edge_index, n_nodes)
+        else:
+            self.crow, self.col = (t.to(device) for t in neighbors_csr)
+        self.degrees = self.crow[1:] - self.crow[:-1]
 
-        neighbors_padded, degrees = precompute_neighbors_padded(adj_matrix_sparse)
-        self.neighbors_padded = neighbors_padded.to(device)
-        self.degrees = degrees.to(device)
+    @cached_property
+    def neighbors_padded(self) -> torch.Tensor:
+        """
+        Neighbors as a (n_nodes, max_degree) table padded with -1. Only needed by the
+        sequential decoder, so it is built on first use.
+        """
+        return csr_to_neighbors_padded(self.crow, self.col)
+
+    @cached_property
+    def content_hash(self) -> str:
+        """Hash of the graph, equal for instances of the same graph across processes."""
+        return MISInstanceCache.get_key(self.edge_index, self.n_nodes)
 
     @staticmethod
     def create_from_batch_sample(sample: tuple, device: str) -> MISInstance:
@@ -90,6 +117,65 @@ class MISInstance(MISInstanceBase):
 
         return MISInstance(n_nodes, edge_index, node_labels, adj_matrix_np, device)
 
+    @staticmethod
+    def create_from_batch_sample_cached(
+        sample: tuple, device: str, cache: MISInstanceCache
+    ) -> MISInstance:
+        """
+        Like create_from_batch_sample, but the preprocessed arrays (adjacency matrix and
+        CSR neighbors) are loaded from the cache if the graph has been seen before.
+        """
+        node_labels, edge_index, _, _ = MISModel.process_batch(
+            batch=sample, build_adj_mat=False
+        )
+        n_nodes = node_labels.shape[0]
+
+        key = cache.get_key(edge_index, n_nodes)
+        arrays = cache.load(key, MISInstance.CACHE_ARRAY_NAMES)
+        if arrays is None:
+            instance = MISInstance(n_nodes, edge_index, node_labels, device=device)
+            cache.store(key, instance.get_cache_arrays())
+            return instance
+
+        adj_matrix_np = csr_matrix(
+            (arrays["adj_data"], arrays["adj_indices"], arrays["adj_indptr"]),
+            shape=tuple(arrays["adj_shape"]),
+        )
+        neighbors_csr = (
+            torch.from_numpy(np.array(arrays["crow"])),
+            torch.from_numpy(np.array(arrays["col"])),
+        )
+        return MISInstance(
+            n_nodes,
+            edge_index,
+            node_labels,
+            adj_matrix_np,
+            device,
+            neighbors_csr=neighbors_csr,
+        )
+
+    def get_sample(self, sample: tuple) -> tuple:
+        """
+        Batch sample of the graph in the format of MISDataset, with the ids of sample.
+        Rebuilds the sample of an instance that is shared without its sample.
+        """
+        graph_data = GraphData(
+            x=torch.as_tensor(self.gt_labels).cpu(), edge_index=self.edge_index.cpu()
+        )
+        point_indicator = torch.tensor([[self.n_nodes]], dtype=torch.int64)
+        return (sample[0], Batch.from_data_list([graph_data]), point_indicator)
+
+    def get_cache_arrays(self) -> dict[str, np.ndarray]:
+        """Preprocessed arrays stored by MISInstanceCache."""
+        return {
+            "adj_data": self.adj_matrix_np.data,
+            "adj_indices": self.adj_matrix_np.indices,
+            "adj_indptr": self.adj_matrix_np.indptr,
+            "adj_shape": np.array(self.adj_matrix_np.shape),
+            "crow": self.crow.cpu().numpy(),
+            "col": self.col.cpu().numpy(),
+        }
+
     def get_gt_cost(self) -> float:
         if self.gt_labels is None:
             raise ValueError("Ground truth labels are not available")
@@ -97,27 +183,122 @@ class MISInstance(MISInstanceBase):
 
     def evaluate_individual(self, individual: torch.Tensor) -> float:
         """Individual is a random key of shape (n_nodes,), values in [0, 1]."""
-        return mis_decode_torch_batched(
-            individual, self.neighbors_padded, self.degrees
-        ).sum()
+        return self.get_feasible_from_individual_batch(individual).sum()
 
     def evaluate_solution(self, solution: torch.Tensor) -> float:
         """Solution stored as a torch.Tensor of shape (n_nodes,), where 1 indicates a node in the MIS."""
         return solution.sum()
 
+    def is_independent_set(self, solutions: torch.Tensor) -> bool:
+        """Whether all the boolean solutions of shape (..., n_nodes) are independent."""
+        src, dst = self.edge_index.to(solutions.device)
+        edges = src != dst
+        solutions = solutions.bool()
+        conflicts = solutions[..., src[edges]] & solutions[..., dst[edges]]
+        return not conflicts.any().item()
+
     def get_feasible_from_individual(self, individual: torch.Tensor) -> torch.Tensor:
         """Individual is a random key of shape (n_nodes,), values in [0, 1]."""
-        return mis_decode_torch_batched(individual, self.neighbors_padded, self.degrees)
+        return self.get_feasible_from_individual_batch(individual)
 
     def get_feasible_from_individual_batch(
-        self, individual: torch.Tensor
+        self,
+        individual: torch.Tensor,
+        decoder: Literal["auto", "sequential", "rounds", "cython"] = "auto",
+    ) -> torch.Tensor:
+        """
+        Individual is a random key of shape (batch_size, n_nodes), values in [0, 1].
+
+        All decoders give the same solution:
+         - "sequential": greedy decoding with one iteration per node.
+         - "rounds": greedy decoding in O(log n) parallel rounds.
+         - "cython": compiled greedy decoding, one CPU thread per individual.
+         - "auto": "cython" if the tensors are on CPU and the extension is compiled,
+           "rounds" otherwise.
+        """
+        return self.get_feasible_from_partial_batch(individual, decoder=decoder)
+
+    def get_feasible_from_partial_batch(
+        self,
+        individual: torch.Tensor,
+        forced_in: torch.Tensor | None = None,
+        forced_out: torch.Tensor | None = None,
+        decoder: Literal["auto", "sequential", "rounds", "cython"] = "auto",
+    ) -> torch.Tensor:
+        """
+        Warm-start version of get_feasible_from_individual_batch. Individual is a random
+        key of shape (batch_size, n_nodes). forced_in and forced_out are boolean tensors
+        of the same shape: forced_in nodes (an independent set) are kept in the solution
+        and their neighbors are excluded, forced_out nodes are excluded. Only the
+        remaining free nodes are decoded.
+        """
+        if decoder == "auto":
+            on_cpu = individual.device.type == "cpu"
+            decoder = "cython" if on_cpu and is_cython_decode_available() else "rounds"
+        if decoder == "cython":
+            return mis_decode_cython_batched(
+                individual,
+                self.crow,
+                self.col,
+                forced_in=forced_in,
+                forced_out=forced_out,
+            )
+        if decoder == "sequential":
+            if forced_in is not None or forced_out is not None:
+                raise ValueError("The sequential decoder does not support forced nodes")
+            return mis_decode_torch_batched(
+                individual, self.neighbors_padded, self.degrees
+            )
+        if decoder == "rounds":
+            return mis_decode_torch_rounds(
+                individual,
+                self.crow,
+                self.col,
+                forced_in=forced_in,
+                forced_out=forced_out,
+            )
+        raise ValueError(f"Invalid decoder: {decoder}")
+
+    def local_search(
+        self, solutions: torch.Tensor, max_iterations: int
     ) -> torch.Tensor:
-        """Individual is a random key of shape (batch_size, n_nodes), values in [0, 1]."""
-        return mis_decode_torch_batched(individual, self.neighbors_padded, self.degrees)
+        """Solutions is a boolean tensor of shape (n_solutions, n_nodes)"""
+        solutions, _ = batched_local_search_torch(
+            solutions, self.crow, self.col, max_iterations=max_iterations
+        )
+        return solutions
 
     def get_degrees(self) -> torch.Tensor:
         return self.degrees
 
+    def share_memory_(self) -> MISInstance:
+        super().share_memory_()
+        # the adjacency matrix becomes a view of shared tensors
+        adj = self.adj_matrix_np
+        self._adj_tensors = tuple(
+            torch.from_numpy(np.array(a)).share_memory_()
+            for a in (adj.data, adj.indices, adj.indptr)
+        )
+        self.adj_matrix_np = csr_matrix(
+            tuple(t.numpy() for t in self._adj_tensors), shape=adj.shape
+        )
+        return self
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        if "_adj_tensors" in state:
+            # only send the shape, the matrix is rebuilt from the shared tensors
+            state["adj_matrix_np"] = state["adj_matrix_np"].shape
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        if "_adj_tensors" in state:
+            data, indices, indptr = (t.numpy() for t in state["_adj_tensors"])
+            state["adj_matrix_np"] = csr_matrix(
+                (data, indices, indptr), shape=state["adj_matrix_np"]
+            )
+        self.__dict__.update(state)
+
     def __repr__(self) -> str:
         n_edges = (
             self.edge_index.shape[1] // 2
@@ -126,6 +307,10 @@ class MISInstance(MISInstanceBase):
 
 
 def create_mis_instance(
-    sample: tuple, device: Literal["cpu", "cuda"] = "cpu"
+    sample: tuple,
+    device: Literal["cpu", "cuda"] = "cpu",
+    cache: MISInstanceCache | None = None,
 ) -> MISInstance:
+    if cache is not None:
+        return MISInstance.create_from_batch_sample_cached(sample, device, cache)
     return MISInstance.create_from_batch_sample(sample, device)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import TYPE_CHECKING
+
+import numpy as np
+import torch
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class MISInstanceCache:
+    """
+    On-disk cache of preprocessed MIS instance arrays, keyed by a hash of the edge list.
+
+    Every entry is a directory with one .npy file per array. Entries are loaded
+    memory-mapped, and the least recently used entries are evicted when the cache grows
+    beyond max_size_mb.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_size_mb: float = 1024) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024**2)
+
+    @staticmethod
+    def get_key(edge_index: torch.Tensor, n_nodes: int) -> str:
+        """Hash of the number of nodes and the edge list, which identifies the graph."""
+        edges = edge_index.detach().cpu().numpy().astype(np.int64)
+        key = hashlib.sha1(np.int64(n_nodes).tobytes())
+        key.update(np.ascontiguousarray(edges).tobytes())
+        return key.hexdigest()
+
+    def load(self, key: str, names: Iterable[str]) -> dict[str, np.ndarray] | None:
+        """
+        Memory-mapped arrays of the entry, or None if the graph is not cached or one of
+        the arrays is missing.
+        """
+        entry = self.cache_dir / key
+        if not entry.is_dir():
+            return None
+        try:
+            arrays = {
+                name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in names
+            }
+            # mark the entry as recently used
+            os.utime(entry)
+        except (FileNotFoundError, ValueError):
+            # evicted or being written by another process
+            return None
+        return arrays
+
+    def store(self, key: str, arrays: dict[str, np.ndarray]) -> None:
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+
+        # write to a temporary directory first, so that other processes never see
+        # partial entries
+        tmp_entry = Path(mkdtemp(prefix=".tmp_", dir=self.cache_dir))
+        for name, array in arrays.items():
+            np.save(tmp_entry / f"{name}.npy", array)
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # another process stored the same entry in the meantime
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self._evict()
+
+    def _get_entries(self) -> list[Path]:
+        return [
+            entry
+            for entry in self.cache_dir.iterdir()
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+
+    @staticmethod
+    def _get_entry_size(entry: Path) -> int:
+        return sum(file.stat().st_size for file in entry.iterdir())
+
+    def size_bytes(self) -> int:
+        return sum(self._get_entry_size(entry) for entry in self._get_entries())
+
+    def _evict(self) -> None:
+        """Removes the least recently used entries until the cache fits in its limit."""
+        entries = self._get_entries()
+        sizes = {entry: self._get_entry_size(entry) for entry in entries}
+        total_size = sum(sizes.values())
+
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= sizes[entry]
+
+    def clear(self) -> None:
+        for entry in self._get_entries():
+            shutil.rmtree(entry, ignore_errors=True)
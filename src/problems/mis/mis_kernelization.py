@@ -0,0 +1,250 @@
+"""
+Exact MIS reductions (kernelization).
+
+The reductions shrink the graph while preserving the size of a maximum independent set
+up to an offset: alpha(G) = alpha(kernel) + offset. Every independent set of the kernel
+is lifted back to an independent set of the original graph with offset more nodes.
+
+Reductions:
+- isolated (degree 0) and pendant (degree 1) nodes are included,
+- domination: if N[v] is a subset of N[u] for a neighbor u, u is excluded,
+- vertex folding: a node v of degree 2 with non-adjacent neighbors u, w is folded with
+  them into a new node adjacent to N(u) and N(w). In the lifted solution, u and w are
+  selected if the new node is, otherwise v is,
+- twins: two nodes u, v of degree 3 with the same neighbors a, b, c. If a, b, c are not
+  independent, u and v are included. Otherwise the five nodes are folded into a new node
+  adjacent to N(a), N(b) and N(c), lifted like a vertex fold.
+
+Folded nodes get new ids, starting at n_nodes.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+from problems.mis.mis_instance import MISInstance
+from scipy.sparse import csr_matrix
+from torch_geometric.data import Batch
+from torch_geometric.data import Data as GraphData
+
+
+@dataclass
+class Fold:
+    # nodes selected if the folded node is not selected
+    centers: list[int]
+    # nodes selected if the folded node is selected
+    neighbors: list[int]
+    folded: int
+
+
+class MISKernel:
+    """
+    Reduced instance of an MIS instance, with the mapping to lift its solutions back.
+
+    Args:
+        instance: The reduced instance. Its node i is the node kernel_nodes[i] of the
+            original graph, or a folded node.
+        n_nodes: Number of nodes of the original instance.
+        kernel_nodes: The ids of the kernel nodes.
+        included: The ids of the nodes included by the reductions.
+        folds: The folds, in the order they were applied.
+        n_ids: Number of ids, original and folded nodes.
+    """
+
+    def __init__(
+        self,
+        instance: MISInstance,
+        n_nodes: int,
+        kernel_nodes: np.ndarray,
+        included: np.ndarray,
+        folds: list[Fold],
+        n_ids: int,
+    ) -> None:
+        self.instance = instance
+        self.n_nodes = n_nodes
+        self.kernel_nodes = kernel_nodes
+        self.included = included
+        self.folds = folds
+        self.n_ids = n_ids
+
+    @property
+    def offset(self) -> int:
+        """Number of nodes that a lifted solution has on top of the kernel solution."""
+        return len(self.included) + sum(len(fold.centers) for fold in self.folds)
+
+    def lift(self, solutions: torch.Tensor) -> torch.Tensor:
+        """
+        Lifts boolean solutions of shape (..., n_kernel_nodes) of the kernel to
+        solutions of shape (..., n_nodes) of the original instance.
+        """
+        batch_shape = solutions.shape[:-1]
+        n_solutions = math.prod(batch_shape)
+        solutions = solutions.reshape(n_solutions, self.instance.n_nodes).bool()
+        device = solutions.device
+
+        lifted = torch.zeros(n_solutions, self.n_ids, dtype=torch.bool, device=device)
+        lifted[:, torch.from_numpy(self.kernel_nodes).to(device)] = solutions
+        # included nodes are never part of a fold, so they can be set first
+        lifted[:, torch.from_numpy(self.included).to(device)] = True
+        # a folded node may be part of a later fold, so the folds are undone in reverse
+        for fold in reversed(self.folds):
+            # a copy, the column of the folded node must not alias the written columns
+            selected = lifted[:, fold.folded].clone().unsqueeze(1)
+            lifted[:, fold.neighbors] = selected
+            lifted[:, fold.centers] = ~selected
+
+        return lifted[:, : self.n_nodes].reshape(*batch_shape, self.n_nodes)
+
+    def get_sample(self, sample: tuple) -> tuple:
+        """
+        Batch sample of the kernel graph, in the format of MISDataset, so that the
+        diffusion models sample on the kernel. The node labels of the kernel are unknown
+        and set to 0.
+        """
+        edge_index = self.instance.edge_index.cpu()
+        n_kernel_nodes = self.instance.n_nodes
+        graph_data = GraphData(
+            x=torch.zeros(n_kernel_nodes, dtype=torch.int64), edge_index=edge_index
+        )
+        point_indicator = torch.tensor([[n_kernel_nodes]], dtype=torch.int64)
+        return (sample[0], Batch.from_data_list([graph_data]), point_indicator)
+
+    def __repr__(self) -> str:
+        return (
+            f"MISKernel(n_nodes={self.n_nodes}, "
+            f"n_kernel_nodes={self.instance.n_nodes}, offset={self.offset})"
+        )
+
+
+class _Reducer:
+    """Applies the reductions to an adjacency dict until none applies."""
+
+    def __init__(self, adjacency: dict[int, set[int]]) -> None:
+        self.adjacency = adjacency
+        self.next_id = len(adjacency)
+        self.included = []
+        self.folds = []
+        self._queue = deque(adjacency)
+
+    def _remove(self, nodes: list[int]) -> None:
+        for v in nodes:
+            for u in self.adjacency.pop(v):
+                self.adjacency[u].discard(v)
+                self._queue.append(u)
+
+    def _fold(self, centers: list[int], neighbors: list[int]) -> None:
+        folded = self.next_id
+        self.next_id += 1
+        removed = set(centers) | set(neighbors)
+        folded_neighbors = set().union(*(self.adjacency[u] for u in neighbors))
+        folded_neighbors -= removed
+        self._remove(centers + neighbors)
+
+        self.adjacency[folded] = folded_neighbors
+        for u in folded_neighbors:
+            self.adjacency[u].add(folded)
+        self.folds.append(Fold(centers=centers, neighbors=neighbors, folded=folded))
+        self._queue.append(folded)
+
+    def _include(self, nodes: list[int]) -> None:
+        self.included.extend(nodes)
+        # the neighbors of included nodes are excluded
+        excluded = set().union(*(self.adjacency[v] for v in nodes)) - set(nodes)
+        self._remove(nodes + list(excluded))
+
+    def _reduce_node(self, v: int) -> None:
+        neighbors = self.adjacency[v]
+        degree = len(neighbors)
+
+        if degree <= 1:
+            self._include([v])
+            return
+
+        if degree == 2:
+            u, w = neighbors
+            if w in self.adjacency[u]:
+                # v is simplicial, dominated by u and w
+                self._include([v])
+            else:
+                self._fold([v], [u, w])
+            return
+
+        for u in neighbors:
+            # N[v] is a subset of N[u]
+            if neighbors - {u} <= self.adjacency[u]:
+                self._remove([u])
+                self._queue.append(v)
+                return
+
+        if degree == 3:
+            a, b, c = neighbors
+            twin = next(
+                (
+                    u
+                    for u in self.adjacency[a]
+                    if u != v and self.adjacency[u] == neighbors
+                ),
+                None,
+            )
+            if twin is None:
+                return
+            if self.adjacency[a] & {b, c} or c in self.adjacency[b]:
+                self._include([v, twin])
+            else:
+                self._fold([v, twin], [a, b, c])
+
+    def reduce(self) -> None:
+        while self._queue:
+            v = self._queue.popleft()
+            if v in self.adjacency:
+                self._reduce_node(v)
+
+
+def kernelize(instance: MISInstance) -> MISKernel:
+    """Applies the exact reductions to the instance. The kernel may have 0 nodes."""
+    crow = instance.crow.cpu().numpy()
+    col = instance.col.cpu().numpy()
+    adjacency = {
+        v: set(col[crow[v] : crow[v + 1]].tolist()) - {v}
+        for v in range(instance.n_nodes)
+    }
+
+    reducer = _Reducer(adjacency)
+    reducer.reduce()
+
+    kernel_nodes = np.array(sorted(reducer.adjacency), dtype=np.int64)
+    local_index = {v: i for i, v in enumerate(kernel_nodes.tolist())}
+    edges = [
+        (local_index[v], local_index[u])
+        for v in kernel_nodes.tolist()
+        for u in reducer.adjacency[v]
+    ]
+    n_kernel_nodes = len(kernel_nodes)
+    # directed edges in both directions and self-loops, like the edges of MISDataset
+    edges.extend((i, i) for i in range(n_kernel_nodes))
+    edge_index = torch.tensor(edges, dtype=torch.int64).reshape(-1, 2).T.contiguous()
+    # explicit shape, it cannot be inferred from the edges of an empty kernel
+    adj_matrix_np = csr_matrix(
+        (np.ones(edge_index.shape[1]), (edge_index[0].numpy(), edge_index[1].numpy())),
+        shape=(n_kernel_nodes, n_kernel_nodes),
+    )
+
+    kernel_instance = MISInstance(
+        n_kernel_nodes,
+        edge_index,
+        gt_labels=torch.zeros(n_kernel_nodes, dtype=torch.int64),
+        adj_matrix_np=adj_matrix_np,
+        device=instance.device,
+    )
+    return MISKernel(
+        kernel_instance,
+        n_nodes=instance.n_nodes,
+        kernel_nodes=kernel_nodes,
+        included=np.array(reducer.included, dtype=np.int64),
+        folds=reducer.folds,
+        n_ids=reducer.next_id,
+    )
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import torch
+from problems.mis.mis_evaluation import csr_rows, mis_decode_torch_rounds
+
+
+def find_one_two_swaps(
+    solutions: torch.Tensor, crow: torch.Tensor, col: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Find one random (1,2)-swap for every solution of a batch: remove a selected node x
+    and insert two non-adjacent nodes u and w whose only selected neighbor is x (ARW
+    local search).
+
+    A non-selected node is a candidate if exactly one of its neighbors is selected
+    (its owner). A candidate u has a swap partner if its owner has another candidate
+    that is not adjacent to u.
+
+    Args:
+        solutions: Boolean tensor of shape (B, n), independent sets.
+        crow: The CSR row pointers of the adjacency matrix, torch.Tensor of shape
+            (n + 1,).
+        col: The CSR column indices of the adjacency matrix, torch.Tensor of shape
+            (n_edges,).
+
+    Returns:
+        tuple of (has_move, x, u, w), tensors of shape (B,). x, u and w are only
+        meaningful where has_move is True.
+    """
+    B, n = solutions.shape
+    device = solutions.device
+    crow, col = crow.to(device), col.to(device).long()
+    row = csr_rows(crow)
+    node_ids = torch.arange(n, device=device)
+
+    # Number of selected neighbors of each node, and the sum of their indices.
+    # Shape: (B, n)
+    selected_neighbor = solutions[:, col]  # shape: (B, n_edges)
+    tightness = torch.zeros((B, n), dtype=torch.int32, device=device).index_add_(
+        1, row, selected_neighbor.int()
+    )
+    neighbor_sum = torch.zeros((B, n), dtype=torch.long, device=device).index_add_(
+        1, row, selected_neighbor.long() * col
+    )
+
+    # Candidates have exactly one selected neighbor, which is then neighbor_sum
+    candidates = ~solutions & (tightness == 1)
+    owner = torch.where(candidates, neighbor_sum, 0)
+    n_candidates = torch.zeros((B, n), dtype=torch.int32, device=device).scatter_add_(
+        1, owner, candidates.int()
+    )
+
+    # Number of adjacent candidates with the same owner, for each candidate
+    same_owner = (
+        candidates[:, row]
+        & candidates[:, col]
+        & (owner[:, row] == owner[:, col])
+        & (row != col)
+    )
+    n_adjacent = torch.zeros((B, n), dtype=torch.int32, device=device).index_add_(
+        1, row, same_owner.int()
+    )
+    swappable = candidates & (n_candidates.gather(1, owner) - 1 - n_adjacent > 0)
+    has_move = swappable.any(dim=1)
+
+    # Pick a random swappable u, its owner x, and a random partner w of u
+    scores = torch.rand((B, n), device=device)
+    u = torch.where(swappable, scores, -1).argmax(dim=1)
+    x = owner.gather(1, u.unsqueeze(1)).squeeze(1)
+
+    adjacent_to_u = torch.zeros((B, n), dtype=torch.int32, device=device).index_add_(
+        1, col, (row.unsqueeze(0) == u.unsqueeze(1)).int()
+    )
+    partners = (
+        candidates
+        & (owner == x.unsqueeze(1))
+        & (adjacent_to_u == 0)
+        & (node_ids.unsqueeze(0) != u.unsqueeze(1))
+    )
+    w = torch.where(partners, scores, -1).argmax(dim=1)
+
+    return has_move, x, u, w
+
+
+def batched_local_search_torch(
+    solutions: torch.Tensor,
+    crow: torch.Tensor,
+    col: torch.Tensor,
+    max_iterations: int = 10,
+) -> tuple[torch.Tensor, int]:
+    """
+    Apply (1,2)-swap local search to a batch of independent sets. In each iteration,
+    every solution applies one random (1,2)-swap, and is then made maximal by inserting
+    the free nodes greedily (in random order). Solutions never get worse.
+
+    Args:
+        solutions: Boolean tensor of shape (B, n), independent sets.
+        crow: The CSR row pointers of the adjacency matrix, torch.Tensor of shape
+            (n + 1,).
+        col: The CSR column indices of the adjacency matrix, torch.Tensor of shape
+            (n_edges,).
+        max_iterations: Maximum number of iterations
+
+    Returns:
+        tuple of (improved solutions, number of iterations performed)
+    """
+    solutions = solutions.bool().clone()
+    batch_idx = torch.arange(solutions.shape[0], device=solutions.device)
+
+    def make_maximal(solutions: torch.Tensor) -> torch.Tensor:
+        priorities = torch.rand(solutions.shape, device=solutions.device)
+        return mis_decode_torch_rounds(priorities, crow, col, forced_in=solutions)
+
+    solutions = make_maximal(solutions)
+
+    iterator = 0
+    while iterator < max_iterations:
+        has_move, x, u, w = find_one_two_swaps(solutions, crow, col)
+        if not has_move.any():
+            break
+
+        moving = batch_idx[has_move]
+        solutions[moving, x[has_move]] = False
+        solutions[moving, u[has_move]] = True
+        solutions[moving, w[has_move]] = True
+
+        solutions = make_maximal(solutions)
+        iterator += 1
+
+    return solutions, iterator
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from problems.mis.solve_optimal_recombination import OptimalRecombResults
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class RecombinationCache:
+    """
+    Persistent cache of optimal recombination results, stored in a sqlite database that
+    can be shared by concurrent processes.
+
+    Results are keyed by the instance content hash, the unordered pair of parents, the
+    time limit and the k_factor. The least recently used results are evicted when the
+    cache holds more than max_entries results.
+    """
+
+    def __init__(self, db_path: str | Path, max_entries: int = 100_000) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    children BLOB NOT NULL,
+                    runtime REAL NOT NULL,
+                    parent_1_obj INTEGER NOT NULL,
+                    parent_2_obj INTEGER NOT NULL,
+                    children_obj INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_access "
+                "ON results (last_access)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection that commits on exit, with a long timeout for other writers."""
+        connection = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_key(
+        instance_hash: str,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None,
+    ) -> tuple[str, bool]:
+        """
+        Returns the key of the unordered pair of parents, and whether the parents were
+        swapped to get the canonical order.
+        """
+        swapped = tuple(solution_1) > tuple(solution_2)
+        if swapped:
+            solution_1, solution_2 = solution_2, solution_1
+        parents = ";".join(",".join(map(str, s)) for s in (solution_1, solution_2))
+        key = f"{instance_hash}|{parents}|{time_limit}|{k_factor}"
+        return hashlib.sha1(key.encode()).hexdigest(), swapped
+
+    def get(
+        self,
+        instance_hash: str,
+        n_nodes: int,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None = None,
+    ) -> OptimalRecombResults | None:
+        key, swapped = self.get_key(
+            instance_hash, solution_1, solution_2, time_limit, k_factor
+        )
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT children, runtime, parent_1_obj, parent_2_obj, children_obj "
+                "FROM results WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+
+        children_blob, runtime, parent_1_obj, parent_2_obj, children_obj = row
+        if swapped:
+            parent_1_obj, parent_2_obj = parent_2_obj, parent_1_obj
+
+        children = np.frombuffer(children_blob, dtype=np.int64).copy()
+        children_np_labels = np.zeros(n_nodes)
+        children_np_labels[children] = 1
+        return OptimalRecombResults(
+            children_np_labels=children_np_labels,
+            children=children,
+            runtime=runtime,
+            parent_1_obj=parent_1_obj,
+            parent_2_obj=parent_2_obj,
+            children_obj=children_obj,
+        )
+
+    def put(
+        self,
+        instance_hash: str,
+        solution_1: tuple,
+        solution_2: tuple,
+        time_limit: int,
+        k_factor: float | None,
+        result: OptimalRecombResults,
+    ) -> None:
+        key, swapped = self.get_key(
+            instance_hash, solution_1, solution_2, time_limit, k_factor
+        )
+        parent_1_obj, parent_2_obj = result.parent_1_obj, result.parent_2_obj
+        if swapped:
+            parent_1_obj, parent_2_obj = parent_2_obj, parent_1_obj
+
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    np.asarray(result.children, dtype=np.int64).tobytes(),
+                    float(result.runtime),
+                    int(parent_1_obj),
+                    int(parent_2_obj),
+                    int(result.children_obj),
+                    time.time(),
+                ),
+            )
+            # evict the least recently used results
+            connection.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM results")
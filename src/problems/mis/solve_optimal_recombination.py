@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
@@ -12,16 +13,36 @@ import scipy.sparse as sp
 # from gurobi_optimods.mwis import maximum_weighted_independent_set
 from gurobi_optimods.utils import optimod
 from gurobipy import GRB
-from scipy.sparse import lil_matrix
 
 if TYPE_CHECKING:
     from problems.mis.mis_instance import MISInstance
 
 
-def get_lil_csr_matrix(adj_matrix: sp.csr_matrix) -> sp.csr_matrix:
-    adj_matrix_lil = lil_matrix(adj_matrix)
-    adj_matrix_lil[np.tril_indices(adj_matrix.shape[0])] = 0
-    return adj_matrix_lil.tocsr()
+def get_upper_triangular_edges(
+    adj_matrix: sp.spmatrix,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Deduplicated edges (i, j) with i < j of an adjacency matrix in any sparse format, in
+    O(E). Self-loops are dropped.
+    """
+    n = adj_matrix.shape[0]
+    adj_coo = sp.coo_matrix(adj_matrix)
+    nonzero = adj_coo.data != 0
+    rows, cols = adj_coo.row[nonzero], adj_coo.col[nonzero]
+    lower, upper = np.minimum(rows, cols), np.maximum(rows, cols)
+    off_diagonal = lower < upper
+    keys = np.unique(lower[off_diagonal].astype(np.int64) * n + upper[off_diagonal])
+    return keys // n, keys % n
+
+
+def get_upper_triangular_csr(adj_matrix: sp.spmatrix) -> sp.csr_matrix:
+    """Upper triangle of an adjacency matrix, without the diagonal, with entries 1."""
+    rows, cols = get_upper_triangular_edges(adj_matrix)
+    return sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=adj_matrix.shape)
+
+
+# Kept for existing callers, the upper triangle is no longer built through a lil matrix
+get_lil_csr_matrix = get_upper_triangular_csr
 
 
 def get_starting_solution(
@@ -94,7 +115,7 @@ def solve_wmis(
     both = np.intersect1d(solution_1, solution_2)
     weights[both] = 1 + lambda_penalty
 
-    adj_matrix = get_lil_csr_matrix(instance.adj_matrix_np)
+    adj_matrix = get_upper_triangular_csr(instance.adj_matrix_np)
     starting_solution = get_starting_solution(instance, solution_1, solution_2)
 
     start_time = time.time()
@@ -129,7 +150,7 @@ def solve_constrained_mis(
     assert np.all(solution_1 < instance.n_nodes), "solution_1 contains invalid indices"
     assert np.all(solution_2 < instance.n_nodes), "solution_2 contains invalid indices"
 
-    adj_matrix = get_lil_csr_matrix(instance.adj_matrix_np)
+    adj_matrix = get_upper_triangular_csr(instance.adj_matrix_np)
     starting_solution = get_starting_solution(instance, solution_1, solution_2)
     weights = np.ones(instance.n_nodes)
 
@@ -184,9 +205,7 @@ def solve_local_branching_mis(
     assert np.all(solution_1 < instance.n_nodes), "solution_1 contains invalid indices"
     assert np.all(solution_2 < instance.n_nodes), "solution_2 contains invalid indices"
 
-    adj_matrix = get_lil_csr_matrix(instance.adj_matrix_np)
     starting_solution = get_starting_solution(instance, solution_1, solution_2)
-    weights = np.ones(instance.n_nodes)
 
     k_factor = kwargs.get("k_factor", 1.5)
     assert k_factor > 1, (
@@ -201,15 +220,17 @@ def solve_local_branching_mis(
     local_branching = LocalBranching(k=k, sol_1=solution_1, sol_2=solution_2)
 
     start_time = time.time()
-    mwis = maximum_weighted_independent_set(
-        adj_matrix,
-        weights,
+    # the edge constraints of the instance are built once, only the local branching
+    # row changes
+    mwis = get_base_model(instance).solve(
         starting_solution=starting_solution,
         local_branching=local_branching,
         time_limit=time_limit,
         solver_params={
             "OutputFlag": kwargs.get("output_flag", 0),
             "DisplayInterval": kwargs.get("display_interval", 50),
+            # 0 lets Gurobi choose, a positive value caps the threads of the environment
+            "Threads": kwargs.get("threads", 0),
         },
     )
 
@@ -241,6 +262,121 @@ class LocalBranching:
     sol_2: np.ndarray
 
 
+def get_edge_incidence_matrix(
+    rows: np.ndarray, cols: np.ndarray, num_vertices: int
+) -> sp.csr_array:
+    """
+    Incidence matrix of shape (num_edges, num_vertices), the row of edge (i, j) has ones
+    at i and j.
+    """
+    num_edges = len(rows)
+    edge_ids = np.repeat(np.arange(num_edges), 2)
+    vertices = np.stack([rows, cols], axis=1).ravel()
+    return sp.csr_array(
+        (np.ones(2 * num_edges), (edge_ids, vertices)), shape=(num_edges, num_vertices)
+    )
+
+
+def get_local_branching_row(
+    num_vertices: int, local_branching: LocalBranching
+) -> tuple[sp.csr_array, float]:
+    """
+    Writes h(sol_1, x) + h(sol_2, x) <= k, with h the hamming distance, as
+    c @ x <= k - |sol_1| - |sol_2|. c is 2 for the vertices in neither solution, 0 for
+    the vertices in one and -2 for those in both.
+    """
+    coeffs = np.full(num_vertices, 2.0)
+    coeffs[local_branching.sol_1] -= 2
+    coeffs[local_branching.sol_2] -= 2
+    rhs = local_branching.k - len(local_branching.sol_1) - len(local_branching.sol_2)
+    return sp.csr_array(coeffs.reshape(1, -1)), rhs
+
+
+class MISBaseModel:
+    """
+    Gurobi MIS model of a graph, with the edge constraints built once. Every solve only
+    swaps the local branching row and the MIP start, so repeated recombinations of the
+    same instance do not rebuild the model.
+    """
+
+    def __init__(self, adjacency_matrix: sp.csr_matrix, num_vertices: int) -> None:
+        self.num_vertices = num_vertices
+        self.env = gp.Env(empty=True)
+        self.env.setParam("OutputFlag", 0)
+        self.env.start()
+        self.model = gp.Model("mwis", env=self.env)
+
+        # x_i: 1 if vertex i is in the independent set and 0 otherwise
+        self.x = self.model.addMVar(num_vertices, vtype=GRB.BINARY, name="x")
+        self.model.setObjective(self.x.sum(), sense=GRB.MAXIMIZE)
+
+        # The independent set contains non-adjacent vertices
+        rows, cols = get_upper_triangular_edges(adjacency_matrix)
+        A = get_edge_incidence_matrix(rows, cols, num_vertices)
+        self.model.addMConstr(
+            A, self.x, GRB.LESS_EQUAL, np.ones(A.shape[0]), name="no_adjacent_vertices"
+        )
+        self._local_branching_constr = None
+
+    def solve(
+        self,
+        starting_solution: np.ndarray | None = None,
+        local_branching: LocalBranching | None = None,
+        time_limit: float | None = None,
+        solver_params: dict | None = None,
+    ) -> MWISResult | None:
+        # discard the previous solution, so that solves are independent
+        self.model.reset()
+
+        if self._local_branching_constr is not None:
+            self.model.remove(self._local_branching_constr)
+            self._local_branching_constr = None
+        if local_branching is not None:
+            row, rhs = get_local_branching_row(self.num_vertices, local_branching)
+            self._local_branching_constr = self.model.addMConstr(
+                row, self.x, GRB.LESS_EQUAL, np.array([rhs]), name="local_branching"
+            )
+
+        self.x.Start = GRB.UNDEFINED if starting_solution is None else starting_solution
+        self.model.Params.TimeLimit = GRB.INFINITY if time_limit is None else time_limit
+        for param, value in (solver_params or {}).items():
+            self.model.setParam(param, value)
+
+        self.model.optimize()
+        if self.model.status in {
+            GRB.Status.OPTIMAL,
+            GRB.Status.SOLUTION_LIMIT,
+            GRB.Status.TIME_LIMIT,
+        }:
+            (mwis,) = np.where(self.x.X >= 0.5)
+            return MWISResult(mwis, float(len(mwis)))
+        return None
+
+    def dispose(self) -> None:
+        self.model.dispose()
+        self.env.dispose()
+
+
+# Base models of the last instances, keyed by content hash. Each one holds a
+# Gurobi environment.
+_base_models: OrderedDict[str, MISBaseModel] = OrderedDict()
+MAX_BASE_MODELS = 4
+
+
+def get_base_model(instance: MISInstance) -> MISBaseModel:
+    key = instance.content_hash
+    if key in _base_models:
+        _base_models.move_to_end(key)
+        return _base_models[key]
+
+    base_model = MISBaseModel(instance.adj_matrix_np, instance.n_nodes)
+    _base_models[key] = base_model
+    if len(_base_models) > MAX_BASE_MODELS:
+        _, oldest = _base_models.popitem(last=False)
+        oldest.dispose()
+    return base_model
+
+
 @optimod()
 def maximum_weighted_independent_set(
     adjacency_matrix,
@@ -261,7 +397,7 @@ def maximum_weighted_independent_set(
         assert local_branching is None, error_msg
 
     with create_env() as env, gp.Model("mwis", env=env) as model:
-        rows, cols = adjacency_matrix.tocoo().row, adjacency_matrix.tocoo().col
+        rows, cols = get_upper_triangular_edges(adjacency_matrix)
         num_vertices, num_edges = len(weights), len(rows)
         # x_i: 1 if vertex i is in the independent set and 0 otherwise
         x = model.addMVar(num_vertices, vtype=GRB.BINARY, name="x")
@@ -273,20 +409,10 @@ def maximum_weighted_independent_set(
             model.addConstr(x[fix_unselection] == 0)
         if local_branching is not None:
             # Get indices not in solutions (complement sets)
-            sol_1_unselected = np.setdiff1d(
-                np.arange(num_vertices), local_branching.sol_1
-            )
-            sol_2_unselected = np.setdiff1d(
-                np.arange(num_vertices), local_branching.sol_2
+            row, rhs = get_local_branching_row(num_vertices, local_branching)
+            model.addMConstr(
+                row, x, GRB.LESS_EQUAL, np.array([rhs]), name="local_branching"
             )
-            hamming_expr = (
-                gp.quicksum(1 - x[i] for i in local_branching.sol_1)
-                + gp.quicksum(x[i] for i in sol_1_unselected)
-                + gp.quicksum(1 - x[i] for i in local_branching.sol_2)
-                + gp.quicksum(x[i] for i in sol_2_unselected)
-            )
-
-            model.addConstr(hamming_expr <= local_branching.k, name="local_branching")
 
         if desired_cost is not None:
             model.addConstr(weights @ x == desired_cost, name="desired_cost")
@@ -294,19 +420,14 @@ def maximum_weighted_independent_set(
         # Maximize the sum of the vertex weights in the independent set
         model.setObjective(weights @ x, sense=GRB.MAXIMIZE)
         # Get the incident matrix from the adjacency matrix where
-        # there is a column for each edge
-        indices = []
-        for i, j in zip(rows, cols):
-            indices.extend([i, j])
-        indptr = range(0, len(indices) + 2, 2)
-        data = np.ones(2 * num_edges)
-        A = sp.csc_array((data, indices, indptr), shape=(num_vertices, num_edges))
+        # there is a row for each edge
+        A = get_edge_incidence_matrix(rows, cols, num_vertices)
         # The independent set contains non-adjacent vertices
         model.addMConstr(
-            A.T,
+            A,
             x,
             GRB.LESS_EQUAL,
-            np.ones(A.shape[1]),
+            np.ones(num_edges),
             name="no_adjacent_vertices",
         )
         model.optimize()
@@ -4,8 +4,11 @@ import numpy as np
 np.import_array()
 cimport numpy as np
 cimport cython
-from libc.math cimport sqrt
+cimport openmp
+from cython.parallel cimport prange
+from libc.math cimport INFINITY, isnan, sqrt
 from libc.stdio cimport printf
+from libc.stdlib cimport free, malloc
 
 
 # To extract a tour from the inferred adjacency matrix A, we used the following greedy edge insertion
@@ -18,16 +21,18 @@ from libc.stdio cimport printf
 #   – If inserting (i, j) results in a graph with cycles (of length < N), continue.
 #   – Otherwise, insert (i, j) into the tour.
 # • Return the extracted tour.
+# The inserted edges are stored as the two neighbors of every node in the tour, an N x 2 array, from which
+# the tour is read in O(N) by `tour_from_neighbors`.
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef tuple[np.ndarray, int] _merge_core(double[:,:] coords, double[:,:] adj_mat):
     cdef double[:,:] points = coords
-    cdef double[:,:] dists = np.linalg.norm(np.asarray(points)[:, None] - np.asarray(points), axis=-1)
-    cdef long N = dists.shape[0]
+    cdef long N = points.shape[0]
     
-    # we initialize the real adjacency matrix
-    cdef double[:,:] A = np.zeros((N, N))
+    # we initialize the neighbors of the nodes in the tour
+    cdef np.int64_t[:, ::1] neighbors = np.full((N, 2), -1, dtype=np.int64)
+    cdef np.int64_t[::1] degree = np.zeros(N, dtype=np.int64)
     cdef int[:] route_begin = np.arange(N, dtype='int32')
     cdef int[:] route_end = np.arange(N, dtype='int32')
     
@@ -60,8 +65,7 @@ cdef tuple[np.ndarray, int] _merge_core(double[:,:] coords, double[:,:] adj_mat)
         if j != begin_j and j != end_j:
             continue
             
-        A[j, i] = 1
-        A[i, j] = 1
+        _link(&neighbors[0, 0], &degree[0], i, j)
         merge_count += 1
         
         if i == begin_i and j == end_j:
@@ -88,34 +92,58 @@ cdef tuple[np.ndarray, int] _merge_core(double[:,:] coords, double[:,:] adj_mat)
             
     cdef int final_begin = find_begin(route_begin, 0)
     cdef int final_end = find_end(route_end, 0)
-    A[final_end, final_begin] = 1
-    A[final_begin, final_end] = 1
+    _link(&neighbors[0, 0], &degree[0], final_begin, final_end)
     
-    return np.asarray(A), merge_iterations
+    return np.asarray(neighbors), merge_iterations
 
 cpdef merge_cython(double[:,:] coords, double[:,:] adj_mat):
-    return _merge_core(coords, adj_mat)
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-cpdef tuple[list[int], int] merge_cython_get_tour(double[:,:] coords, double[:,:] adj_mat):
-    A, merge_iterations = _merge_core(coords, adj_mat)
-    
-    # Convert adjacency matrix to tour
-    cdef list[int] tour = [0]
-    cdef int current_node = 0, prev_node = -1
-    cdef np.ndarray[np.int64_t, ndim=1] nonzero_nodes
+    neighbors, merge_iterations = _merge_core(coords, adj_mat)
     
-    while len(tour) < A.shape[0] + 1:
-        nonzero_nodes = np.nonzero(A[current_node])[0]
-        if prev_node >= 0:
-            nonzero_nodes = nonzero_nodes[nonzero_nodes != prev_node]
-        next_node = nonzero_nodes.max()
-        tour.append(next_node)
-        prev_node = current_node
-        current_node = next_node
-    
-    return np.asarray(tour), merge_iterations
+    # dense adjacency matrix of the tour
+    cdef long N = neighbors.shape[0]
+    A = np.zeros((N, N))
+    A[np.repeat(np.arange(N), 2), neighbors.reshape(-1)] = 1
+    return A, merge_iterations
+
+cpdef tuple[np.ndarray, int] merge_cython_get_tour(double[:,:] coords, double[:,:] adj_mat):
+    neighbors, merge_iterations = _merge_core(coords, adj_mat)
+    return tour_from_neighbors(neighbors), merge_iterations
+
+
+cdef inline void _link(np.int64_t* neighbors, np.int64_t* degree, np.int64_t i, np.int64_t j) noexcept nogil:
+    # neighbors is the flat N x 2 array of the neighbors of the nodes
+    neighbors[2 * i + degree[i]] = j
+    degree[i] += 1
+    neighbors[2 * j + degree[j]] = i
+    degree[j] += 1
+
+
+cdef inline np.int64_t _next_node(const np.int64_t* neighbors, np.int64_t node, np.int64_t prev) noexcept nogil:
+    return neighbors[2 * node] if neighbors[2 * node] != prev else neighbors[2 * node + 1]
+
+
+cdef void _walk_tour(const np.int64_t* neighbors, Py_ssize_t N, np.int64_t* tour) noexcept nogil:
+    cdef Py_ssize_t step
+    cdef np.int64_t prev = 0, node, nxt
+    tour[0] = 0
+    node = neighbors[0] if neighbors[0] > neighbors[1] else neighbors[1]
+    for step in range(1, N):
+        tour[step] = node
+        nxt = _next_node(neighbors, node, prev)
+        prev = node
+        node = nxt
+    tour[N] = 0
+
+
+cpdef np.ndarray tour_from_neighbors(const np.int64_t[:, ::1] neighbors):
+    """
+    Closed tour of size N + 1 from the two neighbors of every node in the tour, in O(N). The tour
+    starts at node 0 and goes to its neighbor with the largest index first.
+    """
+    cdef Py_ssize_t N = neighbors.shape[0]
+    cdef np.ndarray[np.int64_t, ndim=1] tour = np.zeros(N + 1, dtype=np.int64)
+    _walk_tour(&neighbors[0, 0], N, &tour[0])
+    return tour
 
 cpdef find_begin(int[:] route_begin, int i):
     cdef int begin_i = route_begin[i]
@@ -131,3 +159,254 @@ cpdef find_end(int[:] route_end, int i):
         end_i = find_end(route_end, end_i)
         route_end[i] = end_i
     return end_i
+
+
+# Batched greedy edge insertion, for P heatmaps of the same instance, either dense N x N heatmaps or
+# scores on the E edges of a sparse graph (e.g. the k nearest neighbors of every node).
+# • The candidate edges are the pairs {i, j} of the heatmap, self-loops dropped. The score of a pair
+#   sums the scores of (i, j) and (j, i), like `adj_mat + adj_mat.T` for the dense merge, and its key is
+#   score / ||vi − vj||.
+# • The candidates are kept in a max-heap on the key and popped in decreasing order of key until the N - 1
+#   edges of a path are inserted, so only the popped candidates are sorted. A candidate (i, j) is inserted if
+#   i and j have degree < 2 and are in different paths, which is checked with union-find.
+# • When the candidates run out, the paths are chained: from the free end of the current path, go to
+#   the nearest free endpoint of the remaining paths, then to the other end of that path, and so on.
+# • The tour is read from the neighbors of the nodes, like `tour_from_neighbors`.
+# The samples are independent, so they are merged in parallel without the GIL, with the buffers of a
+# sample allocated by the thread that merges it.
+
+cdef inline double _dist(const double* points, np.int64_t a, np.int64_t b) noexcept nogil:
+    cdef double dx = points[2 * a] - points[2 * b]
+    cdef double dy = points[2 * a + 1] - points[2 * b + 1]
+    return sqrt(dx * dx + dy * dy)
+
+
+cdef inline np.int64_t _find(np.int64_t* parent, np.int64_t i) noexcept nogil:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+cdef void _sift_down(const double* keys, np.int64_t* heap, Py_ssize_t root, Py_ssize_t size) noexcept nogil:
+    cdef Py_ssize_t child
+    cdef np.int64_t tmp
+    while True:
+        child = 2 * root + 1
+        if child >= size:
+            return
+        if child + 1 < size and keys[heap[child + 1]] > keys[heap[child]]:
+            child += 1
+        if keys[heap[child]] <= keys[heap[root]]:
+            return
+        tmp = heap[root]
+        heap[root] = heap[child]
+        heap[child] = tmp
+        root = child
+
+
+cdef void _chain_paths(
+    const double* points, Py_ssize_t N, np.int64_t* neighbors, np.int64_t* degree, np.int64_t* work
+) noexcept nogil:
+    # work has room for 4 * N values
+    cdef np.int64_t* other_end = work
+    cdef np.int64_t* path_begin = work + N
+    cdef np.int64_t* path_end = work + 2 * N
+    cdef np.int64_t* free_path = work + 3 * N
+    cdef Py_ssize_t v, f, step, n_paths = 0, best_path
+    cdef np.int64_t prev, node, nxt, start, end, best_node
+    cdef double d, best
+
+    # the two ends of every path, isolated nodes are paths with a single node
+    for v in range(N):
+        other_end[v] = -1
+    for v in range(N):
+        if degree[v] == 2 or other_end[v] != -1:
+            continue
+        prev = v
+        node = v
+        if degree[v] == 1:
+            node = neighbors[2 * v]
+            while degree[node] == 2:
+                nxt = _next_node(neighbors, node, prev)
+                prev = node
+                node = nxt
+        other_end[v] = node
+        other_end[node] = v
+        path_begin[n_paths] = v
+        path_end[n_paths] = node
+        free_path[n_paths] = 1
+        n_paths += 1
+
+    free_path[0] = 0
+    start = path_begin[0]
+    end = path_end[0]
+    for step in range(n_paths - 1):
+        best = INFINITY
+        best_node = -1
+        best_path = -1
+        for f in range(n_paths):
+            if not free_path[f]:
+                continue
+            d = _dist(points, end, path_begin[f])
+            if d < best:
+                best = d
+                best_node = path_begin[f]
+                best_path = f
+            d = _dist(points, end, path_end[f])
+            if d < best:
+                best = d
+                best_node = path_end[f]
+                best_path = f
+        free_path[best_path] = 0
+        _link(neighbors, degree, end, best_node)
+        end = other_end[best_node]
+
+    # close the tour
+    _link(neighbors, degree, end, start)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef np.int64_t _merge_sample(
+    const double[:, ::1] points,
+    const np.int64_t[::1] pair_i,
+    const np.int64_t[::1] pair_j,
+    const double[::1] pair_dist,
+    const np.int64_t[::1] target,
+    const double[:, ::1] scores,
+    np.int64_t[:, ::1] tours,
+    Py_ssize_t p,
+) noexcept nogil:
+    # returns the number of merge iterations, or -1 if the buffers could not be allocated
+    cdef Py_ssize_t N = points.shape[0], E = pair_i.shape[0], M = target.shape[0]
+    cdef Py_ssize_t e, m, v, size = E, merge_count = 0
+    cdef np.int64_t merge_iterations = 0, i, j, root_i, root_j
+    cdef double* keys = <double*> malloc((E + 1) * sizeof(double))
+    cdef np.int64_t* heap = <np.int64_t*> malloc((E + 1) * sizeof(np.int64_t))
+    cdef np.int64_t* work = <np.int64_t*> malloc((8 * N + 1) * sizeof(np.int64_t))
+    cdef np.int64_t* parent = work
+    cdef np.int64_t* degree = work + N
+    cdef np.int64_t* neighbors = work + 2 * N
+
+    if keys == NULL or heap == NULL or work == NULL:
+        free(keys)
+        free(heap)
+        free(work)
+        return -1
+
+    # keys of the candidate pairs, undefined keys (0 / 0 for duplicate points) go last
+    for e in range(E):
+        keys[e] = 0
+        heap[e] = e
+    for m in range(M):
+        if target[m] >= 0:
+            keys[target[m]] += scores[p, m]
+    for e in range(E):
+        keys[e] = keys[e] / pair_dist[e]
+        if isnan(keys[e]):
+            keys[e] = -INFINITY
+    for e in range(E // 2 - 1, -1, -1):
+        _sift_down(keys, heap, e, E)
+
+    for v in range(N):
+        parent[v] = v
+        degree[v] = 0
+        neighbors[2 * v] = -1
+        neighbors[2 * v + 1] = -1
+
+    while size > 0 and merge_count < N - 1:
+        e = heap[0]
+        size -= 1
+        heap[0] = heap[size]
+        _sift_down(keys, heap, 0, size)
+        merge_iterations += 1
+        i = pair_i[e]
+        j = pair_j[e]
+        if degree[i] == 2 or degree[j] == 2:
+            continue
+        root_i = _find(parent, i)
+        root_j = _find(parent, j)
+        if root_i == root_j:
+            continue
+        parent[root_i] = root_j
+        _link(neighbors, degree, i, j)
+        merge_count += 1
+
+    _chain_paths(&points[0, 0], N, neighbors, degree, work + 4 * N)
+    _walk_tour(neighbors, N, &tours[p, 0])
+
+    free(keys)
+    free(heap)
+    free(work)
+    return merge_iterations
+
+
+cpdef tuple merge_batch(double[:, :] coords, heatmaps, edge_index=None, int num_threads=-1):
+    """
+    Greedy merge of P heatmaps of the same instance, in parallel with OpenMP threads.
+
+    heatmaps is either a P x N x N array of dense heatmaps, or a P x E array of the scores of the E
+    edges of edge_index (2 x E) for a sparse graph. Returns the P x (N + 1) array of tours, starting
+    and ending at node 0, and the number of candidate edges processed for every sample.
+    """
+    cdef Py_ssize_t N = coords.shape[0], P, p
+    points_np = np.ascontiguousarray(coords, dtype=np.double)
+
+    # candidate pairs {i, j}, i < j, and the pair of every entry of the heatmaps (-1 for self-loops)
+    if edge_index is None:
+        pair_i_np, pair_j_np = np.triu_indices(N, k=1)
+        target_np = np.full((N, N), -1, dtype=np.int64)
+        target_np[pair_i_np, pair_j_np] = np.arange(len(pair_i_np))
+        target_np[pair_j_np, pair_i_np] = np.arange(len(pair_i_np))
+    else:
+        src = np.asarray(edge_index[0], dtype=np.int64)
+        dst = np.asarray(edge_index[1], dtype=np.int64)
+        not_loop = src != dst
+        keys, inverse = np.unique(
+            np.minimum(src, dst)[not_loop] * N + np.maximum(src, dst)[not_loop], return_inverse=True
+        )
+        pair_i_np = keys // N
+        pair_j_np = keys % N
+        target_np = np.full(len(src), -1, dtype=np.int64)
+        target_np[not_loop] = inverse.reshape(-1)
+
+    scores_np = np.ascontiguousarray(heatmaps, dtype=np.double)
+    P = scores_np.shape[0]
+    scores_np = scores_np.reshape(P, -1)
+    if scores_np.shape[1] != target_np.size:
+        error_msg = f"heatmaps of shape {np.shape(heatmaps)} do not match the {N} nodes of the instance"
+        raise ValueError(error_msg)
+
+    cdef const double[:, ::1] points = points_np
+    cdef const np.int64_t[::1] pair_i = np.ascontiguousarray(pair_i_np, dtype=np.int64)
+    cdef const np.int64_t[::1] pair_j = np.ascontiguousarray(pair_j_np, dtype=np.int64)
+    cdef const double[::1] pair_dist = np.linalg.norm(
+        points_np[pair_i_np] - points_np[pair_j_np], axis=-1
+    )
+    cdef const np.int64_t[::1] target = target_np.reshape(-1)
+    cdef const double[:, ::1] scores = scores_np
+    cdef np.ndarray[np.int64_t, ndim=2] tours_np = np.zeros((P, N + 1), dtype=np.int64)
+    cdef np.ndarray[np.int64_t, ndim=1] merge_iterations_np = np.zeros(P, dtype=np.int64)
+    cdef np.int64_t[:, ::1] tours = tours_np
+    cdef np.int64_t[::1] merge_iterations = merge_iterations_np
+
+    if num_threads <= 0:
+        num_threads = openmp.omp_get_max_threads()
+
+    for p in prange(P, nogil=True, schedule="dynamic", num_threads=num_threads):
+        merge_iterations[p] = _merge_sample(points, pair_i, pair_j, pair_dist, target, scores, tours, p)
+
+    if (merge_iterations_np < 0).any():
+        raise MemoryError("could not allocate the buffers of the merge")
+    return tours_np, merge_iterations_np
+
+
+cpdef tuple merge_cython_sparse(
+    double[:, :] coords, const np.int64_t[:, :] edge_index, const double[:] edge_scores
+):
+    tours, merge_iterations = merge_batch(
+        coords, np.asarray(edge_scores)[None], np.asarray(edge_index), num_threads=1
+    )
+    return tours[0], int(merge_iterations[0])
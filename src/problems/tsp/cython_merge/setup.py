@@ -4,6 +4,12 @@ from distutils.extension import Extension
 import numpy as np
 from Cython.Distutils import build_ext
 
-ext = Extension("cython_merge", ["cython_merge.pyx"], include_dirs=[np.get_include()])
+ext = Extension(
+    "cython_merge",
+    ["cython_merge.pyx"],
+    include_dirs=[np.get_include()],
+    extra_compile_args=["-fopenmp"],
+    extra_link_args=["-fopenmp"],
+)
 
 setup(ext_modules=[ext], cmdclass={"build_ext": build_ext})
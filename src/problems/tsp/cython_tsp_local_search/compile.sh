@@ -0,0 +1,5 @@
+#!/bin/bash
+
+cd src/problems/tsp/cython_tsp_local_search
+python setup.py build_ext --inplace
+cd ../../../..
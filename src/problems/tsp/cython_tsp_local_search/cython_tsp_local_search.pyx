@@ -0,0 +1,275 @@
+#cython: language_level=3
+
+import numpy as np
+np.import_array()
+cimport numpy as np
+cimport cython
+cimport openmp
+from cython.parallel cimport prange
+from libc.math cimport sqrt
+
+
+# 2-opt and Or-opt local search on a batch of tours, with neighbor lists and don't-look bits.
+# • A tour is an array of cities plus the position of every city, so the successor and the predecessor
+#   of a city are found in O(1) and a path is reversed in place.
+# • The cities whose don't-look bit is off wait in a FIFO queue, initially all of them. For the city a
+#   at the front of the queue, the moves that add an edge between a and one of its k nearest neighbors are tried:
+#   - 2-opt: remove the edge (a, succ(a)) or (pred(a), a) and an edge of the neighbor, reconnect the tour,
+#   - Or-opt: move the segment of 1 to 3 cities starting at a next to a neighbor of one of its ends.
+# • The first improving move is applied and the endpoints of the changed edges go back to the queue.
+#   Otherwise, the don't-look bit of a is turned on.
+# • A tour stops when its queue is empty or after max_iterations moves.
+# Tours are independent, so they are optimized in parallel without the GIL.
+# Same algorithm as `_neighbor_local_search_tour` in problems/tsp/tsp_operators.py.
+
+cdef double EPS = 1e-9
+
+
+cdef struct Tour:
+    np.int64_t* order
+    np.int64_t* pos
+    np.int64_t* queue
+    np.int8_t* in_queue
+    Py_ssize_t n
+    Py_ssize_t head
+    Py_ssize_t count
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline double _dist(const double* points, np.int64_t a, np.int64_t b) noexcept nogil:
+    cdef double dx = points[2 * a] - points[2 * b]
+    cdef double dy = points[2 * a + 1] - points[2 * b + 1]
+    return sqrt(dx * dx + dy * dy)
+
+
+@cython.cdivision(True)
+cdef inline np.int64_t _succ(Tour* t, np.int64_t c) noexcept nogil:
+    return t.order[(t.pos[c] + 1) % t.n]
+
+
+@cython.cdivision(True)
+cdef inline np.int64_t _pred(Tour* t, np.int64_t c) noexcept nogil:
+    return t.order[(t.pos[c] + t.n - 1) % t.n]
+
+
+@cython.cdivision(True)
+cdef inline Py_ssize_t _offset(Tour* t, np.int64_t u, np.int64_t v) noexcept nogil:
+    # number of steps from u forward to v
+    return (t.pos[v] - t.pos[u] + t.n) % t.n
+
+
+@cython.cdivision(True)
+cdef void _reverse(Tour* t, np.int64_t u, np.int64_t v) noexcept nogil:
+    # reverse the path from u forward to v
+    cdef Py_ssize_t i = t.pos[u], j = t.pos[v], s
+    cdef np.int64_t ci, cj
+    for s in range((_offset(t, u, v) + 1) // 2):
+        ci = t.order[i]
+        cj = t.order[j]
+        t.order[i] = cj
+        t.pos[cj] = i
+        t.order[j] = ci
+        t.pos[ci] = j
+        i = (i + 1) % t.n
+        j = (j + t.n - 1) % t.n
+
+
+@cython.cdivision(True)
+cdef inline void _push(Tour* t, np.int64_t c) noexcept nogil:
+    if not t.in_queue[c]:
+        t.in_queue[c] = 1
+        t.queue[(t.head + t.count) % t.n] = c
+        t.count += 1
+
+
+cdef bint _try_two_opt(
+    Tour* t, const double* points, const np.int64_t* neighbors, Py_ssize_t k, np.int64_t a
+) noexcept nogil:
+    cdef int direction
+    cdef Py_ssize_t m
+    cdef np.int64_t b, c, d, u, v
+    cdef double d_ab, g1
+    for direction in range(2):
+        # direction 0 removes (a, succ(a)) and (c, succ(c)), direction 1 (pred(a), a) and (pred(c), c)
+        b = _succ(t, a) if direction == 0 else _pred(t, a)
+        d_ab = _dist(points, a, b)
+        for m in range(k):
+            c = neighbors[a * k + m]
+            g1 = d_ab - _dist(points, a, c)
+            if g1 <= EPS:
+                # neighbors are sorted by distance, no further neighbor can improve
+                break
+            d = _succ(t, c) if direction == 0 else _pred(t, c)
+            if c == b or d == a:
+                continue
+            if g1 + _dist(points, c, d) - _dist(points, b, d) > EPS:
+                if direction == 0:
+                    u = b
+                    v = c
+                else:
+                    u = a
+                    v = d
+                # reversing the complementary path gives the same tour
+                if 2 * (_offset(t, u, v) + 1) > t.n:
+                    if direction == 0:
+                        u = d
+                        v = a
+                    else:
+                        u = c
+                        v = b
+                _reverse(t, u, v)
+                _push(t, a)
+                _push(t, b)
+                _push(t, c)
+                _push(t, d)
+                return True
+    return False
+
+
+@cython.cdivision(True)
+cdef bint _try_or_opt(
+    Tour* t, const double* points, const np.int64_t* neighbors, Py_ssize_t k, np.int64_t a
+) noexcept nogil:
+    cdef Py_ssize_t length, m, side, e
+    cdef np.int64_t s1 = a, s2, p, nx, s, c, x, y
+    cdef double g_rem, d_xy, add_keep, add_flip
+    for length in range(1, 4):
+        if t.n < length + 3:
+            return False
+        s2 = t.order[(t.pos[a] + length - 1) % t.n]
+        p = _pred(t, s1)
+        nx = _succ(t, s2)
+        g_rem = _dist(points, p, s1) + _dist(points, s2, nx) - _dist(points, p, nx)
+        if g_rem <= EPS:
+            continue
+        for side in range(2):
+            s = s1 if side == 0 else s2
+            for m in range(k):
+                c = neighbors[s * k + m]
+                if _dist(points, s, c) >= g_rem:
+                    break
+                if _offset(t, s1, c) < length:
+                    continue
+                # insert the segment in the edge (x, y), on either side of c
+                for e in range(2):
+                    if e == 0:
+                        x = c
+                        y = _succ(t, c)
+                    else:
+                        x = _pred(t, c)
+                        y = c
+                    if _offset(t, s1, x) < length or _offset(t, s1, y) < length:
+                        continue
+                    d_xy = _dist(points, x, y)
+                    add_keep = _dist(points, x, s2) + _dist(points, s1, y) - d_xy
+                    add_flip = _dist(points, x, s1) + _dist(points, s2, y) - d_xy
+                    if g_rem - (add_flip if add_flip < add_keep else add_keep) <= EPS:
+                        continue
+                    # both ways give x s2..s1 y, reverse the shorter path between the segment and (x, y)
+                    if _offset(t, nx, x) <= _offset(t, y, p):
+                        _reverse(t, s1, x)
+                        _reverse(t, x, nx)
+                    else:
+                        _reverse(t, y, s2)
+                        _reverse(t, p, y)
+                    if add_flip < add_keep:
+                        _reverse(t, s2, s1)
+                    _push(t, p)
+                    _push(t, nx)
+                    _push(t, s1)
+                    _push(t, s2)
+                    _push(t, x)
+                    _push(t, y)
+                    return True
+    return False
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _optimize_row(
+    const double[:, ::1] points,
+    const np.int64_t[:, ::1] neighbors,
+    np.int64_t[:, ::1] order,
+    np.int64_t[:, ::1] pos,
+    np.int64_t[:, ::1] queue,
+    np.int8_t[:, ::1] in_queue,
+    np.int64_t[:, ::1] result,
+    np.int64_t[::1] moves,
+    Py_ssize_t b,
+    Py_ssize_t max_iterations,
+    bint or_opt,
+) noexcept nogil:
+    cdef Tour t
+    cdef Py_ssize_t n = order.shape[1], k = neighbors.shape[1], i, start
+    cdef Py_ssize_t n_moves = 0
+    cdef np.int64_t a, first = order[b, 0]
+    cdef const double* points_ptr = &points[0, 0]
+    cdef const np.int64_t* neighbors_ptr = &neighbors[0, 0]
+
+    t.order = &order[b, 0]
+    t.pos = &pos[b, 0]
+    t.queue = &queue[b, 0]
+    t.in_queue = &in_queue[b, 0]
+    t.n = n
+    t.head = 0
+    t.count = n
+    for i in range(n):
+        t.pos[t.order[i]] = i
+        t.queue[i] = t.order[i]
+        t.in_queue[t.order[i]] = 1
+
+    while t.count > 0 and n_moves < max_iterations:
+        a = t.queue[t.head]
+        t.head = (t.head + 1) % n
+        t.count -= 1
+        t.in_queue[a] = 0
+        if _try_two_opt(&t, points_ptr, neighbors_ptr, k, a) or (
+            or_opt and _try_or_opt(&t, points_ptr, neighbors_ptr, k, a)
+        ):
+            n_moves += 1
+            _push(&t, a)
+
+    # the optimized tour starts at the same city as the input tour
+    start = t.pos[first]
+    for i in range(n):
+        result[b, i] = t.order[(start + i) % n]
+    result[b, n] = first
+    moves[b] = n_moves
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple local_search_batch(
+    const double[:, ::1] points,
+    const np.int64_t[:, ::1] tours,
+    const np.int64_t[:, ::1] neighbors,
+    Py_ssize_t max_iterations=1000,
+    bint or_opt=True,
+    int num_threads=-1,
+):
+    """
+    Tours have shape (B, N + 1), the first city repeated at the end. neighbors has shape (N, k), the
+    k nearest neighbors of every city sorted by distance. Returns the optimized tours, which start at
+    the same city as the input ones, and the number of moves applied to every tour.
+    """
+    cdef Py_ssize_t B = tours.shape[0], n = tours.shape[1] - 1, b
+    cdef np.int64_t[:, ::1] order = np.array(np.asarray(tours)[:, :n], dtype=np.int64, order="C")
+    cdef np.int64_t[:, ::1] pos = np.empty((B, n), dtype=np.int64)
+    cdef np.int64_t[:, ::1] queue = np.empty((B, n), dtype=np.int64)
+    cdef np.int8_t[:, ::1] in_queue = np.zeros((B, n), dtype=np.int8)
+    cdef np.ndarray[np.int64_t, ndim=2] result_np = np.empty((B, n + 1), dtype=np.int64)
+    cdef np.ndarray[np.int64_t, ndim=1] moves_np = np.zeros(B, dtype=np.int64)
+    cdef np.int64_t[:, ::1] result = result_np
+    cdef np.int64_t[::1] moves = moves_np
+
+    if num_threads <= 0:
+        num_threads = openmp.omp_get_max_threads()
+
+    for b in prange(B, nogil=True, schedule="dynamic", num_threads=num_threads):
+        _optimize_row(
+            points, neighbors, order, pos, queue, in_queue, result, moves, b, max_iterations, or_opt
+        )
+
+    return result_np, moves_np
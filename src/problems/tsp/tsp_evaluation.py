@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import warnings
-from multiprocessing import Pool
 
 import numpy as np
-import scipy.sparse
 import scipy.spatial
 import torch
-from problems.tsp.cython_merge.cython_merge import merge_cython, merge_cython_get_tour
+from problems.tsp.cython_merge.cython_merge import (
+    merge_batch,
+    merge_cython,
+    merge_cython_get_tour,
+    merge_cython_sparse,
+    tour_from_neighbors,
+)
 
 
 def numpy_merge(points: np.ndarray, adj_mat: np.ndarray) -> tuple[np.ndarray, int]:
@@ -62,69 +66,91 @@ def cython_merge_get_tour(
         return np.asarray(tour), merge_iterations
 
 
+def cython_merge_sparse(
+    points: np.ndarray, edge_index: np.ndarray, edge_scores: np.ndarray
+) -> tuple[np.ndarray, int]:
+    """
+    Greedy merge of a heatmap on the edges of a sparse graph. Same as
+    `cython_merge_get_tour` on the dense adjacency matrix of the heatmap, but only the E
+    candidate edges are sorted and the memory is O(E + N) instead of O(N^2). If the
+    candidate edges do not connect the tour, its paths are chained by nearest free
+    endpoints.
+
+    Args:
+        points: N x 2 array of node coordinates.
+        edge_index: 2 x E array of edges.
+        edge_scores: E array of edge scores.
+
+    Returns:
+        tour: N + 1 array, starting and ending at node 0.
+        merge_iterations: Number of candidate edges processed.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return merge_cython_sparse(
+            points.astype("double"),
+            np.ascontiguousarray(edge_index, dtype=np.int64),
+            np.ascontiguousarray(edge_scores, dtype=np.double).reshape(-1),
+        )
+
+
+def cython_merge_batch(
+    points: np.ndarray,
+    heatmaps: np.ndarray,
+    edge_index: np.ndarray | None = None,
+    num_threads: int = -1,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy merge of P heatmaps of the same instance, with the samples merged in parallel
+    by OpenMP threads in the cython extension (no process creation or pickling).
+
+    Args:
+        points: N x 2 array of node coordinates.
+        heatmaps: P x N x N array of dense heatmaps, or P x E array of edge scores if
+            edge_index is given.
+        edge_index: 2 x E array of edges of the sparse graph, None for dense heatmaps.
+        num_threads: Number of threads, all available threads if <= 0.
+
+    Returns:
+        tours: P x (N + 1) array of tours, starting and ending at node 0.
+        merge_iterations: P array, number of candidate edges processed for every sample.
+    """
+    if edge_index is not None:
+        edge_index = np.ascontiguousarray(edge_index, dtype=np.int64)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return merge_batch(
+            points.astype("double"), heatmaps, edge_index, num_threads=num_threads
+        )
+
+
 def merge_tours(
     adj_mat: np.ndarray,
     np_points: np.ndarray,
     edge_index_np: np.ndarray,
     sparse_graph: bool = False,
     parallel_sampling: int = 1,
-) -> tuple[list, float]:
+) -> tuple[np.ndarray, float]:
     """
-    Merge tours using the cython implementation of the merge function.
+    Merge tours using the cython implementation of the merge function. The P samples are
+    merged in parallel by `cython_merge_batch`.
 
     Args:
         ajd_mat: P x N x N array of adjacency matrices. P parallel samples, N number of nodes.
         np_points: N x 2 array of node coordinates.
-        edge_index_np: 2 x E array of edges. Only used if sparse_graph is True.
+        edge_index_np: 2 x E array of edges. Only used if sparse_graph is True, in which
+            case adj_mat is a P x E array of edge scores.
         parallel_sampling: Number of parallel samples to run (= P).
 
     Returns:
-        tours: List of tours. Each tour is a list of node indices.
+        tours: P x (N + 1) array of tours, starting and ending at node 0.
         merge_iterations: Average number of merge iterations across all samples.
     """
-    splitted_adj_mat = np.split(adj_mat, parallel_sampling, axis=0)
-
-    if not sparse_graph:
-        splitted_adj_mat = [adj_mat[0] + adj_mat[0].T for adj_mat in splitted_adj_mat]
-    else:
-        splitted_adj_mat = [
-            scipy.sparse.coo_matrix(
-                (adj_mat, (edge_index_np[0], edge_index_np[1])),
-            ).toarray()
-            + scipy.sparse.coo_matrix(
-                (adj_mat, (edge_index_np[1], edge_index_np[0])),
-            ).toarray()
-            for adj_mat in splitted_adj_mat
-        ]
-
-    splitted_points = [np_points for _ in range(parallel_sampling)]
-
-    if np_points.shape[0] > 1000 and parallel_sampling > 1:
-        with Pool(parallel_sampling) as p:
-            results = p.starmap(
-                cython_merge,
-                zip(splitted_points, splitted_adj_mat),
-            )
-    else:
-        results = [
-            cython_merge(_np_points, _adj_mat)
-            for _np_points, _adj_mat in zip(splitted_points, splitted_adj_mat)
-        ]
-
-    splitted_real_adj_mat, splitted_merge_iterations = zip(*results)
-
-    tours = []
-    for i in range(parallel_sampling):
-        tour = [0]
-        while len(tour) < splitted_adj_mat[i].shape[0] + 1:
-            n = np.nonzero(splitted_real_adj_mat[i][tour[-1]])[0]
-            if len(tour) > 1:
-                n = n[n != tour[-2]]
-            tour.append(n.max())
-        tours.append(tour)
-
-    merge_iterations = np.mean(splitted_merge_iterations)
-    return tours, merge_iterations
+    heatmaps = adj_mat.reshape(parallel_sampling, -1)
+    tours, merge_iterations = cython_merge_batch(
+        np_points, heatmaps, edge_index_np if sparse_graph else None
+    )
+    return tours, np.mean(merge_iterations)
 
 
 class TSPEvaluator:
@@ -169,14 +195,9 @@ def evaluate_tsp_route_torch(dist_mat: torch.Tensor, route: torch.Tensor) -> flo
 
 
 def adj_mat_to_tour(adj_mat: np.ndarray) -> list:
-    N = adj_mat.shape[0]
-    tour = [0]
-    while len(tour) < N + 1:
-        n = np.nonzero(adj_mat[tour[-1]])[0]
-        if len(tour) > 1:
-            n = n[n != tour[-2]]
-        tour.append(n.max())
-    return tour
+    """Tour of size N + 1 from the adjacency matrix of a tour (two nonzeros per row)."""
+    neighbors = np.nonzero(adj_mat)[1].reshape(-1, 2)
+    return tour_from_neighbors(np.ascontiguousarray(neighbors, dtype=np.int64)).tolist()
 
 
 @torch.no_grad()
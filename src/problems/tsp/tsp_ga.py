@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import os
 from copy import deepcopy
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 import numpy as np
 import torch
 from evotorch import Problem, SolutionBatch
 from evotorch.algorithms import GeneticAlgorithm
+from evotorch.decorators import vectorized
 from evotorch.operators import CopyingOperator, CrossOver
 from torch import no_grad
 
@@ -23,8 +25,12 @@ class TSPGAProblem(Problem):
         self.config = config
         self.config.task = "tsp"
 
+        @vectorized
+        def evaluate_population(population: torch.Tensor) -> torch.Tensor:
+            return instance.evaluate_tours(population)
+
         super().__init__(
-            objective_func=instance.evaluate_solution,
+            objective_func=evaluate_population,
             objective_sense="min",
             solution_length=instance.n + 1,
             device=config.device,
@@ -44,20 +50,41 @@ class TSPGAProblem(Problem):
 
     def _fill_random_feasible_initialization(self, values: torch.Tensor) -> None:
         """
-        Values is a tensor of shape (n_solutions, solution_length).
+        Values is a tensor of shape (n_solutions, solution_length). With the default
+        tsp_construction="random_heatmap", the tours are merged from random heatmaps.
+        Otherwise, they are built by the given construction heuristic.
         """
+        construction = (
+            self.config.tsp_construction
+            if "tsp_construction" in self.config
+            else "random_heatmap"
+        )
+        if construction != "random_heatmap":
+            n_neighbors = (
+                self.config.tsp_n_neighbors if "tsp_n_neighbors" in self.config else 10
+            )
+            values[:] = self.instance.construct_tours(
+                values.shape[0], construction, n_neighbors
+            )
+            return
+
         if not self.instance.sparse:
             shape = (self.instance.n, self.instance.n)
         else:
             shape = (self.instance.n * self.config.sparse_factor,)
 
-        for i in range(values.shape[0]):
-            random_heatmap = (
-                np.ones(shape, dtype=np.float32)
-                if i == 0
-                else np.random.rand(*shape).astype(np.float32)
+        # merged by chunks of about one heatmap per thread, so that only a few heatmaps
+        # are in memory at once. rand gives the doubles read by the merge, not a copy.
+        n_solutions = values.shape[0]
+        chunk_size = os.cpu_count() or 1
+        for start in range(0, n_solutions, chunk_size):
+            end = min(start + chunk_size, n_solutions)
+            random_heatmaps = np.random.rand(end - start, *shape)
+            if start == 0:
+                random_heatmaps[0] = 1
+            values[start:end] = self.instance.get_tours_from_adjacency_np_heatmaps(
+                random_heatmaps
             )
-            values[i] = self.instance.get_tour_from_adjacency_np_heatmap(random_heatmap)
 
     def _fill_difusco_sampling(self, values: torch.Tensor) -> None:
         """
@@ -75,36 +102,111 @@ class TSPGAProblem(Problem):
         heatmaps = sampler.sample_tsp(
             batch=None, edge_index=self.instance.edge_index, points=self.instance.points
         )
-        for i in range(popsize):
-            values[i] = self.instance.get_tour_from_adjacency_np_heatmap(
-                heatmaps[i].cpu().numpy()
-            )
+        values[:] = self.instance.get_tours_from_adjacency_np_heatmaps(
+            heatmaps[:popsize].cpu().numpy()
+        )
 
 
 class TSPTwoOptMutation(CopyingOperator):
+    """
+    Local search mutation. With local_search="two_opt", applies the best 2-opt move of
+    every tour max_iterations times (O(n^2) per iteration), or up to moves_per_iteration
+    non-overlapping moves per iteration. With local_search="neighbor_lists", applies at
+    most max_iterations improving 2-opt and Or-opt moves restricted to the n_neighbors
+    nearest neighbors of the cities, which scales to large instances.
+    """
+
+    def __init__(
+        self,
+        problem: TSPGAProblem,
+        instance: TSPInstance,
+        max_iterations: int = 5,
+        local_search: Literal["two_opt", "neighbor_lists"] = "two_opt",
+        n_neighbors: int = 10,
+        moves_per_iteration: int = 1,
+    ) -> None:
+        super().__init__(problem)
+        self._instance = instance
+        self._max_iterations = max_iterations
+        self._local_search = local_search
+        self._n_neighbors = n_neighbors
+        self._moves_per_iteration = moves_per_iteration
+
+    @torch.no_grad()
+    def _do(self, batch: SolutionBatch) -> SolutionBatch:
+        result = deepcopy(batch)
+        data = result.access_values()
+        if self._local_search == "neighbor_lists":
+            data[:] = self._instance.neighbor_local_search_mutation(
+                data,
+                max_iterations=self._max_iterations,
+                n_neighbors=self._n_neighbors,
+            )
+        else:
+            data[:] = self._instance.two_opt_mutation(
+                data,
+                max_iterations=self._max_iterations,
+                moves_per_iteration=self._moves_per_iteration,
+            )
+        return result
+
+
+class TSPOrOptMutation(CopyingOperator):
+    """
+    Or-opt mutation: moves segments of 1 to 3 cities next to the n_neighbors nearest
+    neighbors of their ends, for all the tours at once. At most max_iterations moves per
+    tour, each iteration trying n_segments random segment starts, so the cost grows with
+    n * n_neighbors instead of n^2.
+    """
+
     def __init__(
-        self, problem: TSPGAProblem, instance: TSPInstance, max_iterations: int = 5
+        self,
+        problem: TSPGAProblem,
+        instance: TSPInstance,
+        max_iterations: int = 5,
+        n_neighbors: int = 10,
+        n_segments: int = 64,
     ) -> None:
         super().__init__(problem)
         self._instance = instance
         self._max_iterations = max_iterations
+        self._n_neighbors = n_neighbors
+        self._n_segments = n_segments
 
     @torch.no_grad()
     def _do(self, batch: SolutionBatch) -> SolutionBatch:
         result = deepcopy(batch)
         data = result.access_values()
-        data[:] = self._instance.two_opt_mutation(
-            data, max_iterations=self._max_iterations
+        data[:] = self._instance.or_opt_mutation(
+            data,
+            max_iterations=self._max_iterations,
+            n_neighbors=self._n_neighbors,
+            n_segments=self._n_segments,
         )
         return result
 
 
 class TSPGACrossover(CrossOver):
+    """
+    Crossover of two batches of parents. crossover="edge_recombination" builds the
+    children in n sequential steps, while crossover="order" (OX1) and crossover="eax"
+    (simplified edge assembly) use O(1) and O(log n) tensor ops respectively.
+    """
+
     def __init__(
-        self, problem: Problem, instance: TSPInstance, tournament_size: int = 4
+        self,
+        problem: Problem,
+        instance: TSPInstance,
+        tournament_size: int = 4,
+        crossover: Literal["edge_recombination", "order", "eax"] = "edge_recombination",
     ) -> None:
         super().__init__(problem, tournament_size=tournament_size)
         self._instance = instance
+        self._crossover = {
+            "edge_recombination": instance.edge_recombination_crossover,
+            "order": instance.order_crossover,
+            "eax": instance.eax_crossover,
+        }[crossover]
 
     @no_grad()
     def _do_cross_over(
@@ -117,9 +219,9 @@ class TSPGACrossover(CrossOver):
          - children1: forces the selection of common nodes between parents1 and parents2.
          - children2: forces the selection of the remaining nodes, but penalizes the common nodes.
         """
-        # Perform edge recombination crossover twice
-        children1 = self._instance.edge_recombination_crossover(parents1, parents2)
-        children2 = self._instance.edge_recombination_crossover(parents2, parents1)
+        # Perform the crossover twice
+        children1 = self._crossover(parents1, parents2)
+        children2 = self._crossover(parents2, parents1)
 
         # Combine children into final result
         children = torch.cat([children1, children2], dim=0)
@@ -131,13 +233,46 @@ def create_tsp_ga(
     instance: TSPInstance, config: Config, **kwargs: dict
 ) -> GeneticAlgorithm:  # noqa: ARG001
     problem = TSPGAProblem(instance, config)
+    local_search = (
+        config.tsp_local_search if "tsp_local_search" in config else "two_opt"
+    )
+    n_neighbors = config.tsp_n_neighbors if "tsp_n_neighbors" in config else 10
+    moves_per_iteration = (
+        config.two_opt_moves_per_iteration
+        if "two_opt_moves_per_iteration" in config
+        else 1
+    )
+    crossover = (
+        config.tsp_crossover if "tsp_crossover" in config else "edge_recombination"
+    )
+
+    if local_search == "or_opt":
+        n_segments = (
+            config.tsp_or_opt_segments if "tsp_or_opt_segments" in config else 64
+        )
+        mutation = TSPOrOptMutation(
+            problem,
+            instance,
+            max_iterations=config.max_two_opt_it,
+            n_neighbors=n_neighbors,
+            n_segments=n_segments,
+        )
+    else:
+        mutation = TSPTwoOptMutation(
+            problem,
+            instance,
+            max_iterations=config.max_two_opt_it,
+            local_search=local_search,
+            n_neighbors=n_neighbors,
+            moves_per_iteration=moves_per_iteration,
+        )
 
     return GeneticAlgorithm(
         problem=problem,
         popsize=config.pop_size,
         re_evaluate=False,
         operators=[
-            TSPGACrossover(problem, instance, tournament_size=4),
-            TSPTwoOptMutation(problem, instance, max_iterations=config.max_two_opt_it),
+            TSPGACrossover(problem, instance, tournament_size=4, crossover=crossover),
+            mutation,
         ],
     )
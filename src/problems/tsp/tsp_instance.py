@@ -1,18 +1,26 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
-import scipy.sparse
 import torch
 from ea.problem_instance import ProblemInstance
 from problems.tsp.tsp_evaluation import (
-    adj_mat_to_tour,
-    cython_merge,
+    cython_merge_batch,
+    cython_merge_get_tour,
+    cython_merge_sparse,
     evaluate_tsp_route_torch,
 )
 from problems.tsp.tsp_operators import (
+    batched_greedy_edge_tours,
+    batched_nearest_neighbor_tours,
+    batched_neighbor_local_search,
+    batched_or_opt_torch,
+    batched_space_filling_curve_tours,
     batched_two_opt_torch,
+    eax_crossover,
     edge_recombination_crossover,
+    get_knn_neighbors,
+    order_crossover,
 )
 
 from difusco.tsp.pl_tsp_model import TSPModel
@@ -46,6 +54,8 @@ class TSPInstance(ProblemInstance):
         self.gt_tour = gt_tour
         self.dist_mat = torch.cdist(points, points)
         self.gt_cost = self.evaluate_tsp_route(self.gt_tour)
+        # k-nearest candidate lists of the local search, by k
+        self.knn_neighbors: dict[int, np.ndarray] = {}
 
     @staticmethod
     def create_from_batch_sample(
@@ -74,42 +84,135 @@ class TSPInstance(ProblemInstance):
     def get_gt_cost(self) -> float:
         return self.gt_cost
 
+    def share_memory_(self) -> TSPInstance:
+        super().share_memory_()
+        # the numpy arrays are views of the moved tensors
+        self.np_points = self.points.cpu().numpy()
+        if self.edge_index is not None:
+            self.np_edge_index = self.edge_index.cpu().numpy()
+        return self
+
     def evaluate_tsp_route(self, route: torch.Tensor) -> float:
         return evaluate_tsp_route_torch(self.dist_mat, route)
 
+    def evaluate_tours(self, tours: torch.Tensor) -> torch.Tensor:
+        """
+        Lengths of the tours of shape (..., n + 1), with one gather from the distance
+        matrix and a sum over the last dimension. Returns a tensor of shape (...).
+        """
+        dist_mat = self.dist_mat.to(tours.device)
+        return dist_mat[tours[..., :-1], tours[..., 1:]].sum(dim=-1)
+
     def two_opt_mutation(
-        self, routes: torch.Tensor, max_iterations: int
+        self, routes: torch.Tensor, max_iterations: int, moves_per_iteration: int = 1
     ) -> torch.Tensor:
         """Routes is a tensor of shape (n_solutions, n + 1)"""
         tours, _ = batched_two_opt_torch(
-            self.points, routes, max_iterations=max_iterations, device=self.device
+            self.points,
+            routes,
+            max_iterations=max_iterations,
+            device=self.device,
+            moves_per_iteration=moves_per_iteration,
+        )
+        return tours
+
+    def get_knn_neighbors(self, k: int = 10) -> np.ndarray:
+        """Array of shape (n, k) with the k nearest neighbors of every city, cached."""
+        if k not in self.knn_neighbors:
+            self.knn_neighbors[k] = get_knn_neighbors(self.np_points, k)
+        return self.knn_neighbors[k]
+
+    def neighbor_local_search_mutation(
+        self, routes: torch.Tensor, max_iterations: int, n_neighbors: int = 10
+    ) -> torch.Tensor:
+        """
+        Routes is a tensor of shape (n_solutions, n + 1). Applies at most max_iterations
+        2-opt and Or-opt moves per route, restricted to the n_neighbors nearest
+        neighbors of the cities.
+        """
+        tours, _ = batched_neighbor_local_search(
+            self.np_points,
+            routes,
+            self.get_knn_neighbors(n_neighbors),
+            max_iterations=max_iterations,
         )
         return tours
 
+    def or_opt_mutation(
+        self,
+        routes: torch.Tensor,
+        max_iterations: int,
+        n_neighbors: int = 10,
+        n_segments: int = 64,
+    ) -> torch.Tensor:
+        """
+        Routes is a tensor of shape (n_solutions, n + 1). Applies at most max_iterations
+        Or-opt moves per route, inserting the segments next to the n_neighbors nearest
+        neighbors of their ends.
+        """
+        return batched_or_opt_torch(
+            self.points,
+            routes,
+            self.get_knn_neighbors(n_neighbors),
+            max_iterations=max_iterations,
+            n_segments=n_segments,
+        )
+
     def get_tour_from_adjacency_np_heatmap(self, heatmap: np.ndarray) -> torch.Tensor:
         """
-        If sparse, heatmap is an np.array of shape (n, n).
-        If dense, heatmap is an np.array of shape (n, n_edges).
+        If sparse, heatmap is an np.array of shape (n_edges,).
+        If dense, heatmap is an np.array of shape (n, n).
 
         Returns the tour of size n + 1, with the last value being the first value.
         """
         if self.sparse:
-            # convert to sparse adjacency matrix
-            adj_mat = (
-                scipy.sparse.coo_matrix(
-                    (heatmap, (self.np_edge_index[0], self.np_edge_index[1])),
-                ).toarray()
-                + scipy.sparse.coo_matrix(
-                    (heatmap, (self.np_edge_index[1], self.np_edge_index[0])),
-                ).toarray()
-            )
-        else:
-            adj_mat = heatmap
+            # merge on the candidate edges, without the dense adjacency matrix
+            tour, _ = cython_merge_sparse(self.np_points, self.np_edge_index, heatmap)
+            return torch.tensor(tour, device=self.device)
 
-        solved_adj_mat, _ = cython_merge(self.np_points, adj_mat)
-        tour = adj_mat_to_tour(solved_adj_mat)
+        tour, _ = cython_merge_get_tour(self.np_points, heatmap)
         return torch.tensor(tour, device=self.device)
 
+    def get_tours_from_adjacency_np_heatmaps(
+        self, heatmaps: np.ndarray
+    ) -> torch.Tensor:
+        """
+        Batched version of `get_tour_from_adjacency_np_heatmap`, the heatmaps are merged
+        in parallel. If sparse, heatmaps has shape (batch_size, n_edges). If dense, it
+        has shape (batch_size, n, n).
+
+        Returns the tours, a tensor of size (batch_size, n + 1).
+        """
+        tours, _ = cython_merge_batch(
+            self.np_points, heatmaps, self.np_edge_index if self.sparse else None
+        )
+        return torch.tensor(tours, device=self.device)
+
+    def construct_tours(
+        self,
+        n_tours: int,
+        construction: Literal["nearest_neighbor", "greedy_edge", "space_filling_curve"],
+        n_neighbors: int = 10,
+    ) -> torch.Tensor:
+        """
+        Randomized construction heuristic for a batch of tours, see the batched_*_tours
+        functions of tsp_operators. greedy_edge uses the n_neighbors nearest neighbors
+        of the cities as candidate edges.
+
+        Returns the tours, a tensor of size (n_tours, n + 1).
+        """
+        if construction == "nearest_neighbor":
+            return batched_nearest_neighbor_tours(self.dist_mat, n_tours)
+        if construction == "greedy_edge":
+            tours = batched_greedy_edge_tours(
+                self.np_points, n_tours, self.get_knn_neighbors(n_neighbors)
+            )
+            return torch.tensor(tours, device=self.device)
+        if construction == "space_filling_curve":
+            return batched_space_filling_curve_tours(self.points, n_tours)
+        error_msg = f"Invalid tour construction: {construction}"
+        raise ValueError(error_msg)
+
     def edge_recombination_crossover(
         self, parents1: torch.Tensor, parents2: torch.Tensor
     ) -> torch.Tensor:
@@ -125,17 +228,24 @@ class TSPInstance(ProblemInstance):
         """
         return edge_recombination_crossover(parents1, parents2)
 
+    def order_crossover(
+        self, parents1: torch.Tensor, parents2: torch.Tensor
+    ) -> torch.Tensor:
+        """Order crossover (OX1) for a batch of parents, see `order_crossover`."""
+        return order_crossover(parents1, parents2)
+
+    def eax_crossover(
+        self, parents1: torch.Tensor, parents2: torch.Tensor
+    ) -> torch.Tensor:
+        """Simplified EAX for a batch of parents, see `eax_crossover`."""
+        return eax_crossover(parents1, parents2)
+
     def evaluate_individual(self, ind: torch.Tensor) -> float:
         # individual has size self.n ** 2, we reshape it to a matrix
         heatmap = ind.view(self.n, self.n).cpu().numpy()
 
-        # use cython_merge to get the adj matrix of the tour
-        adj_mat, _ = cython_merge(self.np_points, heatmap)
-
-        # convert adj matrix to tour
-        tour = adj_mat_to_tour(adj_mat)
-        tour.append(0)
-
+        # use cython_merge to get the tour
+        tour, _ = cython_merge_get_tour(self.np_points, heatmap)
         tour = torch.tensor(tour, device=ind.device)
 
         # Evaluate the tour using TSPTorchEvaluator
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
+import math
+from collections import deque
 from typing import Literal
 
 import numpy as np
 import torch
+from problems.tsp.tsp_evaluation import cython_merge_batch
+
+try:
+    from problems.tsp.cython_tsp_local_search.cython_tsp_local_search import (
+        local_search_batch,
+    )
+except ImportError:  # extension not compiled, see problems/tsp/cython_tsp_local_search
+    local_search_batch = None
 
 
 def batched_two_opt_torch(
@@ -11,11 +21,18 @@ def batched_two_opt_torch(
     tour: np.ndarray | torch.Tensor,
     max_iterations: int = 1000,
     device: Literal["cpu", "gpu"] = "cpu",
+    moves_per_iteration: int = 1,
 ) -> tuple[np.ndarray | torch.Tensor, int]:
     """
     Apply the 2-opt algorithm to a batch of tours.
     Tours have N + 1 elements, i.e., the first city is repeated at the end.
 
+    In every iteration, up to moves_per_iteration improving moves are applied to every
+    tour: the best move, then the best move that does not overlap with the selected
+    ones, and so on. Moves that do not overlap reverse disjoint segments and replace
+    disjoint edges, so their gains add up. The segments of all tours are reversed at
+    once, with a single gather.
+
     Works for both numpy and torch.
 
     Args:
@@ -23,6 +40,7 @@ def batched_two_opt_torch(
         tour: Tour as numpy array or torch tensor of shape (batch_size, N+1)
         max_iterations: Maximum number of iterations
         device: Device to run computations on ("cpu" or "gpu")
+        moves_per_iteration: Maximum number of moves applied to a tour per iteration
 
     Returns:
         tuple of (optimized tour array, number of iterations performed)
@@ -45,6 +63,10 @@ def batched_two_opt_torch(
 
         # Rest of the function remains the same
         batch_size = cuda_tour.shape[0]
+        n_points = len(points)
+        positions = torch.arange(cuda_tour.shape[1], device=cuda_tour.device)
+        move_i = torch.arange(n_points, device=cuda_tour.device).view(1, -1, 1)
+        move_j = torch.arange(n_points, device=cuda_tour.device).view(1, 1, -1)
 
         min_change = -1.0
         while min_change < 0.0:
@@ -76,30 +98,530 @@ def batched_two_opt_torch(
             valid_change = torch.triu(change, diagonal=2)
 
             min_change = torch.min(valid_change)
-            flatten_argmin_index = torch.argmin(
-                valid_change.reshape(batch_size, -1), dim=-1
-            )
-            min_i = torch.div(flatten_argmin_index, len(points), rounding_mode="floor")
-            min_j = torch.remainder(flatten_argmin_index, len(points))
-
-            if min_change < -1e-6:
-                for i in range(batch_size):
-                    cuda_tour[i, min_i[i] + 1 : min_j[i] + 1] = torch.flip(
-                        cuda_tour[i, min_i[i] + 1 : min_j[i] + 1], dims=(0,)
-                    )
-                iterator += 1
-            else:
+            if min_change >= -1e-6:
                 break
 
+            # the move (i, j) reverses the positions i + 1..j of the tour
+            permutation = positions.expand(batch_size, -1)
+            for _ in range(moves_per_iteration):
+                tour_min_change, flatten_argmin_index = valid_change.reshape(
+                    batch_size, -1
+                ).min(dim=-1)
+                min_i = torch.div(flatten_argmin_index, n_points, rounding_mode="floor")
+                min_j = torch.remainder(flatten_argmin_index, n_points)
+                improving = tour_min_change < -1e-6
+                if not improving.any():
+                    break
+
+                in_segment = (
+                    improving.unsqueeze(-1)
+                    & (positions > min_i.unsqueeze(-1))
+                    & (positions <= min_j.unsqueeze(-1))
+                )
+                permutation = torch.where(
+                    in_segment,
+                    (min_i + 1 + min_j).unsqueeze(-1) - positions,
+                    permutation,
+                )
+
+                # discard the moves that overlap with the selected move
+                overlap = (move_j >= min_i.view(-1, 1, 1)) & (
+                    move_i <= min_j.view(-1, 1, 1)
+                )
+                valid_change = valid_change.masked_fill(overlap, 0.0)
+
+            cuda_tour = cuda_tour.gather(1, permutation)
+            iterator += 1
+
             if iterator >= max_iterations:
                 break
 
-        # Convert back to numpy if input was numpy
-        tour = cuda_tour.cpu().numpy() if return_numpy else cuda_tour
+        # Convert back to numpy if input was numpy, otherwise update the input tensor
+        tour = cuda_tour.cpu().numpy() if return_numpy else tour.copy_(cuda_tour)
 
     return tour, iterator
 
 
+def is_cython_local_search_available() -> bool:
+    """Whether the compiled cython_tsp_local_search extension can be used."""
+    return local_search_batch is not None
+
+
+def get_knn_neighbors(
+    points: np.ndarray | torch.Tensor, k: int = 10, chunk_size: int = 1024
+) -> np.ndarray:
+    """
+    Candidate lists for the local search: the k nearest neighbors of every point, sorted
+    by increasing distance. Distances are computed by chunks of rows, so the memory is
+    O(chunk_size * N) instead of O(N^2).
+
+    Args:
+        points: Points as numpy array or torch tensor of shape (N, 2)
+        k: Number of neighbors, at most N - 1
+        chunk_size: Number of rows of the distance matrix computed at once
+
+    Returns:
+        np.ndarray of shape (N, min(k, N - 1)), int64
+    """
+    points = torch.as_tensor(points).cpu().to(torch.float64)
+    n = points.shape[0]
+    k = min(k, n - 1)
+    neighbors = torch.empty((n, k), dtype=torch.int64)
+    for start in range(0, n, chunk_size):
+        dists = torch.cdist(points[start : start + chunk_size], points)
+        # a point is not its own neighbor
+        rows = torch.arange(dists.shape[0])
+        dists[rows, rows + start] = float("inf")
+        neighbors[start : start + chunk_size] = dists.topk(k, largest=False).indices
+    return neighbors.numpy()
+
+
+def _neighbor_local_search_tour(
+    points: list[list[float]],
+    tour: list[int],
+    neighbors: list[list[int]],
+    max_iterations: int,
+    or_opt: bool,
+) -> tuple[list[int], int]:
+    """
+    Pure python version of the local search of problems/tsp/cython_tsp_local_search,
+    which documents the algorithm. Tour is a list of the N cities (without the repeated
+    first city).
+
+    Returns:
+        tuple of (optimized tour with N + 1 cities, starting at the same city,
+            number of moves)
+    """
+    eps = 1e-9
+    n = len(tour)
+    first = tour[0]
+    tour = list(tour)
+    pos = [0] * n
+    for i, c in enumerate(tour):
+        pos[c] = i
+
+    def dist(a: int, b: int) -> float:
+        dx = points[a][0] - points[b][0]
+        dy = points[a][1] - points[b][1]
+        return math.sqrt(dx * dx + dy * dy)
+
+    def succ(c: int) -> int:
+        return tour[(pos[c] + 1) % n]
+
+    def pred(c: int) -> int:
+        return tour[(pos[c] - 1) % n]
+
+    def offset(u: int, v: int) -> int:
+        """Number of steps from u forward to v."""
+        return (pos[v] - pos[u]) % n
+
+    def reverse(u: int, v: int) -> None:
+        """Reverse the path from u forward to v."""
+        i, j = pos[u], pos[v]
+        for _ in range((offset(u, v) + 1) // 2):
+            ci, cj = tour[i], tour[j]
+            tour[i], pos[cj] = cj, i
+            tour[j], pos[ci] = ci, j
+            i, j = (i + 1) % n, (j - 1) % n
+
+    # cities whose don't-look bit is off
+    queue = deque(tour)
+    in_queue = [True] * n
+
+    def push(c: int) -> None:
+        if not in_queue[c]:
+            in_queue[c] = True
+            queue.append(c)
+
+    def try_two_opt(a: int) -> bool:
+        # removes (a, succ(a)) and (c, succ(c)), or (pred(a), a) and (pred(c), c)
+        for forward in [True, False]:
+            b = succ(a) if forward else pred(a)
+            d_ab = dist(a, b)
+            for c in neighbors[a]:
+                g1 = d_ab - dist(a, c)
+                if g1 <= eps:
+                    # neighbors are sorted by distance, no further neighbor can improve
+                    break
+                d = succ(c) if forward else pred(c)
+                if c == b or d == a:
+                    continue
+                if g1 + dist(c, d) - dist(b, d) > eps:
+                    u, v = (b, c) if forward else (a, d)
+                    # reversing the complementary path gives the same tour
+                    if 2 * (offset(u, v) + 1) > n:
+                        u, v = (d, a) if forward else (c, b)
+                    reverse(u, v)
+                    for z in [a, b, c, d]:
+                        push(z)
+                    return True
+        return False
+
+    def try_or_opt(a: int) -> bool:
+        # moves the segment s1..s2 of 1 to 3 cities starting at a
+        for length in [1, 2, 3]:
+            if n < length + 3:
+                return False
+            s1, s2 = a, tour[(pos[a] + length - 1) % n]
+            p, nx = pred(s1), succ(s2)
+            g_rem = dist(p, s1) + dist(s2, nx) - dist(p, nx)
+            if g_rem <= eps:
+                continue
+            for s in [s1, s2]:
+                for c in neighbors[s]:
+                    if dist(s, c) >= g_rem:
+                        break
+                    if offset(s1, c) < length:
+                        continue
+                    # insert the segment in the edge (x, y), on either side of c
+                    for x, y in [(c, succ(c)), (pred(c), c)]:
+                        if offset(s1, x) < length or offset(s1, y) < length:
+                            continue
+                        d_xy = dist(x, y)
+                        add_keep = dist(x, s2) + dist(s1, y) - d_xy
+                        add_flip = dist(x, s1) + dist(s2, y) - d_xy
+                        if g_rem - min(add_keep, add_flip) <= eps:
+                            continue
+                        # both ways give x s2..s1 y, the shorter path is reversed
+                        if offset(nx, x) <= offset(y, p):
+                            reverse(s1, x)
+                            reverse(x, nx)
+                        else:
+                            reverse(y, s2)
+                            reverse(p, y)
+                        if add_flip < add_keep:
+                            reverse(s2, s1)
+                        for z in [p, nx, s1, s2, x, y]:
+                            push(z)
+                        return True
+        return False
+
+    n_moves = 0
+    while queue and n_moves < max_iterations:
+        a = queue.popleft()
+        in_queue[a] = False
+        if try_two_opt(a) or (or_opt and try_or_opt(a)):
+            n_moves += 1
+            push(a)
+
+    start = pos[first]
+    return tour[start:] + tour[:start] + [first], n_moves
+
+
+def batched_neighbor_local_search(
+    points: np.ndarray | torch.Tensor,
+    tour: np.ndarray | torch.Tensor,
+    neighbors: np.ndarray,
+    max_iterations: int = 1000,
+    or_opt: bool = True,
+    num_threads: int = -1,
+) -> tuple[np.ndarray | torch.Tensor, int]:
+    """
+    Apply 2-opt and Or-opt moves to a batch of tours, using neighbor lists and
+    don't-look bits. Tours have N + 1 elements, i.e., the first city is repeated at the
+    end.
+
+    Unlike `batched_two_opt_torch`, which evaluates all O(N^2) moves to apply one move
+    per tour, only the moves that add an edge to one of the k nearest neighbors of a
+    city are evaluated, and the moves are applied as soon as they improve the tour. This
+    scales to TSP-1000 and larger. The tours are optimized in the compiled
+    cython_tsp_local_search extension, in parallel, or by a (slow) pure python fallback
+    if it is not compiled.
+
+    Works for both numpy and torch.
+
+    Args:
+        points: Points as numpy array or torch tensor of shape (N, 2)
+        tour: Tour as numpy array or torch tensor of shape (batch_size, N+1)
+        neighbors: Neighbor lists of shape (N, k), see `get_knn_neighbors`
+        max_iterations: Maximum number of moves per tour
+        or_opt: Whether to apply Or-opt moves besides 2-opt moves
+        num_threads: Number of threads. If not positive, OpenMP decides.
+
+    Returns:
+        tuple of (optimized tour array, maximum number of moves applied to a tour)
+    """
+    return_numpy = isinstance(tour, np.ndarray)
+    np_points = points.cpu().numpy() if isinstance(points, torch.Tensor) else points
+    np_tour = tour if return_numpy else tour.cpu().numpy()
+    np_points = np.ascontiguousarray(np_points, dtype=np.float64)
+    np_tour = np.ascontiguousarray(np_tour, dtype=np.int64)
+    neighbors = np.ascontiguousarray(neighbors, dtype=np.int64)
+
+    if is_cython_local_search_available():
+        solved_tour, moves = local_search_batch(
+            np_points, np_tour, neighbors, max_iterations, or_opt, num_threads
+        )
+    else:
+        points_list, neighbors_list = np_points.tolist(), neighbors.tolist()
+        solved_tour = np.empty_like(np_tour)
+        moves = np.zeros(np_tour.shape[0], dtype=np.int64)
+        for i, row in enumerate(np_tour[:, :-1].tolist()):
+            solved_tour[i], moves[i] = _neighbor_local_search_tour(
+                points_list, row, neighbors_list, max_iterations, or_opt
+            )
+
+    iterations = int(moves.max()) if len(moves) > 0 else 0
+    if not return_numpy:
+        solved_tour = torch.from_numpy(solved_tour).to(tour.device)
+    return solved_tour, iterations
+
+
+def batched_or_opt_torch(
+    points: torch.Tensor,
+    tours: torch.Tensor,
+    neighbors: np.ndarray | torch.Tensor,
+    max_iterations: int = 10,
+    n_segments: int = 64,
+) -> torch.Tensor:
+    """
+    Or-opt for a batch of tours: a segment of 1 to 3 cities is moved, possibly reversed,
+    between two consecutive cities. At every iteration, the segments starting at
+    n_segments random positions of every tour are tried, inserted next to the k nearest
+    neighbors of their ends, and the best improving move of every tour is applied. The
+    work is O(batch_size * (n + n_segments * k)) per iteration, and at most
+    max_iterations moves are applied to every tour.
+
+    Args:
+        points: Points of shape (N, 2)
+        tours: Tours of shape (batch_size, N + 1), the first city repeated at the end
+        neighbors: Candidate lists of shape (N, k), see `get_knn_neighbors`
+        max_iterations: Maximum number of moves per tour
+        n_segments: Number of segment starts tried per tour and iteration
+
+    Returns:
+        tours: Tensor of shape (batch_size, N + 1), with the first city of the input
+    """
+    device = tours.device
+    points = points.to(device)
+    neighbors = torch.as_tensor(neighbors, device=device)
+    batch_size = tours.size(0)
+    n = tours.size(1) - 1
+    n_segments = min(n_segments, n)
+    order = tours[:, :-1].long()
+    positions = torch.arange(n, device=device)
+    lengths = torch.arange(1, 4, device=device)
+
+    def city(index: torch.Tensor) -> torch.Tensor:
+        # city at the given positions, for an index of shape (batch_size, ...)
+        return order.gather(1, index.reshape(batch_size, -1)).reshape(index.shape)
+
+    def dist(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+        return (points[a] - points[b]).norm(dim=-1)
+
+    def pick(
+        values: torch.Tensor, x_pos: torch.Tensor, best: torch.Tensor
+    ) -> torch.Tensor:
+        # value of the best move of every tour, values broadcasts to the moves x_pos
+        return values.expand_as(x_pos).reshape(batch_size, -1).gather(1, best)
+
+    for _ in range(max_iterations):
+        pos = torch.empty_like(order).scatter_(
+            1, order, positions.expand(batch_size, -1)
+        )
+
+        # segments [start, end] of length 1 to 3, without wrapping around, of shape
+        # (batch_size, n_segments, 3). The tour needs 3 more cities to move them.
+        starts = torch.rand((batch_size, n), device=device).topk(n_segments).indices
+        starts = starts.unsqueeze(-1).expand(-1, -1, 3)
+        ends = starts + lengths - 1
+        valid = (ends < n) & (lengths + 3 <= n)
+        ends = ends.clamp(max=n - 1)
+        first, last = city(starts), city(ends)
+        prev, nxt = city((starts - 1) % n), city((ends + 1) % n)
+        removal_gains = dist(prev, first) + dist(last, nxt) - dist(prev, nxt)
+
+        # insertion edges (x, y) on both sides of the neighbors of both ends, of shape
+        # (batch_size, n_segments, 3, 2 * k, 2)
+        candidates = torch.cat([neighbors[first], neighbors[last]], dim=-1)
+        candidate_pos = pos.gather(1, candidates.reshape(batch_size, -1)).reshape(
+            candidates.shape
+        )
+        x_pos = torch.stack([candidate_pos, (candidate_pos - 1) % n], dim=-1)
+        x, y = city(x_pos), city((x_pos + 1) % n)
+        segment_starts = starts[..., None, None]
+        allowed = (
+            valid[..., None, None]
+            & ((x_pos < segment_starts) | (x_pos > ends[..., None, None]))
+            & (x_pos != (segment_starts - 1) % n)
+        )
+
+        first, last = first[..., None, None], last[..., None, None]
+        d_xy = dist(x, y)
+        add_keep = dist(x, first) + dist(last, y) - d_xy
+        add_flip = dist(x, last) + dist(first, y) - d_xy
+        gains = removal_gains[..., None, None] - torch.minimum(add_keep, add_flip)
+        gains = gains.masked_fill(~allowed, -float("inf")).reshape(batch_size, -1)
+        best_gains, best = gains.max(dim=1, keepdim=True)
+        improving = best_gains > 1e-9
+        if not improving.any():
+            break
+
+        i = pick(segment_starts, x_pos, best)
+        length = pick(lengths[:, None, None], x_pos, best)
+        j = pick(x_pos, x_pos, best)
+        flip = pick((add_flip < add_keep).long(), x_pos, best).bool()
+
+        # positions of the new tour, taken from the old one. The segment goes after x,
+        # and the cities between the segment and x are shifted by its length.
+        after = j > i
+        new_start = torch.where(after, j - length + 1, j + 1)
+        in_segment = (positions >= new_start) & (positions < new_start + length)
+        offsets = positions - new_start
+        segment_source = torch.where(flip, i + length - 1 - offsets, i + offsets)
+        shifted_back = after & (positions >= i) & (positions < new_start)
+        shifted_forward = (
+            ~after & (positions >= new_start + length) & (positions < i + length)
+        )
+        source = torch.where(
+            in_segment,
+            segment_source,
+            torch.where(
+                shifted_back,
+                positions + length,
+                torch.where(shifted_forward, positions - length, positions),
+            ),
+        )
+        source = torch.where(improving, source, positions)
+        order = order.gather(1, source)
+
+    # rotate the tours back to their first city
+    start = (order == tours[:, :1]).int().argmax(dim=1, keepdim=True)
+    order = order.gather(1, (positions + start) % n)
+    return torch.cat([order, order[:, :1]], dim=1)
+
+
+def _close_tours(tours: torch.Tensor) -> torch.Tensor:
+    """Rotates tours of shape (B, N) to start at city 0 and appends it at the end."""
+    n = tours.shape[1]
+    start = (tours == 0).int().argmax(dim=1, keepdim=True)
+    tours = tours.gather(1, (torch.arange(n, device=tours.device) + start) % n)
+    return torch.cat([tours, tours[:, :1]], dim=1)
+
+
+def batched_nearest_neighbor_tours(
+    dist_mat: torch.Tensor, n_tours: int, n_candidates: int = 3
+) -> torch.Tensor:
+    """
+    Randomized nearest neighbor tours, built all at once. Every tour starts at a random
+    city and goes to one of the n_candidates nearest unvisited cities, chosen uniformly.
+
+    Args:
+        dist_mat: Distance matrix of shape (N, N)
+        n_tours: Number of tours
+        n_candidates: Number of nearest unvisited cities to choose from, 1 for the
+            deterministic nearest neighbor heuristic
+
+    Returns:
+        torch.Tensor of shape (n_tours, N + 1), starting and ending at city 0
+    """
+    n = dist_mat.shape[0]
+    device = dist_mat.device
+    rows = torch.arange(n_tours, device=device)
+    tours = torch.empty((n_tours, n), dtype=torch.int64, device=device)
+    visited = torch.zeros((n_tours, n), dtype=torch.bool, device=device)
+
+    current = torch.randint(n, (n_tours,), device=device)
+    tours[:, 0] = current
+    visited[rows, current] = True
+    for step in range(1, n):
+        dists = dist_mat[current].masked_fill(visited, float("inf"))
+        k = min(n_candidates, n - step)
+        candidates = dists.topk(k, dim=1, largest=False).indices
+        current = candidates[rows, torch.randint(k, (n_tours,), device=device)]
+        tours[:, step] = current
+        visited[rows, current] = True
+
+    return _close_tours(tours)
+
+
+def batched_greedy_edge_tours(
+    points: np.ndarray, n_tours: int, neighbors: np.ndarray, randomness: float = 0.5
+) -> np.ndarray:
+    """
+    Randomized greedy edge tours on the candidate lists. The candidate edges are
+    inserted in increasing order of length / (1 + randomness * U(0, 1)) and the
+    remaining paths are chained by nearest endpoints. The tours are merged in parallel
+    by `cython_merge_batch`. The first tour is the deterministic greedy edge tour.
+
+    Args:
+        points: Points of shape (N, 2)
+        n_tours: Number of tours
+        neighbors: Candidate lists of shape (N, k), see `get_knn_neighbors`
+        randomness: Amount of noise on the scores of the edges
+
+    Returns:
+        np.ndarray of shape (n_tours, N + 1), starting and ending at city 0
+    """
+    n = points.shape[0]
+    src = np.repeat(np.arange(n), neighbors.shape[1])
+    dst = neighbors.reshape(-1)
+    # every undirected candidate edge once, so that its score is not counted twice
+    keys = np.unique(np.minimum(src, dst) * n + np.maximum(src, dst))
+    edge_index = np.stack([keys // n, keys % n])
+
+    scores = 1 + randomness * np.random.rand(n_tours, edge_index.shape[1])
+    scores[0] = 1
+    tours, _ = cython_merge_batch(points, scores, edge_index)
+    return tours
+
+
+def _hilbert_index(x: torch.Tensor, y: torch.Tensor, order: int) -> torch.Tensor:
+    """Index on the Hilbert curve of the cells (x, y) of a 2^order x 2^order grid."""
+    n = 1 << order
+    d = torch.zeros_like(x)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.long()) ^ ry.long())
+        # rotate the quadrant
+        flip = ~ry & rx
+        x = torch.where(flip, n - 1 - x, x)
+        y = torch.where(flip, n - 1 - y, y)
+        x, y = torch.where(ry, x, y), torch.where(ry, y, x)
+        s >>= 1
+    return d
+
+
+def batched_space_filling_curve_tours(
+    points: torch.Tensor, n_tours: int, order: int = 16
+) -> torch.Tensor:
+    """
+    Space filling curve tours: the cities are visited in the order of the Hilbert curve.
+    Every tour but the first uses the curve of the points rotated by a random angle.
+
+    Args:
+        points: Points of shape (N, 2)
+        n_tours: Number of tours
+        order: Order of the Hilbert curve, the points are snapped to a grid of
+            2^order x 2^order cells
+
+    Returns:
+        torch.Tensor of shape (n_tours, N + 1), starting and ending at city 0
+    """
+    device = points.device
+    angles = torch.rand((n_tours, 1), device=device, dtype=torch.float64) * 2 * math.pi
+    angles[0] = 0
+    centered = (points - points.mean(dim=0)).to(torch.float64)
+    x = centered[:, 0] * angles.cos() - centered[:, 1] * angles.sin()
+    y = centered[:, 0] * angles.sin() + centered[:, 1] * angles.cos()
+
+    # square grid on the bounding box of every rotation
+    low_x = x.min(dim=1, keepdim=True).values
+    low_y = y.min(dim=1, keepdim=True).values
+    size = torch.maximum(
+        x.max(dim=1, keepdim=True).values - low_x,
+        y.max(dim=1, keepdim=True).values - low_y,
+    ).clamp_min(1e-12)
+    cells = (1 << order) - 1
+    grid_x = ((x - low_x) / size * cells).round().long()
+    grid_y = ((y - low_y) / size * cells).round().long()
+
+    tours = _hilbert_index(grid_x, grid_y, order).argsort(dim=1)
+    return _close_tours(tours)
+
+
 def build_edge_lists(parent1: torch.Tensor, parent2: torch.Tensor) -> torch.Tensor:
     """
     Build edge lists for a batch of parents. Edge lists are defined as the set of nodes
@@ -121,28 +643,17 @@ def build_edge_lists(parent1: torch.Tensor, parent2: torch.Tensor) -> torch.Tens
     parent1 = parent1[:, :-1]  # shape: (batch_size, n)
     parent2 = parent2[:, :-1]  # shape: (batch_size, n)
 
-    # For each node, we need its neighbors in both parent tours
-    # Roll the tours to get previous and next nodes
-    prev_1 = torch.roll(parent1, shifts=1, dims=1)  # shape: (batch_size, n)
-    next_1 = torch.roll(parent1, shifts=-1, dims=1)  # shape: (batch_size, n)
-    prev_2 = torch.roll(parent2, shifts=1, dims=1)  # shape: (batch_size, n)
-    next_2 = torch.roll(parent2, shifts=-1, dims=1)  # shape: (batch_size, n)
-
-    # Create masks for all nodes at once (batch_size, n, n)
-    node_indices = torch.arange(n, device=parent1.device)
-    mask1 = parent1.unsqueeze(-1) == node_indices
-    mask2 = parent2.unsqueeze(-1) == node_indices
-
-    # Create edge lists (batch_size, n, 4)
-    edge_lists = torch.zeros(
+    # The neighbors of the node parent[b, i] are parent[b, i - 1] and parent[b, i + 1],
+    # they are scattered to the row of the node in O(batch_size * n)
+    edge_lists = torch.empty(
         (batch_size, n, 4), dtype=torch.long, device=parent1.device
     )
-
-    # Gather neighbors for all nodes at once
-    edge_lists[:, :, 0] = (mask1 * prev_1.unsqueeze(-1)).sum(dim=1)
-    edge_lists[:, :, 1] = (mask1 * next_1.unsqueeze(-1)).sum(dim=1)
-    edge_lists[:, :, 2] = (mask2 * prev_2.unsqueeze(-1)).sum(dim=1)
-    edge_lists[:, :, 3] = (mask2 * next_2.unsqueeze(-1)).sum(dim=1)
+    for slot, (parent, shift) in enumerate(
+        [(parent1, 1), (parent1, -1), (parent2, 1), (parent2, -1)]
+    ):
+        edge_lists[:, :, slot].scatter_(
+            1, parent.long(), torch.roll(parent, shifts=shift, dims=1).long()
+        )
 
     # Sort in the dimension of the last axis
     return edge_lists.sort(dim=-1).values
@@ -165,13 +676,11 @@ def select_from_edge_lists(
     """
     batch_size = edge_lists.size(0)
 
-    edge_lists_copy = edge_lists.clone()
-
     # candidates is a tensor of size (batch_size, 4)
-    candidates = edge_lists_copy[torch.arange(batch_size), current_node, :]
+    candidates = edge_lists[torch.arange(batch_size), current_node, :]
 
-    # edge_lists_candidates is a tensor of size (batch_size, 4, 4)
-    edge_lists_candidates = edge_lists_copy[
+    # edge_lists_candidates is a tensor of size (batch_size, 4, 4), a copy
+    edge_lists_candidates = edge_lists[
         torch.arange(batch_size).unsqueeze(-1).expand(-1, 4), candidates, :
     ]
 
@@ -244,7 +753,11 @@ def edge_recombination_crossover(
     parent1: torch.Tensor, parent2: torch.Tensor
 ) -> torch.Tensor:
     """
-    Perform edge recombination crossover (ERC) for a batch of parents in a vectorized manner.
+    Perform edge recombination crossover (ERC) for a batch of parents in a vectorized
+    manner. Same selection as `select_from_edge_lists`, but the number of distinct
+    unvisited neighbors of every node is kept in a (batch_size, n) table, updated in
+    place when a node is visited. A step is then O(batch_size) and the crossover
+    O(batch_size * n) in time and memory.
 
     Note: we assume that all edges are valid, i.e., a dense graph is provided
 
@@ -258,27 +771,223 @@ def edge_recombination_crossover(
     batch_size = parent1.size(0)
     n = parent1.size(1) - 1  # Number of cities excluding the return to start
     device = parent1.device
+    rows = torch.arange(batch_size, device=device)
 
     # Initialize tensors
     offspring = torch.zeros((batch_size, n + 1), dtype=torch.long, device=device)
     visited = torch.zeros((batch_size, n), dtype=torch.bool, device=device)
 
-    # Build edge lists
+    # Build edge lists, sorted, and mark the first occurrence of every neighbor
     edge_lists = build_edge_lists(parent1, parent2)
     assert edge_lists.shape == (batch_size, n, 4)
+    distinct = torch.ones_like(edge_lists, dtype=torch.bool)
+    distinct[:, :, 1:] = edge_lists[:, :, 1:] != edge_lists[:, :, :-1]
+    unvisited_counts = distinct.sum(dim=-1)
+    # first unvisited node, for the rows whose candidates are all visited
+    first_unvisited = torch.zeros((batch_size,), dtype=torch.long, device=device)
+
+    def visit(nodes: torch.Tensor) -> None:
+        visited[rows, nodes] = True
+        # nodes is a distinct unvisited neighbor of each of its distinct neighbors
+        unvisited_counts.scatter_add_(
+            1, edge_lists[rows, nodes], -distinct[rows, nodes].long()
+        )
 
-    current_nodes = torch.zeros((batch_size,), dtype=torch.int, device=device)
-    visited[torch.arange(batch_size), current_nodes] = True
+    current_nodes = torch.zeros((batch_size,), dtype=torch.long, device=device)
+    visit(current_nodes)
     offspring[:, 0] = current_nodes
 
     # Generate tours
     for step in range(1, n):
-        current_nodes = select_from_edge_lists(edge_lists, visited, current_nodes)
+        candidates = edge_lists[rows, current_nodes]  # shape: (batch_size, 4)
+        visited_candidates = visited.gather(1, candidates)
+
+        # we set inf = 10 for the counts of the visited candidates, feasible max is 4
+        candidate_counts = unvisited_counts.gather(1, candidates).masked_fill(
+            visited_candidates, 10
+        )
+        min_count = candidate_counts.min(dim=1, keepdim=True).values
+        real_candidates_mask = (candidate_counts == min_count) & ~visited_candidates
+        to_draw_randomly = ~real_candidates_mask.any(dim=1)
+        real_candidates_mask[to_draw_randomly] = True
+
+        idx = torch.multinomial(real_candidates_mask.float(), num_samples=1)
+        current_nodes = candidates.gather(1, idx).squeeze(1)
+
+        # select the first unvisited node if all candidates are visited
+        if to_draw_randomly.any():
+            while True:
+                behind = visited[rows, first_unvisited]
+                if not behind.any():
+                    break
+                first_unvisited += behind.long()
+            current_nodes = torch.where(
+                to_draw_randomly, first_unvisited, current_nodes
+            )
 
-        # Update visitation and current nodes
-        visited[torch.arange(batch_size), current_nodes] = True
-        offspring[torch.arange(batch_size), step] = current_nodes
+        visit(current_nodes)
+        offspring[:, step] = current_nodes
 
     # Complete tours by returning to the start node
     offspring[:, -1] = offspring[:, 0]
     return offspring
+
+
+def order_crossover(parent1: torch.Tensor, parent2: torch.Tensor) -> torch.Tensor:
+    """
+    Order crossover (OX1) for a batch of parents, with a constant number of tensor ops.
+    The child keeps a random segment of parent1 in place, and the other cities follow in
+    the order of parent2, starting after the end of the segment.
+
+    Args:
+        parent1: Tensor of size (batch_size, n + 1), first parent tours.
+        parent2: Tensor of size (batch_size, n + 1), second parent tours.
+
+    Returns:
+        offspring: Tensor of size (batch_size, n + 1), starting and ending at city 0.
+    """
+    batch_size = parent1.size(0)
+    n = parent1.size(1) - 1
+    device = parent1.device
+    positions = torch.arange(n, device=device)
+
+    # random segment [start, end) of length in [1, n - 1], possibly wrapping around. The
+    # tours are rotated to start at end, so the segment takes the last length positions.
+    start = torch.randint(n, (batch_size, 1), device=device)
+    length = torch.randint(1, max(n, 2), (batch_size, 1), device=device)
+    rotation = (start + length + positions) % n
+    parent1 = parent1[:, :-1].long().gather(1, rotation)
+    parent2 = parent2[:, :-1].long().gather(1, rotation)
+    in_segment = positions >= n - length
+
+    # cities of parent2 out of the segment, moved to the front by a stable sort
+    segment_cities = torch.zeros((batch_size, n), dtype=torch.bool, device=device)
+    segment_cities.scatter_(1, parent1, in_segment)
+    from_parent2 = segment_cities.gather(1, parent2).int().sort(dim=1, stable=True)
+    offspring = torch.where(
+        in_segment, parent1, parent2.gather(1, from_parent2.indices)
+    )
+    return _close_tours(offspring)
+
+
+def _tour_neighbors(tours: torch.Tensor) -> torch.Tensor:
+    """(batch_size, n, 2) previous and next cities of the tours (batch_size, n)."""
+    neighbors = torch.empty((*tours.shape, 2), dtype=torch.long, device=tours.device)
+    neighbors[:, :, 0].scatter_(1, tours, torch.roll(tours, shifts=1, dims=1))
+    neighbors[:, :, 1].scatter_(1, tours, torch.roll(tours, shifts=-1, dims=1))
+    return neighbors
+
+
+def _cycle_min(successors: torch.Tensor) -> torch.Tensor:
+    """Smallest element of the cycle of every element of the permutations (B, m)."""
+    m = successors.size(1)
+    labels = torch.arange(m, device=successors.device).expand_as(successors)
+    # pointer doubling, after k rounds labels covers the next 2^k elements
+    for _ in range(math.ceil(math.log2(max(m, 2)))):
+        labels = torch.minimum(labels, labels.gather(1, successors))
+        successors = successors.gather(1, successors)
+    return labels
+
+
+def _distance_to_tail(successors: torch.Tensor, tails: torch.Tensor) -> torch.Tensor:
+    """Number of steps from every element to the tail of its list (pointer doubling)."""
+    m = successors.size(1)
+    successors = torch.where(
+        tails, torch.arange(m, device=successors.device), successors
+    )
+    distances = (~tails).long()
+    for _ in range(math.ceil(math.log2(max(m, 2)))):
+        distances = distances + distances.gather(1, successors)
+        successors = successors.gather(1, successors)
+    return distances
+
+
+def eax_crossover(parent1: torch.Tensor, parent2: torch.Tensor) -> torch.Tensor:
+    """
+    Simplified edge assembly crossover (EAX) for a batch of parents, in O(log n) ops.
+
+    The edges of the parents A = parent1 and B = parent2 that are not shared form
+    AB-cycles, which alternate edges of A and B. The A-edges and B-edges of every city
+    are paired randomly, which defines the AB-cycles as cycles of a permutation of the
+    A-edges. One random AB-cycle is applied to A: its A-edges are replaced by its
+    B-edges, which gives a set of subtours. The subtours are joined in the order of
+    their first city in A.
+
+    Args:
+        parent1: Tensor of size (batch_size, n + 1), first parent tours.
+        parent2: Tensor of size (batch_size, n + 1), second parent tours.
+
+    Returns:
+        offspring: Tensor of size (batch_size, n + 1), starting and ending at city 0.
+    """
+    batch_size = parent1.size(0)
+    n = parent1.size(1) - 1
+    device = parent1.device
+    tours_a = parent1[:, :-1].long()
+    neighbors_a = _tour_neighbors(tours_a)
+    neighbors_b = _tour_neighbors(parent2[:, :-1].long())
+
+    # edges of one parent only, every city has as many of A as of B (0, 1 or 2)
+    only_a = (neighbors_a.unsqueeze(-1) != neighbors_b.unsqueeze(-2)).all(dim=-1)
+    only_b = (neighbors_b.unsqueeze(-1) != neighbors_a.unsqueeze(-2)).all(dim=-1)
+    two_edges = only_a.sum(dim=-1) == 2
+
+    # B-edge paired with every A-edge of a city, randomly if it has two of each
+    first_b = torch.where(only_b[..., 0], neighbors_b[..., 0], neighbors_b[..., 1])
+    second_b = neighbors_b[..., 1]
+    swap = torch.rand((batch_size, n), device=device) < 0.5
+    partners = torch.stack(
+        [
+            torch.where(two_edges & swap, second_b, first_b),
+            torch.where(two_edges & ~swap, second_b, first_b),
+        ],
+        dim=-1,
+    )
+
+    # the arc 2 * v + s goes from v to its neighbor in slot s
+    neighbors_a = neighbors_a.reshape(batch_size, 2 * n)
+    partners = partners.reshape(batch_size, 2 * n)
+    only_a = only_a.reshape(batch_size, 2 * n)
+    arcs = torch.arange(2 * n, device=device).expand(batch_size, -1)
+    tails = arcs // 2
+
+    # AB-cycles: from the A-arc v -> u, take the B-edge u -> w paired with (u, v), then
+    # the A-edge of w paired with (w, u)
+    heads = neighbors_a
+    reverse_arcs = 2 * heads + (neighbors_a.gather(1, 2 * heads) != tails).long()
+    b_heads = partners.gather(1, reverse_arcs)
+    next_slots = (
+        (partners.gather(1, 2 * b_heads) != heads) | ~only_a.gather(1, 2 * b_heads)
+    ).long()
+    successors = torch.where(only_a, 2 * b_heads + next_slots, arcs)
+    labels = _cycle_min(successors)
+    # an AB-cycle is traversed in both directions
+    cycles = torch.minimum(labels, labels.gather(1, reverse_arcs))
+
+    # apply one random AB-cycle to A, if the parents differ
+    priorities = torch.rand((batch_size, 2 * n), device=device).gather(1, cycles)
+    priorities = priorities.masked_fill(~only_a, -1)
+    chosen = cycles.gather(1, priorities.argmax(dim=1, keepdim=True))
+    selected = only_a & (cycles == chosen)
+    neighbors = torch.where(selected, partners, neighbors_a)
+
+    # subtours of the child: from the arc v -> u, leave u by its other edge
+    heads = neighbors
+    successors = 2 * heads + (neighbors.gather(1, 2 * heads) == tails).long()
+    labels = _cycle_min(successors)
+    # every subtour is traversed in both directions, keep the one of its smallest arc
+    subtours = torch.minimum(labels[:, 0::2], labels[:, 1::2])
+    slots = (labels[:, 1::2] == subtours).long()
+    distances = _distance_to_tail(successors, successors == labels)
+    distances = distances.gather(1, 2 * torch.arange(n, device=device) + slots)
+
+    # subtours in the order of their first city in A, each one from its smallest arc
+    # a new tensor, tours_a may be a read-only view of the population values
+    positions_a = torch.empty(tours_a.shape, dtype=torch.long, device=device).scatter_(
+        1, tours_a, torch.arange(n, device=device).expand(batch_size, -1)
+    )
+    subtour_positions = torch.full(
+        (batch_size, 2 * n), n, dtype=torch.long, device=device
+    ).scatter_reduce(1, subtours, positions_a, reduce="amin")
+    keys = subtour_positions.gather(1, subtours) * n + (n - 1 - distances)
+    return _close_tours(keys.argsort(dim=1))
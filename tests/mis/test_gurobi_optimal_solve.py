@@ -1,11 +1,15 @@
 import numpy as np
 import pytest
+import scipy.sparse as sp
 import torch
 from problems.mis.mis_instance import MISInstance
 from problems.mis.solve_optimal_recombination import (
     LocalBranching,
+    get_base_model,
     get_lil_csr_matrix,
+    get_upper_triangular_edges,
     maximum_weighted_independent_set,
+    solve_local_branching_mis,
     solve_wmis,
 )
 
@@ -26,6 +30,49 @@ def test_gurobi_optimal_solve() -> None:
     assert mwis_result["children_obj"] >= max(len(solution_1), len(solution_2))
 
 
+def test_upper_triangular_edges() -> None:
+    instance, _ = read_mis_instance()
+    rows, cols = get_upper_triangular_edges(instance.adj_matrix_np)
+
+    expected = sp.triu(instance.adj_matrix_np, k=1).tocoo()
+    expected_edges = sorted(zip(expected.row.tolist(), expected.col.tolist()))
+    assert sorted(zip(rows.tolist(), cols.tolist())) == expected_edges
+
+    # duplicated entries, lower triangle entries and self-loops are dropped
+    adj_matrix = sp.coo_matrix(
+        (np.ones(5), ([0, 1, 1, 2, 2], [1, 0, 0, 2, 0])), shape=(3, 3)
+    )
+    rows, cols = get_upper_triangular_edges(adj_matrix)
+    assert rows.tolist() == [0, 0]
+    assert cols.tolist() == [1, 2]
+
+
+def test_local_branching_reuses_base_model() -> None:
+    instance, _ = read_mis_instance()
+    base_model = get_base_model(instance)
+    n_constrs = base_model.model.NumConstrs
+
+    for _ in range(2):
+        ind = torch.rand(2, instance.n_nodes)
+        sols = instance.get_feasible_from_individual_batch(ind)
+        solution_1 = sols[0].numpy().nonzero()[0]
+        solution_2 = sols[1].numpy().nonzero()[0]
+
+        result = solve_local_branching_mis(
+            instance, solution_1, solution_2, time_limit=1, k_factor=1.5
+        )
+        assert get_base_model(instance) is base_model
+        # only the local branching row is added on top of the edge constraints
+        assert base_model.model.NumConstrs == n_constrs + 1
+
+        k = int(1.5 * hamming_distance(solution_1, solution_2, instance.n_nodes))
+        hamming_dist_1 = hamming_distance(result.children, solution_1, instance.n_nodes)
+        hamming_dist_2 = hamming_distance(result.children, solution_2, instance.n_nodes)
+        assert hamming_dist_1 + hamming_dist_2 <= k
+        assert is_independent_set(instance, result.children)
+        assert result.children_obj >= max(len(solution_1), len(solution_2))
+
+
 # Tests for direct use of maximum_weighted_independent_set
 @pytest.mark.parametrize(
     "param_type",
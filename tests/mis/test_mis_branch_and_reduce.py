@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pytest
+import torch
+from problems.mis.mis_branch_and_reduce import (
+    BranchAndReduceSolver,
+    solve_branch_and_reduce_mis,
+)
+from problems.mis.mis_ga import MISGACrossverOptimal, create_mis_ga
+
+from tests.mis.test_mis_ea import common_config, read_mis_instance
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def brute_force_mis_size(neighbors: list[int]) -> int:
+    n = len(neighbors)
+    best = 0
+    for mask in range(1 << n):
+        if all(not (mask >> v) & 1 or not neighbors[v] & mask for v in range(n)):
+            best = max(best, bin(mask).count("1"))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_branch_and_reduce_solver_is_exact(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 13))
+    neighbors = [0] * n
+    for i, j in itertools.combinations(range(n), 2):
+        if rng.random() < rng.random():
+            neighbors[i] |= 1 << j
+            neighbors[j] |= 1 << i
+
+    mis = BranchAndReduceSolver(neighbors).solve()
+    assert all(not neighbors[v] & mis for v in range(n) if (mis >> v) & 1)
+    assert bin(mis).count("1") == brute_force_mis_size(neighbors)
+
+
+def test_solve_branch_and_reduce_mis() -> None:
+    instance, _ = read_mis_instance()
+    sols = instance.get_feasible_from_individual_batch(torch.rand(2, instance.n_nodes))
+    solution_1, solution_2 = sols[0].numpy().nonzero()[0], sols[1].numpy().nonzero()[0]
+
+    result = solve_branch_and_reduce_mis(instance, solution_1, solution_2, time_limit=5)
+
+    children = torch.tensor(result.children_np_labels, dtype=torch.bool)
+    src, dst = instance.edge_index
+    assert not (children[src] & children[dst]).any()
+    assert result.children_obj == children.sum().item()
+    assert result.children_obj >= max(len(solution_1), len(solution_2))
+    # the common nodes are kept and only nodes of the parents are selected
+    assert set(np.intersect1d(solution_1, solution_2)) <= set(result.children)
+    assert set(result.children) <= set(np.union1d(solution_1, solution_2))
+
+
+def test_mis_ga_branch_and_reduce_recombination(tmp_path: Path) -> None:
+    instance, sample = read_mis_instance()
+    config = common_config.update(pop_size=8, recombination="branch_and_reduce")
+    ga = create_mis_ga(instance, config=config, sample=sample, tmp_dir=tmp_path)
+    crossover = ga._operators[0]
+    assert isinstance(crossover, MISGACrossverOptimal)
+
+    n_pairings = config.pop_size // 2
+    parents = ga.population.values
+    parents_1, parents_2 = parents[:n_pairings], parents[n_pairings:]
+    children = crossover._do_cross_over_optimal(parents_1, parents_2).values
+
+    best_parent = torch.maximum(parents_1.sum(dim=-1), parents_2.sum(dim=-1))
+    assert (children[:n_pairings].sum(dim=-1) >= best_parent).all()
+    src, dst = instance.edge_index
+    assert not (children[:, src] & children[:, dst]).any()
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import os
+import pickle
+import time
 from typing import TYPE_CHECKING
 from unittest.mock import patch
 
@@ -16,11 +18,16 @@ from evotorch.operators import CrossOver
 from problems.mis.mis_dataset import MISDataset
 from problems.mis.mis_ga import (
     MISGACrossover,
+    MISGACrossverOptimal,
+    MISGALocalSearch,
     MISGAMutation,
     MISGaProblem,
     create_mis_ga,
+    get_unique_indices,
+    get_unique_indices_pairwise,
 )
 from problems.mis.mis_instance import MISInstance, MISInstanceBase, create_mis_instance
+from problems.mis.mis_packed import pack_solutions
 from scipy.sparse import csr_matrix
 from torch_geometric.loader import DataLoader
 
@@ -74,6 +81,32 @@ def test_create_mis_instance() -> None:
     assert isinstance(instance.degrees, torch.Tensor)
 
 
+def test_mis_instance_share_memory() -> None:
+    instance, _ = read_mis_instance()
+    priorities = torch.rand(4, instance.n_nodes)
+    expected = instance.get_feasible_from_individual_batch(priorities)
+
+    instance.share_memory_()
+    assert instance.crow.is_shared()
+    assert instance.col.is_shared()
+    assert all(t.is_shared() for t in instance._adj_tensors)
+
+    copied = pickle.loads(pickle.dumps(instance))
+    assert (copied.adj_matrix_np != instance.adj_matrix_np).nnz == 0
+    assert torch.equal(copied.get_feasible_from_individual_batch(priorities), expected)
+
+
+def test_mis_instance_get_sample() -> None:
+    instance, sample = read_mis_instance()
+    rebuilt = instance.get_sample((sample[0],))
+    assert torch.equal(rebuilt[0], sample[0])
+
+    copied = create_mis_instance(rebuilt, device="cpu")
+    assert copied.n_nodes == instance.n_nodes
+    assert torch.equal(copied.edge_index, instance.edge_index)
+    assert copied.get_gt_cost() == instance.get_gt_cost()
+
+
 def test_mis_problem_evaluation() -> None:
     instance, _ = read_mis_instance()
     config = common_config.update(
@@ -111,6 +144,24 @@ def test_mis_degrees(square_instance: MISInstance) -> None:
     assert torch.equal(degrees, instance.degrees)
 
 
+def test_mis_get_feasible_from_partial_batch(square_instance: MISInstance) -> None:
+    instance = square_instance
+    priorities = torch.tensor([[0.9, 0.1, 0.8, 0.3], [0.9, 0.1, 0.8, 0.3]])
+    forced_in = torch.tensor([[0, 1, 0, 0], [0, 0, 0, 0]], dtype=torch.bool)
+    forced_out = torch.tensor([[0, 0, 0, 0], [1, 0, 0, 0]], dtype=torch.bool)
+
+    solutions = instance.get_feasible_from_partial_batch(
+        priorities, forced_in=forced_in, forced_out=forced_out
+    )
+    assert torch.equal(solutions[0], torch.tensor([False, True, False, True]))
+    assert torch.equal(solutions[1], torch.tensor([False, False, True, False]))
+
+    with pytest.raises(ValueError, match="does not support forced nodes"):
+        instance.get_feasible_from_partial_batch(
+            priorities, forced_in=forced_in, decoder="sequential"
+        )
+
+
 def assert_valid_initialized_population(
     values: torch.Tensor, instance: MISInstanceBase
 ) -> None:
@@ -350,6 +401,36 @@ def test_mis_save_optimal_recombination_results(
         assert len(results) == config.pop_size // 2
 
 
+def test_mis_ga_optimal_recombination_parallel(tmp_path: Path) -> None:
+    instance, sample = read_mis_instance()
+    config = common_config.update(
+        pop_size=8,
+        recombination="optimal",
+        opt_recomb_time_limit=5,
+        opt_recomb_workers=2,
+        opt_recomb_threads=2,
+    )
+    ga = create_mis_ga(instance, config=config, sample=sample, tmp_dir=tmp_path)
+    crossover = ga._operators[0]
+    assert isinstance(crossover, MISGACrossverOptimal)
+
+    n_pairings = config.pop_size // 2
+    parents = ga.population.values
+    parents_1, parents_2 = parents[:n_pairings], parents[n_pairings:]
+    with crossover:
+        children = crossover._do_cross_over_optimal(parents_1, parents_2).values
+    assert crossover._pool is None
+
+    # children are reassembled in the order of the pairings
+    best_parent = torch.maximum(parents_1.sum(dim=-1), parents_2.sum(dim=-1))
+    assert (children[:n_pairings].sum(dim=-1) >= best_parent).all()
+    src, dst = instance.edge_index
+    assert not (children[:, src] & children[:, dst]).any()
+
+    results = ga.get_recombination_saved_results()
+    assert len(results) == n_pairings
+
+
 def test_mis_ga_mutation(square_instance: MISInstanceBase) -> None:
     instance = square_instance
     config = common_config.update(
@@ -453,6 +534,36 @@ def test_mis_ga_mutation_preserve_optimal_recombination() -> None:
     assert (ga.population.values[n_pairs:].sum(dim=-1) > 0).all()
 
 
+def test_mis_local_search_star() -> None:
+    # star with center 0 and leaves 1, 2, 3
+    instance = MISInstance(
+        n_nodes=4,
+        edge_index=torch.tensor([[0, 1, 0, 2, 0, 3], [1, 0, 2, 0, 3, 0]]),
+    )
+    solutions = torch.tensor([[1, 0, 0, 0], [0, 1, 1, 1]], dtype=torch.bool)
+
+    improved = instance.local_search(solutions, max_iterations=1)
+    assert torch.equal(improved[0], torch.tensor([False, True, True, True]))
+    assert torch.equal(improved[1], solutions[1])
+
+
+def test_mis_ga_local_search() -> None:
+    instance, sample = read_mis_instance()
+    config = common_config.update(pop_size=8, max_local_search_it=5)
+    ga = create_mis_ga(instance, config=config, sample=sample)
+
+    local_search = ga._operators[2]
+    assert isinstance(local_search, MISGALocalSearch)
+
+    children = local_search._do(ga.population).values
+    assert children.shape == ga.population.values.shape
+    assert (children.sum(dim=-1) >= ga.population.values.sum(dim=-1)).all()
+
+    # children are independent sets
+    src, dst = instance.edge_index
+    assert not (children[:, src] & children[:, dst]).any()
+
+
 def test_duplicate_batch() -> None:
     # Create a mock configuration
     config = Config(pop_size=10)
@@ -496,3 +607,39 @@ def test_temp_saver(tmp_path: Path) -> None:
     with open(os.path.join(tmp_path, "population.txt")) as f:
         last_line = f.readlines()[-1]
         assert last_line.strip() == sol_str
+
+
+def test_get_unique_indices() -> None:
+    population = torch.rand(50, 100) < 0.5
+    population[10] = population[3]
+    population[20] = population[3]
+    population[40] = population[0]
+
+    expected = get_unique_indices_pairwise(population)
+    assert expected.shape[0] == 47
+    assert torch.equal(get_unique_indices(population), expected)
+    assert torch.equal(get_unique_indices(pack_solutions(population)), expected)
+
+    # with colliding hashes, the result is still exact
+    with patch(
+        "problems.mis.mis_ga.hash_packed_rows", return_value=torch.zeros(50).long()
+    ):
+        assert torch.equal(get_unique_indices(population), expected)
+
+
+def test_get_unique_indices_benchmark() -> None:
+    # population of 1000 with many duplicates, as in the best_unique selection
+    population = (torch.rand(250, 2000) < 0.1).repeat(4, 1)
+
+    start_time = time.time()
+    pairwise = get_unique_indices_pairwise(population)
+    end_time = time.time()
+    print(f"Pairwise unique indices time: {end_time - start_time} seconds")
+
+    start_time = time.time()
+    hashed = get_unique_indices(population)
+    end_time = time.time()
+    print(f"Hash-based unique indices time: {end_time - start_time} seconds")
+
+    assert torch.equal(pairwise, hashed)
+    assert torch.equal(hashed, torch.arange(250))
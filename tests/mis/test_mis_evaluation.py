@@ -1,14 +1,24 @@
+import time
+
 import numpy as np
 import pytest
 import scipy.sparse as sp
 import torch
 from problems.mis.mis_evaluation import (
+    is_cython_decode_available,
+    mis_decode_cython_batched,
     mis_decode_np,
+    mis_decode_np_batched,
     mis_decode_torch,
     mis_decode_torch_batched,
+    mis_decode_torch_rounds,
+    mis_partial_state,
+    precompute_neighbors_csr,
     precompute_neighbors_padded,
 )
 
+from tests.mis.test_mis_ea import read_mis_instance
+
 
 @pytest.fixture
 def adj_matrix() -> sp.csr_matrix:
@@ -79,3 +89,203 @@ def test_mis_decoding_torch_batched_on_single_tensor(
     result = mis_decode_torch_batched(predictions, neighbors_padded, degrees)
     assert result.shape == (4,)
     assert (result == torch.tensor([1, 0, 1, 0])).all()
+
+
+def random_graph_csr(n: int, p: float, seed: int) -> torch.Tensor:
+    """Random Erdos-Renyi graph as a symmetric torch sparse CSR adjacency matrix."""
+    generator = torch.Generator().manual_seed(seed)
+    upper = torch.triu(torch.rand(n, n, generator=generator) < p, diagonal=1)
+    return (upper | upper.T).float().to_sparse_csr()
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(("n", "p"), [(1, 0.0), (10, 0.0), (30, 0.3), (100, 0.05)])
+def test_mis_decoding_torch_rounds_equals_batched(n: int, p: float, seed: int) -> None:
+    adj_csr = random_graph_csr(n, p, seed)
+    neighbors_padded, degrees = precompute_neighbors_padded(adj_csr)
+    predictions = torch.rand(8, n, generator=torch.Generator().manual_seed(seed))
+
+    expected = mis_decode_torch_batched(predictions, neighbors_padded, degrees)
+    result = mis_decode_torch_rounds(
+        predictions, adj_csr.crow_indices(), adj_csr.col_indices()
+    )
+    assert torch.equal(result, expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mis_decoding_torch_rounds_with_ties(seed: int) -> None:
+    adj_csr = random_graph_csr(50, 0.1, seed)
+    neighbors_padded, degrees = precompute_neighbors_padded(adj_csr)
+    # integer priorities produce many ties
+    predictions = torch.randint(
+        0, 3, (8, 50), generator=torch.Generator().manual_seed(seed)
+    ).float()
+
+    expected = mis_decode_torch_batched(predictions, neighbors_padded, degrees)
+    result = mis_decode_torch_rounds(
+        predictions, adj_csr.crow_indices(), adj_csr.col_indices()
+    )
+    assert torch.equal(result, expected)
+
+
+def test_mis_decoding_torch_rounds_on_single_tensor(
+    adj_matrix_torch: torch.FloatTensor,
+) -> None:
+    predictions = torch.tensor([0.9, 0.1, 0.8, 0.3], dtype=torch.float32)
+    adj_csr = adj_matrix_torch.to_sparse_csr()
+    result = mis_decode_torch_rounds(
+        predictions, adj_csr.crow_indices(), adj_csr.col_indices()
+    )
+    assert result.shape == (4,)
+    assert (result == torch.tensor([1, 0, 1, 0])).all()
+
+
+def test_mis_decoding_torch_rounds_on_instance() -> None:
+    instance, _ = read_mis_instance()
+    predictions = torch.rand(16, instance.n_nodes)
+
+    sequential = instance.get_feasible_from_individual_batch(
+        predictions, decoder="sequential"
+    )
+    rounds = instance.get_feasible_from_individual_batch(predictions, decoder="rounds")
+    assert torch.equal(sequential, rounds)
+
+    with pytest.raises(ValueError, match="Invalid decoder"):
+        instance.get_feasible_from_individual_batch(predictions, decoder="invalid")
+
+
+def test_mis_decoding_torch_rounds_benchmark() -> None:
+    instance, _ = read_mis_instance()
+    predictions = torch.rand(100, instance.n_nodes)
+
+    # benchmark sequential decoder
+    start_time = time.time()
+    sequential = mis_decode_torch_batched(
+        predictions, instance.neighbors_padded, instance.degrees
+    )
+    end_time = time.time()
+    print(f"Sequential decoding time: {end_time - start_time} seconds")
+
+    # benchmark round-parallel decoder
+    start_time = time.time()
+    rounds = mis_decode_torch_rounds(predictions, instance.crow, instance.col)
+    end_time = time.time()
+    print(f"Round-parallel decoding time: {end_time - start_time} seconds")
+
+    assert torch.equal(sequential, rounds)
+
+
+def test_precompute_neighbors_csr(adj_matrix_torch: torch.FloatTensor) -> None:
+    edge_index = adj_matrix_torch.coalesce().indices()
+    # shuffle and duplicate the edges, the result must be the same
+    perm = torch.randperm(edge_index.shape[1])
+    edge_index = torch.cat([edge_index[:, perm], edge_index], dim=1)
+
+    crow, col = precompute_neighbors_csr(edge_index, 4)
+
+    adj_csr = adj_matrix_torch.to_sparse_csr()
+    assert torch.equal(crow, adj_csr.crow_indices())
+    assert torch.equal(col, adj_csr.col_indices())
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_precompute_neighbors_padded_matches_csr(seed: int) -> None:
+    adj_csr = random_graph_csr(40, 0.2, seed)
+    neighbors_padded, degrees = precompute_neighbors_padded(adj_csr)
+
+    crow, col = adj_csr.crow_indices(), adj_csr.col_indices()
+    assert neighbors_padded.shape == (40, degrees.max().item())
+    for node in range(40):
+        neighbors = neighbors_padded[node]
+        assert torch.equal(neighbors[neighbors != -1], col[crow[node] : crow[node + 1]])
+        assert (neighbors == -1).sum() == degrees.max() - degrees[node]
+
+
+CYTHON_SKIP_REASON = "cython_mis_decode not compiled, skipping test that requires it"
+
+
+@pytest.mark.skipif(not is_cython_decode_available(), reason=CYTHON_SKIP_REASON)
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(("n", "p"), [(1, 0.0), (30, 0.3), (100, 0.05)])
+def test_mis_decoding_cython_equals_batched(n: int, p: float, seed: int) -> None:
+    adj_csr = random_graph_csr(n, p, seed)
+    neighbors_padded, degrees = precompute_neighbors_padded(adj_csr)
+    predictions = torch.rand(8, n, generator=torch.Generator().manual_seed(seed))
+
+    expected = mis_decode_torch_batched(predictions, neighbors_padded, degrees)
+    result = mis_decode_cython_batched(
+        predictions, adj_csr.crow_indices(), adj_csr.col_indices(), num_threads=2
+    )
+    assert torch.equal(result, expected)
+
+
+@pytest.mark.skipif(not is_cython_decode_available(), reason=CYTHON_SKIP_REASON)
+def test_mis_decoding_cython_on_instance() -> None:
+    instance, _ = read_mis_instance()
+    predictions = torch.rand(16, instance.n_nodes)
+
+    rounds = instance.get_feasible_from_individual_batch(predictions, decoder="rounds")
+    cython = instance.get_feasible_from_individual_batch(predictions, decoder="cython")
+    auto = instance.get_feasible_from_individual_batch(predictions)
+    assert torch.equal(rounds, cython)
+    assert torch.equal(rounds, auto)
+
+
+def test_mis_decoding_numpy_batched(adj_matrix: sp.csr_matrix) -> None:
+    predictions = np.random.rand(8, 4)
+
+    result = mis_decode_np_batched(predictions, adj_matrix)
+
+    assert result.shape == (8, 4)
+    for i in range(8):
+        assert np.array_equal(result[i], mis_decode_np(predictions[i], adj_matrix))
+
+
+def test_mis_partial_state(adj_matrix_torch: torch.FloatTensor) -> None:
+    adj_csr = adj_matrix_torch.to_sparse_csr()
+    forced_in = torch.tensor([[1, 0, 0, 0], [0, 0, 0, 0]], dtype=torch.bool)
+    forced_out = torch.tensor([[0, 0, 0, 0], [0, 1, 0, 0]], dtype=torch.bool)
+
+    selected, undecided = mis_partial_state(
+        (2, 4), adj_csr.crow_indices(), adj_csr.col_indices(), forced_in, forced_out
+    )
+
+    assert torch.equal(selected, forced_in)
+    # node 0 and its neighbor 1 are decided, node 1 is forced out but 0 and 2 stay free
+    assert torch.equal(
+        undecided, torch.tensor([[0, 0, 1, 1], [1, 0, 1, 1]], dtype=torch.bool)
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mis_decoding_torch_rounds_warm_start(seed: int) -> None:
+    """Forcing nodes is the same as giving them the highest (or lowest) priority."""
+    n = 60
+    adj_csr = random_graph_csr(n, 0.1, seed)
+    crow, col = adj_csr.crow_indices(), adj_csr.col_indices()
+    generator = torch.Generator().manual_seed(seed)
+
+    # forced_in nodes are an independent set taken from a feasible solution
+    parents = mis_decode_torch_rounds(torch.rand(8, n, generator=generator), crow, col)
+    forced_in = parents & (torch.rand(8, n, generator=generator) < 0.5)
+    predictions = torch.rand(8, n, generator=generator)
+
+    result = mis_decode_torch_rounds(predictions, crow, col, forced_in=forced_in)
+    expected = mis_decode_torch_rounds(
+        torch.where(forced_in, 2.0, predictions), crow, col
+    )
+    assert torch.equal(result, expected)
+    assert (result[forced_in]).all()
+
+    forced_out = ~parents & (torch.rand(8, n, generator=generator) < 0.5)
+    result = mis_decode_torch_rounds(predictions, crow, col, forced_out=forced_out)
+    assert not (result & forced_out).any()
+
+    if is_cython_decode_available():
+        cython = mis_decode_cython_batched(
+            predictions, crow, col, forced_in=forced_in, forced_out=forced_out
+        )
+        rounds = mis_decode_torch_rounds(
+            predictions, crow, col, forced_in=forced_in, forced_out=forced_out
+        )
+        assert torch.equal(cython, rounds)
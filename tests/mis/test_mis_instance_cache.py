@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+import torch
+from problems.mis.mis_instance import MISInstance, create_mis_instance
+from problems.mis.mis_instance_cache import MISInstanceCache
+
+from tests.mis.test_mis_ea import read_mis_instance
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_mis_instance_cache_hit(tmp_path: Path) -> None:
+    instance, sample = read_mis_instance()
+    cache = MISInstanceCache(tmp_path)
+
+    # first call is a miss and stores the entry
+    instance_miss = create_mis_instance(sample, device="cpu", cache=cache)
+    key = cache.get_key(instance.edge_index, instance.n_nodes)
+    assert (tmp_path / key).is_dir()
+
+    # second call is loaded memory-mapped from the cache
+    arrays = cache.load(key, MISInstance.CACHE_ARRAY_NAMES)
+    assert isinstance(arrays["crow"], np.memmap)
+    instance_hit = create_mis_instance(sample, device="cpu", cache=cache)
+
+    for cached in [instance_miss, instance_hit]:
+        assert cached.n_nodes == instance.n_nodes
+        assert torch.equal(cached.crow, instance.crow)
+        assert torch.equal(cached.col, instance.col)
+        assert torch.equal(cached.degrees, instance.degrees)
+        assert (cached.adj_matrix_np != instance.adj_matrix_np).nnz == 0
+        assert cached.get_gt_cost() == instance.get_gt_cost()
+
+    priorities = torch.rand(4, instance.n_nodes)
+    assert torch.equal(
+        instance_hit.get_feasible_from_individual_batch(priorities),
+        instance.get_feasible_from_individual_batch(priorities),
+    )
+
+
+def test_mis_instance_cache_key() -> None:
+    edge_index = torch.tensor([[0, 1, 1, 2], [1, 0, 2, 1]])
+    key = MISInstanceCache.get_key(edge_index, 3)
+    assert key == MISInstanceCache.get_key(edge_index.clone(), 3)
+    assert key != MISInstanceCache.get_key(edge_index, 4)
+    assert key != MISInstanceCache.get_key(edge_index[:, :2], 3)
+
+
+def test_mis_instance_cache_lru_eviction(tmp_path: Path) -> None:
+    array = np.zeros(1000, dtype=np.int64)  # 8000 bytes + npy header
+    cache = MISInstanceCache(tmp_path, max_size_mb=20_000 / 1024**2)
+
+    cache.store("a", {"x": array})
+    cache.store("b", {"x": array})
+    os.utime(tmp_path / "a", (0, 0))
+    os.utime(tmp_path / "b", (0, 0))
+    # mark "a" as recently used, so that "b" is evicted first
+    assert cache.load("a", ["x"]) is not None
+    cache.store("c", {"x": array})
+
+    assert cache.load("a", ["x"]) is not None
+    assert cache.load("b", ["x"]) is None
+    assert cache.load("c", ["x"]) is not None
+    assert cache.size_bytes() <= cache.max_size_bytes
+
+    cache.clear()
+    assert cache.size_bytes() == 0
+
+
+def test_mis_instance_cache_partial_entry(tmp_path: Path) -> None:
+    cache = MISInstanceCache(tmp_path)
+    cache.store("a", {"x": np.zeros(10), "y": np.ones(10)})
+    assert set(cache.load("a", ["x", "y"])) == {"x", "y"}
+
+    # an entry evicted by another process while it is loaded
+    (tmp_path / "a" / "y.npy").unlink()
+    assert cache.load("a", ["x", "y"]) is None
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import itertools
+
+import numpy as np
+import pytest
+import torch
+from problems.mis.mis_branch_and_reduce import BranchAndReduceSolver
+from problems.mis.mis_instance import MISInstance
+from problems.mis.mis_kernelization import MISKernel, kernelize
+
+from tests.mis.test_mis_ea import read_mis_instance
+
+
+def create_instance(n_nodes: int, edges: list[tuple[int, int]]) -> MISInstance:
+    edge_index = torch.tensor(edges, dtype=torch.int64).reshape(-1, 2).T
+    edge_index = torch.cat([edge_index, edge_index.flip(0)], dim=1)
+    return MISInstance(n_nodes, edge_index)
+
+
+def mis_size(instance: MISInstance) -> int:
+    src, dst = instance.edge_index.tolist()
+    neighbors = [0] * instance.n_nodes
+    for u, v in zip(src, dst):
+        if u != v:
+            neighbors[u] |= 1 << v
+    return bin(BranchAndReduceSolver(neighbors).solve()).count("1")
+
+
+def is_independent_set(instance: MISInstance, solutions: torch.Tensor) -> bool:
+    src, dst = instance.edge_index
+    loops = src == dst
+    return not (solutions[:, src[~loops]] & solutions[:, dst[~loops]]).any()
+
+
+def test_kernelize_path_is_fully_reduced() -> None:
+    instance = create_instance(5, [(0, 1), (1, 2), (2, 3), (3, 4)])
+    kernel = kernelize(instance)
+    assert kernel.instance.n_nodes == 0
+    assert kernel.offset == 3
+
+    lifted = kernel.lift(torch.zeros(1, 0, dtype=torch.bool))
+    assert lifted.sum().item() == 3
+    assert is_independent_set(instance, lifted)
+
+
+def test_kernelize_twins_fold() -> None:
+    instance = twins_instance()
+    kernel = kernelize(instance)
+    assert any(len(fold.centers) == 2 for fold in kernel.folds)
+    assert mis_size(kernel.instance) + kernel.offset == mis_size(instance)
+
+
+def twins_instance() -> MISInstance:
+    # u=0 and v=1 are twins with the independent neighbors 2, 3, 4, which are in a
+    # 4-cycle with 5, 6, 7, 8 to prevent the other reductions
+    edges = [(u, a) for u in [0, 1] for a in [2, 3, 4]]
+    edges += [(2, 5), (2, 6), (3, 6), (3, 7), (4, 7), (4, 8), (4, 5)]
+    edges += [(5, 6), (6, 7), (7, 8), (8, 5)]
+    return create_instance(9, edges)
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        # a 5-cycle is fully reduced by a vertex fold
+        create_instance(5, [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0)]),
+        twins_instance(),
+    ],
+)
+def test_kernel_lift_single_solution_with_folds(instance: MISInstance) -> None:
+    kernel = kernelize(instance)
+    assert len(kernel.folds) > 0
+    assert_lifts_single_solution(instance, kernel)
+
+
+def assert_lifts_single_solution(instance: MISInstance, kernel: MISKernel) -> None:
+    n_kernel_nodes = kernel.instance.n_nodes
+    if n_kernel_nodes > 0:
+        priorities = torch.rand(1, n_kernel_nodes)
+        solution = kernel.instance.get_feasible_from_individual_batch(priorities)
+    else:
+        solution = torch.zeros(1, 0, dtype=torch.bool)
+    lifted = kernel.lift(solution)
+
+    assert lifted.shape == (1, instance.n_nodes)
+    assert is_independent_set(instance, lifted)
+    assert instance.is_independent_set(lifted)
+    assert lifted.sum().item() == solution.sum().item() + kernel.offset
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_kernelize_preserves_mis_size(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    n_nodes = 12
+    p = rng.choice([0.15, 0.3, 0.5])
+    edges = [
+        (u, v) for u, v in itertools.combinations(range(n_nodes), 2) if rng.random() < p
+    ]
+    instance = create_instance(n_nodes, edges)
+    kernel = kernelize(instance)
+
+    assert kernel.instance.n_nodes <= n_nodes
+    assert mis_size(kernel.instance) + kernel.offset == mis_size(instance)
+    assert_lifts_single_solution(instance, kernel)
+
+
+def test_kernel_lift() -> None:
+    instance, sample = read_mis_instance()
+    kernel = kernelize(instance)
+    assert kernel.instance.n_nodes <= instance.n_nodes
+
+    priorities = torch.rand(8, kernel.instance.n_nodes)
+    solutions = kernel.instance.get_feasible_from_individual_batch(priorities)
+    lifted = kernel.lift(solutions)
+
+    assert lifted.shape == (8, instance.n_nodes)
+    assert is_independent_set(instance, lifted)
+    assert torch.equal(lifted.sum(dim=-1), solutions.sum(dim=-1) + kernel.offset)
+
+    kernel_sample = kernel.get_sample(sample)
+    assert kernel_sample[1].num_nodes == kernel.instance.n_nodes
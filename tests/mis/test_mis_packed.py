@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import pytest
+import torch
+from problems.mis.mis_ga import MISGaProblem, create_mis_ga
+from problems.mis.mis_packed import (
+    hash_packed_rows,
+    n_words,
+    pack_solutions,
+    packed_fitness,
+    packed_hamming,
+    padding_mask,
+    popcount,
+    unpack_solutions,
+)
+
+from tests.mis.test_mis_ea import common_config, read_mis_instance
+
+
+@pytest.mark.parametrize("n_nodes", [1, 63, 64, 65, 200])
+def test_pack_unpack_roundtrip(n_nodes: int) -> None:
+    solutions = torch.rand(5, n_nodes) < 0.5
+    packed = pack_solutions(solutions)
+    assert packed.shape == (5, n_words(n_nodes))
+    assert packed.dtype == torch.int64
+    assert torch.equal(unpack_solutions(packed, n_nodes), solutions)
+
+
+def test_popcount() -> None:
+    words = torch.tensor([0, 1, -1, 3, -(2**63), 2**63 - 1, 0x0F0F])
+    assert torch.equal(popcount(words), torch.tensor([0, 1, 64, 2, 1, 63, 8]))
+
+
+def test_packed_set_algebra() -> None:
+    n_nodes = 150
+    a = torch.rand(8, n_nodes) < 0.3
+    b = torch.rand(8, n_nodes) < 0.3
+    packed_a, packed_b = pack_solutions(a), pack_solutions(b)
+
+    assert torch.equal(packed_fitness(packed_a), a.sum(dim=-1))
+    assert torch.equal(packed_hamming(packed_a, packed_b), (a ^ b).sum(dim=-1))
+    assert torch.equal(unpack_solutions(packed_a & packed_b, n_nodes), a & b)
+    assert torch.equal(unpack_solutions(packed_a | packed_b, n_nodes), a | b)
+
+    # complement, masking the padding bits
+    complement = ~packed_a & padding_mask(n_nodes)
+    assert torch.equal(packed_fitness(complement), n_nodes - a.sum(dim=-1))
+
+    # pairwise hamming distances by broadcasting
+    pairwise = packed_hamming(packed_a.unsqueeze(1), packed_a.unsqueeze(0))
+    assert pairwise.shape == (8, 8)
+    assert (pairwise.diagonal() == 0).all()
+
+
+def test_hash_packed_rows() -> None:
+    solutions = torch.rand(6, 300) < 0.5
+    solutions[3] = solutions[1]
+    hashes = hash_packed_rows(pack_solutions(solutions))
+    assert hashes[1] == hashes[3]
+    assert torch.unique(hashes).shape[0] == 5
+
+
+def test_mis_ga_packed_population() -> None:
+    instance, sample = read_mis_instance()
+    config = common_config.update(
+        pop_size=8, packed_population=True, max_local_search_it=2
+    )
+    ga = create_mis_ga(instance, config=config, sample=sample)
+    problem = ga.problem
+    assert isinstance(problem, MISGaProblem)
+
+    values = ga.population.values
+    assert values.dtype == torch.int64
+    assert values.shape == (8, n_words(instance.n_nodes))
+
+    ga.run(2)
+    values = ga.population.values
+    solutions = problem.unpack(values)
+    assert solutions.shape == (8, instance.n_nodes)
+    assert torch.equal(problem.get_solution_sizes(values), solutions.sum(dim=-1))
+
+    # solutions are independent sets
+    src, dst = instance.edge_index
+    assert not (solutions[:, src] & solutions[:, dst]).any()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import numpy as np
+from problems.mis.mis_ga import LocalBranchingSolver
+from problems.mis.mis_recombination_cache import RecombinationCache
+from problems.mis.solve_optimal_recombination import OptimalRecombResults
+
+from tests.mis.test_mis_ea import read_mis_instance
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def make_result(
+    children: list[int], parent_1_obj: int, parent_2_obj: int
+) -> OptimalRecombResults:
+    labels = np.zeros(10)
+    labels[children] = 1
+    return OptimalRecombResults(
+        children_np_labels=labels,
+        children=np.array(children),
+        runtime=1.5,
+        parent_1_obj=parent_1_obj,
+        parent_2_obj=parent_2_obj,
+        children_obj=len(children),
+    )
+
+
+def test_recombination_cache_unordered_pair(tmp_path: Path) -> None:
+    cache = RecombinationCache(tmp_path / "recombination.db")
+    solution_1, solution_2 = (1, 3, 5), (2, 4)
+
+    assert cache.get("graph", 10, solution_1, solution_2, 15, 1.75) is None
+    cache.put("graph", solution_1, solution_2, 15, 1.75, make_result([1, 3, 6], 3, 2))
+
+    result = cache.get("graph", 10, solution_1, solution_2, 15, 1.75)
+    assert np.array_equal(result.children, [1, 3, 6])
+    assert np.array_equal(result.children_np_labels.nonzero()[0], [1, 3, 6])
+    assert (result.parent_1_obj, result.parent_2_obj, result.children_obj) == (3, 2, 3)
+
+    # same pair in the other order
+    swapped = cache.get("graph", 10, solution_2, solution_1, 15, 1.75)
+    assert np.array_equal(swapped.children, [1, 3, 6])
+    assert (swapped.parent_1_obj, swapped.parent_2_obj) == (2, 3)
+
+    # other instance, time limit or k_factor
+    assert cache.get("other", 10, solution_1, solution_2, 15, 1.75) is None
+    assert cache.get("graph", 10, solution_1, solution_2, 30, 1.75) is None
+    assert cache.get("graph", 10, solution_1, solution_2, 15, 1.5) is None
+
+    # shared through the file
+    assert len(RecombinationCache(tmp_path / "recombination.db")) == 1
+
+
+def test_recombination_cache_lru_eviction(tmp_path: Path) -> None:
+    cache = RecombinationCache(tmp_path / "recombination.db", max_entries=2)
+    cache.put("graph", (0,), (1,), 15, None, make_result([0], 1, 1))
+    cache.put("graph", (0,), (2,), 15, None, make_result([0], 1, 1))
+    # mark the first pair as recently used
+    assert cache.get("graph", 10, (0,), (1,), 15) is not None
+    cache.put("graph", (0,), (3,), 15, None, make_result([0], 1, 1))
+
+    assert len(cache) == 2
+    assert cache.get("graph", 10, (0,), (1,), 15) is not None
+    assert cache.get("graph", 10, (0,), (2,), 15) is None
+    assert cache.get("graph", 10, (0,), (3,), 15) is not None
+
+
+def test_local_branching_solver_persistent_cache(tmp_path: Path) -> None:
+    instance, _ = read_mis_instance()
+    LocalBranchingSolver.clear_cache()
+    solution_1, solution_2 = (0, 5, 9), (1, 5)
+    result = make_result([0, 5, 9], 3, 2)
+
+    with patch(
+        "problems.mis.mis_ga.solve_local_branching_mis", return_value=result
+    ) as solve:
+        solver = LocalBranchingSolver(
+            instance, persistent_cache=RecombinationCache(tmp_path / "recomb.db")
+        )
+        solver.solve(solution_1, solution_2, time_limit=15, k_factor=1.75)
+        # in-memory hit, with the parents in the other order
+        swapped = solver.solve(solution_2, solution_1, time_limit=15, k_factor=1.75)
+        assert (swapped.parent_1_obj, swapped.parent_2_obj) == (2, 3)
+        assert solve.call_count == 1
+
+        # a new process only has the persistent cache
+        LocalBranchingSolver.clear_cache()
+        other_solver = LocalBranchingSolver(
+            instance, persistent_cache=RecombinationCache(tmp_path / "recomb.db")
+        )
+        cached = other_solver.solve(
+            solution_1, solution_2, time_limit=15, k_factor=1.75
+        )
+        assert np.array_equal(cached.children, result.children)
+        assert solve.call_count == 1
+
+    LocalBranchingSolver.clear_cache()
@@ -0,0 +1,195 @@
+"""
+Reference edge recombination crossover with (batch_size, n, n) masks and a copy of the
+edge lists at every step, O(batch_size * n^2). Used to test and benchmark
+problems.tsp.tsp_operators.edge_recombination_crossover.
+"""
+
+import torch
+
+
+def build_edge_lists_reference(
+    parent1: torch.Tensor, parent2: torch.Tensor
+) -> torch.Tensor:
+    """
+    Build edge lists for a batch of parents. Edge lists are defined as the set of nodes
+    that are connected to a given node in the tours of either parent. The max number
+    of edges is 4 per node, which is why we need to return a tensor of shape
+    (batch_size, n, 4). Note that there might be duplicates in the edge lists.
+
+    Args:
+        parent1: Tensor of size (batch_size, n + 1), first parent tours.
+        parent2: Tensor of size (batch_size, n + 1), second parent tours.
+
+    Returns:
+        edge_lists: Tensor of size (batch_size, n, 4), int
+    """
+    batch_size, n_plus_1 = parent1.size()
+    n = n_plus_1 - 1
+
+    # Remove last element in the tour for both parents
+    parent1 = parent1[:, :-1]  # shape: (batch_size, n)
+    parent2 = parent2[:, :-1]  # shape: (batch_size, n)
+
+    # For each node, we need its neighbors in both parent tours
+    # Roll the tours to get previous and next nodes
+    prev_1 = torch.roll(parent1, shifts=1, dims=1)  # shape: (batch_size, n)
+    next_1 = torch.roll(parent1, shifts=-1, dims=1)  # shape: (batch_size, n)
+    prev_2 = torch.roll(parent2, shifts=1, dims=1)  # shape: (batch_size, n)
+    next_2 = torch.roll(parent2, shifts=-1, dims=1)  # shape: (batch_size, n)
+
+    # Create masks for all nodes at once (batch_size, n, n)
+    node_indices = torch.arange(n, device=parent1.device)
+    mask1 = parent1.unsqueeze(-1) == node_indices
+    mask2 = parent2.unsqueeze(-1) == node_indices
+
+    # Create edge lists (batch_size, n, 4)
+    edge_lists = torch.zeros(
+        (batch_size, n, 4), dtype=torch.long, device=parent1.device
+    )
+
+    # Gather neighbors for all nodes at once
+    edge_lists[:, :, 0] = (mask1 * prev_1.unsqueeze(-1)).sum(dim=1)
+    edge_lists[:, :, 1] = (mask1 * next_1.unsqueeze(-1)).sum(dim=1)
+    edge_lists[:, :, 2] = (mask2 * prev_2.unsqueeze(-1)).sum(dim=1)
+    edge_lists[:, :, 3] = (mask2 * next_2.unsqueeze(-1)).sum(dim=1)
+
+    # Sort in the dimension of the last axis
+    return edge_lists.sort(dim=-1).values
+
+
+def select_from_edge_lists_reference(
+    edge_lists: torch.Tensor,
+    visited: torch.Tensor,
+    current_node: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Select a node from the edge lists based on the number of unique elements.
+
+    Args:
+        edge_lists: Tensor of size (batch_size, n, 4), int
+        visited: Tensor of size (batch_size, n), boolean
+
+    Returns:
+        selection: Tensor of size (batch_size,), int
+    """
+    batch_size = edge_lists.size(0)
+
+    edge_lists_copy = edge_lists.clone()
+
+    # candidates is a tensor of size (batch_size, 4)
+    candidates = edge_lists_copy[torch.arange(batch_size), current_node, :]
+
+    # edge_lists_candidates is a tensor of size (batch_size, 4, 4)
+    edge_lists_candidates = edge_lists_copy[
+        torch.arange(batch_size).unsqueeze(-1).expand(-1, 4), candidates, :
+    ]
+
+    # Mask visited nodes with -1
+    edge_lists_candidates[:, :, 0] = torch.where(
+        visited.gather(1, edge_lists_candidates[:, :, 0]),
+        -1,
+        edge_lists_candidates[:, :, 0],
+    )
+    edge_lists_candidates[:, :, 1] = torch.where(
+        visited.gather(1, edge_lists_candidates[:, :, 1]),
+        -1,
+        edge_lists_candidates[:, :, 1],
+    )
+    edge_lists_candidates[:, :, 2] = torch.where(
+        visited.gather(1, edge_lists_candidates[:, :, 2]),
+        -1,
+        edge_lists_candidates[:, :, 2],
+    )
+    edge_lists_candidates[:, :, 3] = torch.where(
+        visited.gather(1, edge_lists_candidates[:, :, 3]),
+        -1,
+        edge_lists_candidates[:, :, 3],
+    )
+
+    # Count unique elements by summing differences, plus 1 for the first unique element
+    edge_lists_candidates = edge_lists_candidates.sort(dim=-1).values
+    diffs = edge_lists_candidates[:, :, 1:] != edge_lists_candidates[:, :, :-1]
+    unique_counts = diffs.sum(dim=-1) + 1
+
+    # Discount one if -1 is present in the row
+    unique_counts = (
+        unique_counts - (torch.sum(edge_lists_candidates == -1, dim=-1) > 0).int()
+    )
+
+    # binary mask of visited candidates
+    visited_candidates = visited.gather(1, candidates)  # shape: (batch_size, 4)
+
+    # we set inf = 10 for the counts of the visited candidates, feasible max is 4
+    min_unique_count = (
+        torch.where(visited_candidates, 10, unique_counts)
+        .min(dim=1, keepdim=True)
+        .values
+    )  # shape: (batch_size, 1)
+    real_candidates_mask = (unique_counts == min_unique_count) & (~visited_candidates)
+
+    sums = real_candidates_mask.sum(dim=-1, keepdim=True)
+    to_draw_randomly = (sums == 0).bool()  # shape: (batch_size, 1)
+    sums = torch.where(to_draw_randomly, 1.0, sums)
+    real_candidates_mask = torch.where(
+        to_draw_randomly, torch.ones_like(real_candidates_mask), real_candidates_mask
+    )
+    real_candidates_mask = real_candidates_mask.float().div(sums)
+
+    idx = torch.multinomial(
+        real_candidates_mask.float(), num_samples=1
+    )  # shape: (batch_size, 1)
+    selected_nodes = candidates.gather(1, idx)
+
+    # select the first unvisited node if all candidates are visited
+    first_unvisited = (~visited).int().argmax(dim=1)
+    selected_nodes = torch.where(
+        to_draw_randomly, first_unvisited.unsqueeze(-1), selected_nodes
+    )
+
+    return selected_nodes.squeeze(1)
+
+
+def edge_recombination_crossover_reference(
+    parent1: torch.Tensor, parent2: torch.Tensor
+) -> torch.Tensor:
+    """
+    Perform edge recombination crossover (ERC) for a batch of parents, vectorized.
+
+    Note: we assume that all edges are valid, i.e., a dense graph is provided
+
+    Args:
+        parent1: Tensor of size (batch_size, n + 1), first parent tours.
+        parent2: Tensor of size (batch_size, n + 1), second parent tours.
+
+    Returns:
+        offspring: Tensor of size (batch_size, n + 1), containing offspring tours.
+    """
+    batch_size = parent1.size(0)
+    n = parent1.size(1) - 1  # Number of cities excluding the return to start
+    device = parent1.device
+
+    # Initialize tensors
+    offspring = torch.zeros((batch_size, n + 1), dtype=torch.long, device=device)
+    visited = torch.zeros((batch_size, n), dtype=torch.bool, device=device)
+
+    # Build edge lists
+    edge_lists = build_edge_lists_reference(parent1, parent2)
+    assert edge_lists.shape == (batch_size, n, 4)
+
+    current_nodes = torch.zeros((batch_size,), dtype=torch.int, device=device)
+    visited[torch.arange(batch_size), current_nodes] = True
+    offspring[:, 0] = current_nodes
+
+    # Generate tours
+    for step in range(1, n):
+        current_nodes = select_from_edge_lists_reference(
+            edge_lists, visited, current_nodes
+        )
+
+        # Update visitation and current nodes
+        visited[torch.arange(batch_size), current_nodes] = True
+        offspring[torch.arange(batch_size), step] = current_nodes
+
+    # Complete tours by returning to the start node
+    offspring[:, -1] = offspring[:, 0]
+    return offspring
@@ -87,7 +87,9 @@ def test_mis_gt_avg_cost_er_test_set() -> None:
 
 
 @pytest.mark.parametrize("task", ["mis"])  # tsp unsupported currently
-@pytest.mark.parametrize("recombination", ["classic", "optimal", "difuscombination"])
+@pytest.mark.parametrize(
+    "recombination", ["classic", "optimal", "difuscombination", "branch_and_reduce"]
+)
 @pytest.mark.parametrize("initialization", ["random_feasible", "difusco_sampling"])
 @pytest.mark.parametrize("selection_method", ["tournament", "roulette", "best_unique"])
 def test_ea_runs(
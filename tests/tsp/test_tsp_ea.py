@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 from copy import deepcopy
+from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -18,6 +19,7 @@ from problems.tsp.tsp_evaluation import (
 from problems.tsp.tsp_ga import (
     TSPGACrossover,
     TSPGAProblem,
+    TSPOrOptMutation,
     TSPTwoOptMutation,
     create_tsp_ga,
 )
@@ -219,7 +221,8 @@ def test_tsp_ga_fill_difusco_sampling(batch_sample_size_one: tuple) -> None:
         assert evaluations[i] == problem._objective_func(values[i])  # noqa: SLF001
 
 
-def test_tsp_ga_mutation(batch_sample_size_one: tuple) -> None:
+@pytest.mark.parametrize("local_search", ["two_opt", "neighbor_lists"])
+def test_tsp_ga_mutation(batch_sample_size_one: tuple, local_search: str) -> None:
     sample = batch_sample_size_one
     instance = create_tsp_instance(sample, device="cpu", sparse_factor=-1)
 
@@ -230,6 +233,7 @@ def test_tsp_ga_mutation(batch_sample_size_one: tuple) -> None:
             device="cpu",
             max_two_opt_it=2,
             initialization="random_feasible",
+            tsp_local_search=local_search,
         ),
     )
 
@@ -249,7 +253,75 @@ def test_tsp_ga_mutation(batch_sample_size_one: tuple) -> None:
         assert instance.is_valid_tour(children.values[i])
 
 
-def test_tsp_ga_crossover_works(batch_sample_size_one: tuple) -> None:
+def test_tsp_ga_or_opt_mutation(batch_sample_size_one: tuple) -> None:
+    sample = batch_sample_size_one
+    instance = create_tsp_instance(sample, device="cpu", sparse_factor=-1)
+
+    ga = create_tsp_ga(
+        instance,
+        config=Config(
+            pop_size=10,
+            device="cpu",
+            max_two_opt_it=5,
+            initialization="random_feasible",
+            tsp_local_search="or_opt",
+        ),
+    )
+
+    mutation = ga._operators[1]
+    assert isinstance(mutation, TSPOrOptMutation)
+
+    parents = deepcopy(ga.population)
+    children = mutation._do(ga.population)
+    assert children.values.shape == ga.population.values.shape
+    assert children.values.dtype == torch.int64
+
+    # make sure that no individual has worsened
+    for i in range(children.values.shape[0]):
+        assert (
+            instance.evaluate_tsp_route(children.values[i])
+            <= instance.evaluate_tsp_route(parents.values[i]) + 1e-5
+        )
+        assert instance.is_valid_tour(children.values[i])
+
+
+def test_tsp_ga_vectorized_evaluation(batch_sample_size_one: tuple) -> None:
+    sample = batch_sample_size_one
+    instance = create_tsp_instance(sample, device="cpu", sparse_factor=-1)
+    problem = TSPGAProblem(
+        instance, Config(pop_size=10, device="cpu", initialization="random_feasible")
+    )
+
+    population = problem.generate_batch(10)
+    problem.evaluate(population)
+
+    evals = population.evals[:, 0]
+    assert evals.shape == (10,)
+    for i in range(10):
+        assert evals[i].item() == pytest.approx(
+            instance.evaluate_tsp_route(population.values[i]), rel=1e-6
+        )
+
+
+def test_tsp_ga_random_heatmap_initialization_chunks(
+    batch_sample_size_one: tuple,
+) -> None:
+    sample = batch_sample_size_one
+    instance = create_tsp_instance(sample, device="cpu", sparse_factor=-1)
+    problem = TSPGAProblem(
+        instance, Config(pop_size=5, device="cpu", initialization="random_feasible")
+    )
+
+    # 5 tours merged by chunks of 2 heatmaps
+    with patch("problems.tsp.tsp_ga.os.cpu_count", return_value=2):
+        population = problem.generate_batch(5)
+
+    for tour in population.values:
+        assert instance.is_valid_tour(tour)
+
+
+@pytest.mark.parametrize("crossover", ["edge_recombination", "order", "eax"])
+def test_tsp_ga_crossover_works(batch_sample_size_one: tuple, crossover: str) -> None:
     sample = batch_sample_size_one
     instance = create_tsp_instance(sample, device="cpu", sparse_factor=-1)
 
@@ -260,6 +332,7 @@ def test_tsp_ga_crossover_works(batch_sample_size_one: tuple) -> None:
             device="cpu",
             max_two_opt_it=2,
             initialization="random_feasible",
+            tsp_crossover=crossover,
         ),
     )
 
@@ -8,8 +8,12 @@ from problems.tsp.tsp_evaluation import (
     adj_mat_to_tour,
     cdist_v2,
     cython_merge,
+    cython_merge_batch,
     cython_merge_get_tour,
+    cython_merge_sparse,
+    merge_tours,
 )
+from problems.tsp.cython_merge.cython_merge import tour_from_neighbors
 
 from tests.resources.tsp_merge_python import merge_python
 
@@ -182,6 +186,107 @@ def test_cython_merge_get_tour_vs_python() -> None:
     assert tour1[-1] == tour2[-1] == 0
 
 
+def test_tour_from_neighbors() -> None:
+    N = 1000
+    rng = np.random.default_rng(0)
+    cycle = rng.permutation(N)
+    neighbors = np.zeros((N, 2), dtype=np.int64)
+    neighbors[cycle, 0] = np.roll(cycle, 1)
+    neighbors[cycle, 1] = np.roll(cycle, -1)
+
+    tour = tour_from_neighbors(neighbors)
+
+    # same cycle, from 0 towards its neighbor with the largest index
+    start = np.nonzero(cycle == 0)[0][0]
+    expected = np.roll(cycle, -start)
+    if expected[1] < expected[-1]:
+        expected = np.roll(expected[::-1], 1)
+    assert (tour == np.append(expected, 0)).all()
+    assert adj_mat_to_tour(_tour_adj_mat(tour)) == tour.tolist()
+
+
+def _tour_adj_mat(tour: np.ndarray) -> np.ndarray:
+    adj_mat = np.zeros((len(tour) - 1, len(tour) - 1))
+    adj_mat[tour[:-1], tour[1:]] = 1
+    adj_mat[tour[1:], tour[:-1]] = 1
+    return adj_mat
+
+
+def test_merge_tours_dense() -> None:
+    N, P = 200, 3
+    rng = np.random.default_rng(0)
+    points = rng.random((N, 2))
+    heatmaps = rng.random((P, N, N))
+
+    tours, _ = merge_tours(heatmaps, points, None, parallel_sampling=P)
+
+    assert tours.shape == (P, N + 1)
+    for heatmap, tour in zip(heatmaps, tours):
+        expected, _ = cython_merge_get_tour(points, heatmap + heatmap.T)
+        assert (tour == expected).all()
+
+
+def test_cython_merge_sparse_vs_dense() -> None:
+    # with all the edges as candidates, the sparse merge is the dense one
+    N = 100
+    rng = np.random.default_rng(0)
+    points = rng.random((N, 2))
+    src, dst = np.nonzero(~np.eye(N, dtype=bool))
+    edge_index = np.stack([src, dst])
+    edge_scores = rng.random(edge_index.shape[1])
+
+    adj_mat = np.zeros((N, N))
+    adj_mat[src, dst] = edge_scores
+    dense_tour, _ = cython_merge_get_tour(points, adj_mat + adj_mat.T)
+    sparse_tour, _ = cython_merge_sparse(points, edge_index, edge_scores)
+
+    assert (sparse_tour == dense_tour).all()
+
+
+def test_cython_merge_sparse_knn_graph() -> None:
+    N, k = 1000, 3
+    rng = np.random.default_rng(0)
+    points = rng.random((N, 2))
+    # the k nearest neighbors of every node, itself included, like TSPGraphDataset
+    dist = np.linalg.norm(points[:, None] - points, axis=-1)
+    knn = np.argsort(dist, axis=1)[:, :k]
+    edge_index = np.stack([np.repeat(np.arange(N), k), knn.reshape(-1)])
+    heatmaps = rng.random((2, edge_index.shape[1]))
+
+    tours, merge_iterations = merge_tours(
+        heatmaps, points, edge_index, sparse_graph=True, parallel_sampling=2
+    )
+
+    assert merge_iterations <= edge_index.shape[1]
+    for tour in tours:
+        assert len(tour) == N + 1
+        assert tour[0] == tour[-1] == 0
+        assert sorted(tour[:-1]) == list(range(N))
+
+
+def test_cython_merge_batch_sparse() -> None:
+    N, k, P = 500, 5, 8
+    rng = np.random.default_rng(0)
+    points = rng.random((N, 2))
+    dist = np.linalg.norm(points[:, None] - points, axis=-1)
+    knn = np.argsort(dist, axis=1)[:, :k]
+    edge_index = np.stack([np.repeat(np.arange(N), k), knn.reshape(-1)])
+    heatmaps = rng.random((P, edge_index.shape[1]))
+
+    tours, merge_iterations = cython_merge_batch(points, heatmaps, edge_index)
+    single_thread_tours, _ = cython_merge_batch(
+        points, heatmaps, edge_index, num_threads=1
+    )
+
+    assert tours.shape == (P, N + 1)
+    assert merge_iterations.shape == (P,)
+    assert (tours == single_thread_tours).all()
+    for heatmap, tour, iterations in zip(heatmaps, tours, merge_iterations):
+        expected, expected_iterations = cython_merge_sparse(points, edge_index, heatmap)
+        assert (tour == expected).all()
+        assert iterations == expected_iterations
+
+
 def test_cdist_v2() -> None:
     points = torch.rand(100, 2)
     dist_mat = cdist_v2(points, points)
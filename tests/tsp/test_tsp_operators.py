@@ -1,3 +1,4 @@
+import time
 from itertools import permutations
 
 import numpy as np
@@ -5,12 +6,25 @@ import pytest
 import torch
 from problems.tsp.tsp_instance import TSPInstance
 from problems.tsp.tsp_operators import (
+    _neighbor_local_search_tour,
+    batched_neighbor_local_search,
+    batched_or_opt_torch,
     batched_two_opt_torch,
     build_edge_lists,
+    eax_crossover,
     edge_recombination_crossover,
+    get_knn_neighbors,
+    is_cython_local_search_available,
+    local_search_batch,
+    order_crossover,
     select_from_edge_lists,
 )
 
+from tests.resources.tsp_erc_reference import (
+    build_edge_lists_reference,
+    edge_recombination_crossover_reference,
+)
+
 
 @pytest.fixture
 def parent_tensors() -> dict:
@@ -112,6 +126,189 @@ def test_batched_two_opt_torch(input_type: str) -> None:
         )
 
 
+@pytest.mark.parametrize("input_type", ["numpy", "torch"])
+def test_batched_two_opt_torch_multiple_moves(input_type: str) -> None:
+    rng = np.random.default_rng(0)
+    n = 40
+    points = rng.random((n, 2))
+    tours = np.stack([rng.permutation(n) for _ in range(8)])
+    tours = np.concatenate([tours, tours[:, :1]], axis=1)
+    dist = np.linalg.norm(points[:, None] - points, axis=-1)
+
+    def is_two_opt_optimal(tour: np.ndarray) -> bool:
+        a, b = tour[:-1], tour[1:]
+        change = (
+            dist[a[:, None], a[None, :]]
+            + dist[b[:, None], b[None, :]]
+            - dist[a, b][:, None]
+            - dist[a, b][None, :]
+        )
+        return np.triu(change, k=2).min() >= -1e-6
+
+    input_tours = torch.from_numpy(tours) if input_type == "torch" else tours
+    single_tours, single_iterations = batched_two_opt_torch(
+        points, input_tours.clone() if input_type == "torch" else input_tours
+    )
+    multi_tours, multi_iterations = batched_two_opt_torch(
+        points, input_tours, moves_per_iteration=8
+    )
+    if input_type == "torch":
+        single_tours, multi_tours = single_tours.numpy(), multi_tours.numpy()
+
+    # both converge to 2-opt optimal tours, with less iterations for multiple moves
+    for tour in [*single_tours, *multi_tours]:
+        assert sorted(tour[:-1].tolist()) == list(range(n))
+        assert tour[0] == tour[-1]
+        assert is_two_opt_optimal(tour)
+    assert multi_iterations < single_iterations
+
+
+def test_get_knn_neighbors() -> None:
+    rng = np.random.default_rng(0)
+    points = rng.random((50, 2))
+    neighbors = get_knn_neighbors(points, k=5, chunk_size=16)
+
+    dist = np.linalg.norm(points[:, None] - points, axis=-1)
+    np.fill_diagonal(dist, np.inf)
+    assert neighbors.shape == (50, 5)
+    assert np.array_equal(neighbors, np.argsort(dist, axis=1)[:, :5])
+
+    # k is capped to the number of other points
+    assert get_knn_neighbors(points[:4], k=10).shape == (4, 3)
+
+
+@pytest.mark.parametrize("input_type", ["numpy", "torch"])
+def test_batched_neighbor_local_search(input_type: str) -> None:
+    rng = np.random.default_rng(0)
+    n = 100
+    points = rng.random((n, 2))
+    tours = np.stack([rng.permutation(n) for _ in range(4)])
+    tours = np.concatenate([tours, tours[:, :1]], axis=1)
+
+    def tour_lengths(tours: np.ndarray) -> np.ndarray:
+        return np.linalg.norm(
+            points[tours[:, 1:]] - points[tours[:, :-1]], axis=-1
+        ).sum(axis=-1)
+
+    neighbors = get_knn_neighbors(points, k=8)
+    input_tours = torch.from_numpy(tours) if input_type == "torch" else tours
+    solved_tours, iterations = batched_neighbor_local_search(
+        points, input_tours, neighbors, max_iterations=10_000
+    )
+    if input_type == "torch":
+        assert isinstance(solved_tours, torch.Tensor)
+        solved_tours = solved_tours.numpy()
+
+    assert iterations > 0
+    assert solved_tours.shape == tours.shape
+    assert (solved_tours[:, 0] == tours[:, 0]).all()
+    assert (solved_tours[:, 0] == solved_tours[:, -1]).all()
+    for tour in solved_tours:
+        assert sorted(tour[:-1].tolist()) == list(range(n))
+    # random tours are ~52 long, 2-opt + Or-opt tours are within ~10% of the optimum
+    # (~7.6)
+    assert (tour_lengths(solved_tours) < 0.2 * tour_lengths(tours)).all()
+
+    # bounded number of moves
+    _, iterations = batched_neighbor_local_search(
+        points, tours, neighbors, max_iterations=3
+    )
+    assert iterations == 3
+
+
+def test_batched_or_opt_torch() -> None:
+    n, batch_size = 100, 8
+    points = torch.rand(n, 2, dtype=torch.float64)
+    tours = _random_tours(batch_size, n)
+    neighbors = get_knn_neighbors(points, k=8)
+
+    def tour_lengths(tours: torch.Tensor) -> torch.Tensor:
+        return (points[tours[:, 1:]] - points[tours[:, :-1]]).norm(dim=-1).sum(dim=-1)
+
+    solved_tours = batched_or_opt_torch(
+        points, tours, neighbors, max_iterations=200, n_segments=n
+    )
+
+    assert solved_tours.shape == tours.shape
+    assert (solved_tours[:, 0] == tours[:, 0]).all()
+    assert (solved_tours[:, -1] == tours[:, 0]).all()
+    assert (solved_tours[:, :-1].sort(dim=1).values == torch.arange(n)).all()
+    assert (tour_lengths(solved_tours) < tour_lengths(tours)).all()
+
+    # the tours are unchanged without iterations
+    unchanged = batched_or_opt_torch(points, tours, neighbors, max_iterations=0)
+    assert torch.equal(unchanged, tours)
+
+
+def test_or_opt_small_example() -> None:
+    # cities on a line, moving city 2 between 1 and 3 gives an optimal tour (length 10)
+    points = torch.tensor([[float(i), 0.0] for i in range(6)], dtype=torch.float64)
+    tours = torch.tensor([[0, 1, 3, 4, 2, 5, 0]])
+    solved_tours = batched_or_opt_torch(
+        points, tours, get_knn_neighbors(points, k=3), max_iterations=10
+    )
+    tour = solved_tours[0]
+    assert (points[tour[1:]] - points[tour[:-1]]).norm(dim=-1).sum().item() == 10
+
+
+def test_neighbor_local_search_small_example() -> None:
+    # the optimal tour of a square is its perimeter
+    coords = np.array([[0, 0], [1, 1], [2, 0], [1, -1]], dtype=float)
+    tours = np.array([[0, 2, 1, 3, 0], [3, 1, 2, 0, 3]])
+    solved_tours, _ = batched_neighbor_local_search(
+        coords, tours, get_knn_neighbors(coords, k=3)
+    )
+    for tour in solved_tours:
+        edges = {frozenset(edge) for edge in zip(tour[:-1], tour[1:])}
+        assert edges == {frozenset(e) for e in [(0, 1), (1, 2), (2, 3), (3, 0)]}
+
+
+@pytest.mark.skipif(
+    not is_cython_local_search_available(),
+    reason="cython_tsp_local_search not compiled, skipping test that requires it",
+)
+@pytest.mark.parametrize("or_opt", [True, False])
+def test_cython_local_search_matches_python(or_opt: bool) -> None:
+    rng = np.random.default_rng(1)
+    n = 200
+    points = rng.random((n, 2))
+    tours = np.stack([rng.permutation(n) for _ in range(8)])
+    tours = np.ascontiguousarray(np.concatenate([tours, tours[:, :1]], axis=1))
+    neighbors = get_knn_neighbors(points, k=10)
+
+    cython_tours, cython_moves = local_search_batch(
+        points, tours, neighbors, 10_000, or_opt, 4
+    )
+    for i in range(tours.shape[0]):
+        python_tour, python_moves = _neighbor_local_search_tour(
+            points.tolist(), tours[i, :-1].tolist(), neighbors.tolist(), 10_000, or_opt
+        )
+        assert cython_tours[i].tolist() == python_tour
+        assert cython_moves[i] == python_moves
+
+
+@pytest.mark.parametrize(
+    "construction", ["nearest_neighbor", "greedy_edge", "space_filling_curve"]
+)
+def test_construct_tours(construction: str) -> None:
+    n, n_tours = 200, 16
+    points = torch.rand(n, 2, dtype=torch.float64)
+    gt_tour = torch.cat([torch.arange(n), torch.zeros(1, dtype=torch.int64)])
+    instance = TSPInstance(points, None, gt_tour)
+
+    tours = instance.construct_tours(n_tours, construction)
+
+    assert tours.shape == (n_tours, n + 1)
+    assert (tours[:, 0] == 0).all()
+    assert (tours[:, -1] == 0).all()
+    assert (tours[:, :-1].sort(dim=1).values == torch.arange(n)).all()
+    # the tours are randomized
+    assert len({tuple(tour.tolist()) for tour in tours}) > 1
+    # random tours are ~104 long, the optimum is ~10.5
+    costs = torch.tensor([instance.evaluate_tsp_route(tour) for tour in tours])
+    assert (costs < 25).all()
+
+
 def test_build_edge_lists(parent_tensors: dict) -> None:
     parent1 = parent_tensors["parent1"]
     parent2 = parent_tensors["parent2"]
@@ -180,6 +377,129 @@ def test_edge_recombination(parent_tensors: dict) -> None:
     assert (offspring[:, :-1] >= 0).all()
 
 
+def _random_tours(batch_size: int, n: int) -> torch.Tensor:
+    tours = torch.stack([torch.randperm(n) for _ in range(batch_size)])
+    return torch.cat([tours, tours[:, :1]], dim=1)
+
+
+def test_build_edge_lists_vs_reference() -> None:
+    parent1, parent2 = _random_tours(16, 50), _random_tours(16, 50)
+    assert torch.equal(
+        build_edge_lists(parent1, parent2),
+        build_edge_lists_reference(parent1, parent2),
+    )
+
+
+def test_edge_recombination_selection_rule() -> None:
+    # every step of the offspring is a valid choice of select_from_edge_lists: an
+    # unvisited neighbor with the fewest distinct unvisited neighbors, or the first
+    # unvisited node if all the neighbors are visited
+    batch_size, n = 16, 30
+    parent1, parent2 = _random_tours(batch_size, n), _random_tours(batch_size, n)
+    offspring = edge_recombination_crossover(parent1, parent2)
+    edge_lists = build_edge_lists(parent1, parent2).tolist()
+
+    for b in range(batch_size):
+        tour = offspring[b].tolist()
+        assert tour[0] == tour[-1] == 0
+        assert sorted(tour[:-1]) == list(range(n))
+        visited = {0}
+        for current, selected in zip(tour[:-2], tour[1:-1]):
+            candidates = [c for c in edge_lists[b][current] if c not in visited]
+            if candidates:
+                counts = {c: len(set(edge_lists[b][c]) - visited) for c in candidates}
+                allowed = {c for c in candidates if counts[c] == min(counts.values())}
+            else:
+                allowed = {min(set(range(n)) - visited)}
+            assert selected in allowed
+            visited.add(selected)
+
+
+def test_edge_recombination_benchmark() -> None:
+    parent1, parent2 = _random_tours(64, 500), _random_tours(64, 500)
+
+    start_time = time.time()
+    reference = edge_recombination_crossover_reference(parent1, parent2)
+    end_time = time.time()
+    print(f"Reference ERC time: {end_time - start_time} seconds")
+
+    start_time = time.time()
+    offspring = edge_recombination_crossover(parent1, parent2)
+    end_time = time.time()
+    print(f"In-place ERC time: {end_time - start_time} seconds")
+
+    assert offspring.shape == reference.shape
+    assert (offspring[:, :-1].sort(dim=1).values == torch.arange(500)).all()
+
+
+def _tour_edges(tour: list) -> set:
+    return {frozenset(edge) for edge in zip(tour[:-1], tour[1:])}
+
+
+def test_order_crossover() -> None:
+    batch_size, n = 32, 40
+    parent1, parent2 = _random_tours(batch_size, n), _random_tours(batch_size, n)
+    offspring = order_crossover(parent1, parent2)
+
+    assert offspring.shape == (batch_size, n + 1)
+    assert (offspring[:, 0] == 0).all()
+    assert (offspring[:, -1] == 0).all()
+    assert (offspring[:, :-1].sort(dim=1).values == torch.arange(n)).all()
+    for child, p1, p2 in zip(offspring.tolist(), parent1.tolist(), parent2.tolist()):
+        # a segment of parent1, then the other cities in the order of parent2 from the
+        # end of the segment
+        assert child[:-1] in _order_crossover_children(p1[:-1], p2[:-1])
+
+
+def _order_crossover_children(p1: list, p2: list) -> list:
+    n = len(p1)
+    children = []
+    for start in range(n):
+        for length in range(1, n):
+            end = start + length
+            segment = [p1[(start + k) % n] for k in range(length)]
+            rest = [p2[(end + k) % n] for k in range(n)]
+            child = [city for city in rest if city not in segment] + segment
+            first = child.index(0)
+            children.append(child[first:] + child[:first])
+    return children
+
+
+def test_eax_crossover() -> None:
+    batch_size, n = 32, 40
+    parent1, parent2 = _random_tours(batch_size, n), _random_tours(batch_size, n)
+    offspring = eax_crossover(parent1, parent2)
+
+    assert offspring.shape == (batch_size, n + 1)
+    assert (offspring[:, 0] == 0).all()
+    assert (offspring[:, -1] == 0).all()
+    assert (offspring[:, :-1].sort(dim=1).values == torch.arange(n)).all()
+    edges_from_parent2 = 0
+    for child, p1, p2 in zip(offspring.tolist(), parent1.tolist(), parent2.tolist()):
+        # the child takes edges of both parents, plus the joins of its subtours
+        edges = _tour_edges(child)
+        edges_from_parent2 += len(edges & (_tour_edges(p2) - _tour_edges(p1)))
+        assert len(edges - _tour_edges(p1) - _tour_edges(p2)) < n // 4
+    assert edges_from_parent2 > 0
+
+    # identical parents give the same tour
+    offspring = eax_crossover(parent1, parent1)
+    for child, p1 in zip(offspring.tolist(), parent1.tolist()):
+        assert _tour_edges(child) == _tour_edges(p1)
+
+
+def test_crossover_throughput_benchmark() -> None:
+    batch_size, n = 256, 200
+    parent1, parent2 = _random_tours(batch_size, n), _random_tours(batch_size, n)
+
+    for crossover in [edge_recombination_crossover, order_crossover, eax_crossover]:
+        start_time = time.time()
+        offspring = crossover(parent1, parent2)
+        elapsed = time.time() - start_time
+        print(f"{crossover.__name__}: {batch_size / elapsed:.0f} children per second")
+        assert offspring.shape == (batch_size, n + 1)
+
+
 def test_edge_recombination_small_example() -> None:
     # n = 9
 